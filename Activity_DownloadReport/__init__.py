@@ -0,0 +1,62 @@
+import logging
+from typing import Any, Dict
+
+from Utilities.checkpoints import CheckpointStore
+from Utilities.report_events import ReportEventRegistry
+from Utilities.report_tools import ReportDownloadOrchestrator, ReportFailedError
+from Utilities.profiling import profiler
+from Utilities.retry import FatalError, RetryPolicy
+
+
+@profiler.profiled('Activity_DownloadReport')
+def main(name: Dict[str, Any]) -> str:
+    """
+    Downloads a report requested by `Activity_RequestReport`, returned as json string. Uses the notification's
+    status/document ID if one arrived, otherwise falls back to polling the report status
+
+    Input: the account input and the output of `Activity_RequestReport`, plus 'processing_status' and 
+    'document_id' from the notification (if any)
+    """
+    account_name, retry_policy = RetryPolicy.from_account_input(name)
+    compile = ReportDownloadOrchestrator(
+        account_name=account_name, 
+        retry_policy=retry_policy, 
+        checkpoints=CheckpointStore.for_account(account_name, name.get('run_id')),
+        report_date=name.get('report_date'),
+        marketplace_id=name.get('marketplace_id'),
+        force=bool(name.get('force'))
+        )
+
+    processing_status = name.get('processing_status')
+    logging.info(
+        f"Downloading report {name['report_id']} for acc '{account_name}' "
+        f"({'notified ' + processing_status if processing_status else 'no notification, polling'})"
+        )
+
+    max_attempts = 3
+    for current_attempt in retry_policy.attempts(
+        max_attempts=max_attempts, base_seconds=5, rate_of_growth=1.75, what=f"report {name['report_id']} download"
+    ):
+        try:
+            data = compile.download_requested_report(
+                report_type=name['report_type'],
+                report_id=name['report_id'],
+                start_date=name.get('start_date'),
+                end_date=name.get('end_date'),
+                processing_status=processing_status,
+                document_id=name.get('document_id')
+            )
+            ReportEventRegistry().forget(name['report_id'])
+            return data
+
+        except (FatalError, ReportFailedError):
+            raise  # a FATAL/CANCELLED report stays failed, the account is retried with a new request
+
+        except Exception as e:
+            logging.error(f"Error on attempt #{current_attempt} for acc '{account_name}': {str(e)}")
+
+    logging.error(f"Max retry attempts reached downloading report {name['report_id']} for '{account_name}'")
+    raise Exception(
+        f"Failed to download report {name['report_id']} for '{account_name}' after {current_attempt} attempts "
+        f"(attempt cap reached)"
+    )
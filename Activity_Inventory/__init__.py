@@ -1,35 +1,54 @@
 import logging
+from typing import Any, Dict, Union
+
+from Utilities.checkpoints import CheckpointStore
+from Utilities.inventory_sources import INVENTORY_REPORT_TYPE
 from Utilities.report_tools import ReportDownloadOrchestrator
-from Utilities.utils import Helpers
+from Utilities.profiling import profiler
+from Utilities.retry import FatalError, RetryPolicy
 
 
-def main(name: str) -> str:
-    """Generates current in-stock inventory report, returned as json string"""
+@profiler.profiled('Activity_Inventory')
+def main(name: Union[str, Dict[str, Any]]) -> str:
+    """
+    Generates one of the current inventory reports, returned as json string (input may include 'report_type', 
+    default GET_FBA_MYI_UNSUPPRESSED_INVENTORY_DATA, see INVENTORY_REPORTS, 'report_date', 'marketplace_id', 
+    'run_id' and 'force')
+    """
 
-    compile = ReportDownloadOrchestrator(account_name=name)
-    help = Helpers()
+    account_name, retry_policy = RetryPolicy.from_account_input(name)
+    compile = ReportDownloadOrchestrator(
+        account_name=account_name, 
+        retry_policy=retry_policy, 
+        checkpoints=CheckpointStore.for_account(account_name, name.get('run_id') if isinstance(name, dict) else None),
+        report_date=name.get('report_date') if isinstance(name, dict) else None,
+        marketplace_id=name.get('marketplace_id') if isinstance(name, dict) else None,
+        force=bool(name.get('force')) if isinstance(name, dict) else False
+        )
 
-    logging.info(f"Generating inventory 1/1 report for acc '{name}'")
+    report_type = (name.get('report_type') if isinstance(name, dict) else None) or INVENTORY_REPORT_TYPE
+    logging.info(f"Generating inventory report '{report_type}' for acc '{account_name}'")
        
-    current_attempt = 1
     max_attempts = 3
-    while current_attempt <= max_attempts:        
+    for current_attempt in retry_policy.attempts(
+        max_attempts=max_attempts, base_seconds=5, rate_of_growth=1.75, what=f"'{report_type}' for '{account_name}'"
+    ):
         try: 
             data = compile.get_report(
-                report_type='GET_FBA_MYI_UNSUPPRESSED_INVENTORY_DATA',
+                report_type=report_type,
                 start_date=None,
                 end_date=None
             )
             return data 
         
+        except FatalError:
+            raise
+        
         except Exception as e:
+            logging.error(f"Error on attempt #{current_attempt} for acc '{account_name}': {str(e)}")
 
-            if current_attempt > max_attempts:
-                logging.error(f"Max retry attempts reached on inventory #1 for '{name}'")
-                raise Exception(f"Failed to generate inventory report for acc '{name}' after {max_attempts} retries")
-
-            logging.error(f"Error on attempt #{current_attempt} for acc '{name}': {str(e)}")
-            help.exponential_backoff(n=current_attempt, base_seconds=5, rate_of_growth=1.75)
-            current_attempt += 1
-            
-    
\ No newline at end of file
+    logging.error(f"Max retry attempts reached on '{report_type}' for '{account_name}'")
+    raise Exception(
+        f"Failed to generate '{report_type}' for acc '{account_name}' after {current_attempt} attempts "
+        f"(attempt cap reached)"
+    )
@@ -0,0 +1,53 @@
+import logging
+from typing import Any, Dict
+
+from Utilities.checkpoints import CheckpointStore
+from Utilities.report_tools import ReportDownloadOrchestrator
+from Utilities.profiling import profiler
+from Utilities.retry import FatalError, RetryPolicy
+from Utilities.run_parameters import ORDERS_REPORT_TYPE
+
+
+@profiler.profiled('Activity_Orders')
+def main(name: Dict[str, Any]) -> str:
+    """
+    Generates the orders report of one date range (up to 31 days), returned as json string
+
+    Input: the account input (see `RetryPolicy.to_account_input`), plus 'start_date'/'end_date' ('mm-dd-YYYY') and 
+    'report_date' ('YYYY-MM-DD', the day of the run, see `RunParameters.windows`), 'marketplace_id' (default
+    MARKETPLACE_ID), 'run_id' (which checkpoints it may resume from, see Utilities.checkpoints) and 'force' (never
+    resume)
+    """
+    account_name, retry_policy = RetryPolicy.from_account_input(name)
+    start_date, end_date = name['start_date'], name['end_date']
+    compile = ReportDownloadOrchestrator(
+        account_name=account_name, 
+        retry_policy=retry_policy, 
+        checkpoints=CheckpointStore.for_account(account_name, name.get('run_id')),
+        report_date=name.get('report_date'),
+        marketplace_id=name.get('marketplace_id'),
+        force=bool(name.get('force'))
+        )
+
+    logging.info(f"Generating orders report for acc '{account_name}' for range {start_date} - {end_date}")
+
+    max_attempts = 3
+    for current_attempt in retry_policy.attempts(
+        max_attempts=max_attempts, base_seconds=5, rate_of_growth=1.75, 
+        what=f"orders {start_date} - {end_date} for '{account_name}'"
+    ):
+        try: 
+            data = compile.get_report(report_type=ORDERS_REPORT_TYPE, start_date=start_date, end_date=end_date)
+            return data 
+        
+        except FatalError:
+            raise
+        
+        except Exception as e:
+            logging.error(f"Error on attempt #{current_attempt} for acc '{account_name}': {str(e)}")
+
+    logging.error(f"Max retry attempts reached on orders {start_date} - {end_date} for '{account_name}'")
+    raise Exception(
+        f"Failed to generate orders {start_date} - {end_date} for acc '{account_name}' after {current_attempt} "
+        f"attempts (attempt cap reached)"
+        )
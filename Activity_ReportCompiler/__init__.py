@@ -1,55 +1,88 @@
-from io import StringIO
-from typing import List, Tuple, TypedDict
-
-import pandas as pd
+from typing import Dict, List, Tuple, TypedDict, Union
 
+from Utilities.payload_codec import payload_codec
+from Utilities.profiling import profiler
 from Utilities.report_tools import ReportAssembler
+from Utilities.tracing import tracer
+
+class MarketplaceDict(TypedDict):
+    marketplace_id: str
+    orders: List[str]
+    inventory: Union[List[str], Dict[str, List[str]]]
 
-class CompilerDict(TypedDict):
+class CompilerDict(TypedDict, total=False):
     account_name: str
+    marketplaces: List[MarketplaceDict]
     orders: List[str]
     inventory: List[str]
+    columns: List[str]
+    metrics: List[str]
+    report_date: str
 
+@profiler.profiled('Activity_ReportCompiler')
 def main(name: CompilerDict) -> Tuple[str, str]:
     """
     Intended to compile the following activities and pivot the data into a raw on-hand report for 1 account;
-        -Activity_Order1
-        -Activity_Order2
-        -Activity_Order3
-        -Activity_Inventory
+        -Activity_Orders (one per date range of the lookback)
+        -Activity_Inventory (one per inventory report, see INVENTORY_REPORTS)
         
     Parameters:
-        -name: A dictionary with 3 items conforming to the CompilerDict class format
+        -name: A dictionary conforming to the CompilerDict class format, with the reports of each marketplace
         (pass orders/inventory in lists even if only one json is being passed)
     
     Example_Dict = {
         'account_name': 'BIZ',
-        'orders': [orders1, orders2, orders...n],
-        'inventory': [inventory1]
+        'marketplaces': [
+            {
+                'marketplace_id': 'ATVPDKIKX0DER', 
+                'orders': [orders1, orders2, orders...n], 
+                'inventory': {'GET_FBA_MYI_UNSUPPRESSED_INVENTORY_DATA': [inventory1], 'GET_RESERVED_...': [...]}
+            },
+            {'marketplace_id': 'A2EUQ1WTGCTBG2', 'orders': [...], 'inventory': {...}}
+        ],
+        'columns': ['sku', 'asin', 'on-hand', 'received'],  # optional, see ON_HAND_COLUMNS
+        'metrics': ['units-30d', 'weeks-of-cover-30d'],  # optional, see SALES_METRICS
+        'report_date': '2026-10-19'  # optional, the report date: the metrics' windows end at it, and the report
+        # name is dated with it (default today)
     }
+    (a single marketplace may also be passed as top-level 'orders'/'inventory' lists, and 'inventory' may be a 
+    list of unsuppressed inventory reports)
         
     Returns: 
-        -Tuple[str, str]: The name of the report, and the compiled on-hand report as json string
+        -Tuple[str, str]: The name of the report, and the compiled on-hand report as a payload string (json, or
+        compact with PAYLOAD_CODEC, see Utilities.payload_codec). With more than one marketplace, rows are per SKU
+        and marketplace, with a 'marketplace' column (country code)
     """
     # extract needed values from the input
     account_name = name.get('account_name')
-    orders_str_list = name.get('orders')
-    inventory_str_list = name.get('inventory')
-    
-    # compile the orders jsons to one df    
-    order_df_list = [pd.read_json(StringIO(orders)) for orders in orders_str_list]
-    order_df = pd.concat(order_df_list, ignore_index=True).drop_duplicates() 
-                          
-    # compile the inventory jsons to one df  
-    inv_df_list = [pd.read_json(StringIO(inventory)) for inventory in inventory_str_list]
-    inventory_df = pd.concat(inv_df_list, ignore_index=True).drop_duplicates()
+    assembler = ReportAssembler(account_name=account_name, report_date=name.get('report_date'))
+    tag_marketplace = len(assembler.compiler_marketplaces(name)) > 1
     
-    # generate pivot table df
-    assembler = ReportAssembler(account_name=account_name)
-    final_df = assembler.on_hand_report_compiler(orders=order_df, inventory=inventory_df)
-    
-    # convert back to json
-    final_df = final_df.to_json(orient='records')
-    report_name = assembler.set_on_hand_report_name()        
+    with tracer.tags(account=account_name):
+        # compile the orders jsons to one df, and each inventory report's jsons to another (tagged by marketplace 
+        # if several)
+        order_df, inventory_dfs = assembler.read_on_hand_sources([name], tag_marketplace=tag_marketplace)
+        
+        # generate pivot table df
+        final_df = assembler.on_hand_report_compiler(
+            orders=order_df, 
+            inventory=inventory_dfs, 
+            columns=name.get('columns'),
+            metrics=name.get('metrics'),
+            as_of=name.get('report_date')
+            )
+        
+        # joined counts come out as floats (the left join's blanks, filled): send them as the ints json readers 
+        # always got back, now that compact payloads keep dtypes
+        metrics = name.get('metrics') or []
+        for column in final_df.select_dtypes('float').columns.difference(metrics):
+            counts = final_df[column]
+            if counts.notna().all() and (counts % 1 == 0).all():
+                final_df[column] = counts.astype('int64')
+
+        # serialize for the Assembler (json, or compact with PAYLOAD_CODEC)
+        with tracer.span('report.serialize'):
+            final_df = payload_codec.encode(final_df)
+        report_name = assembler.set_on_hand_report_name()        
 
-    return report_name, final_df    
+    return report_name, final_df
@@ -0,0 +1,69 @@
+import logging
+from typing import Any, Dict
+
+from Utilities.checkpoints import CheckpointStore
+from Utilities.report_events import ReportEventRegistry
+from Utilities.report_tools import ReportDownloadOrchestrator
+from Utilities.profiling import profiler
+from Utilities.retry import FatalError, RetryPolicy
+
+
+@profiler.profiled('Activity_RequestReport')
+def main(name: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Requests one of the on-hand reports (REPORT_COMPLETION_MODE = 'events') without waiting for it, and registers
+    the report ID for the orchestration instance waiting on its REPORT_PROCESSING_FINISHED notification
+
+    Input: the account input (see `RetryPolicy.to_account_input`), plus 'report_type', 'start_date'/'end_date' 
+    (None for inventory), 'report_date', 'marketplace_id', 'run_id', 'force' and 'instance_id' (the waiting 
+    orchestration)
+    """
+    account_name, retry_policy = RetryPolicy.from_account_input(name)
+    report_type, start_date, end_date = name['report_type'], name.get('start_date'), name.get('end_date')
+    report = f"{report_type} ({start_date} - {end_date})" if start_date else report_type
+    compile = ReportDownloadOrchestrator(
+        account_name=account_name, 
+        retry_policy=retry_policy, 
+        checkpoints=CheckpointStore.for_account(account_name, name.get('run_id')),
+        report_date=name.get('report_date'),
+        marketplace_id=name.get('marketplace_id'),
+        force=bool(name.get('force'))
+        )
+
+    # already downloaded by an earlier attempt of this run: nothing to request or wait for
+    cached = compile.load_checkpoint(report_type=report_type, start_date=start_date, end_date=end_date)
+    if cached is not None:
+        return {
+            'report_id': None, 
+            'report_type': report_type, 
+            'start_date': start_date, 
+            'end_date': end_date, 
+            'data': cached
+        }
+
+    logging.info(f"Requesting '{report}' for acc '{account_name}'")
+
+    max_attempts = 3
+    for current_attempt in retry_policy.attempts(
+        max_attempts=max_attempts, base_seconds=5, rate_of_growth=1.75, what=f"{report} for '{account_name}'"
+    ):
+        try:
+            report_id = compile.request_report(report_type=report_type, start_date=start_date, end_date=end_date)
+            ReportEventRegistry().register(report_id=report_id, instance_id=name['instance_id'])
+            return {
+                'report_id': report_id, 
+                'report_type': report_type, 
+                'start_date': start_date, 
+                'end_date': end_date
+            }
+
+        except FatalError:
+            raise
+
+        except Exception as e:
+            logging.error(f"Error on attempt #{current_attempt} for acc '{account_name}': {str(e)}")
+
+    logging.error(f"Max retry attempts reached requesting {report} for '{account_name}'")
+    raise Exception(
+        f"Failed to request {report} for acc '{account_name}' after {current_attempt} attempts (attempt cap reached)"
+    )
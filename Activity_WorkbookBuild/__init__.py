@@ -0,0 +1,61 @@
+from typing import Any, Dict, List, TypedDict
+
+from Utilities.profiling import profiler
+from Utilities.report_tools import ReportAssembler
+from Utilities.run_parameters import RunParameters
+from Utilities.snapshots import SnapshotStore
+from Utilities.workbook import WorkbookBuilder, upload_workbooks
+from Utilities.workbook_merge import zip_workbooks
+
+class WorkbookBuildDict(TypedDict):
+    run: Dict[str, Any]
+    results: List[Any]
+    consolidated: bool
+
+@profiler.profiled('Activity_WorkbookBuild')
+def main(name: WorkbookBuildDict) -> List[str]:
+    """
+    Builds and uploads the published workbook(s) in one go (WORKBOOK_BUILD_MODE = 'serial'): compiles every account
+    at once first with COMPILE_MODE = 'consolidated', or reads the Activity_ReportCompiler reports, saves each
+    account's table to the snapshot history (today's default runs only), then writes the workbook(s), or a zip with WORKBOOK_PUBLISH = 'zip'
+
+    Parameters:
+        -name: A dictionary conforming to the WorkbookBuildDict class format: the run's parameters, the Generators'
+        results (the compiler inputs if consolidated, else (report name, payload) pairs) and whether consolidated
+
+    Returns:
+        -List[str]: The blob names uploaded
+    """
+    run = RunParameters.from_payload(name.get('run'))
+    results = name['results']
+
+    inst = ReportAssembler(report_date=run.report_date)
+    if name.get('consolidated'):
+        columns = next((result['columns'] for result in results if result.get('columns')), None)
+        metrics = next((result['metrics'] for result in results if result.get('metrics')), None)
+        results = inst.consolidated_on_hand_reports(
+            results, columns=columns, metrics=metrics, as_of=run.report_date.isoformat()
+        )
+    else:
+        results = inst.read_on_hand_results(results)
+
+    # keep a columnar history of the accounts' tables, for trend queries (never fails the run). Only today's default
+    # runs: a past or non-default run would replace the date's history with today's inventory
+    snapshots = SnapshotStore.for_run() if run.is_current() else None
+    if snapshots is not None:
+        snapshots.save_run(run.report_date, run.accounts, results)
+
+    # write the reports to formatted Excel workbooks (one tab for each account, split past the size limits), or to
+    # a zip of one workbook per account
+    builder = WorkbookBuilder.from_env()
+    if builder.publish == 'zip':
+        workbooks = [zip_workbooks(
+            [(report_name, builder.build_part(report_name, df)) for report_name, df in results], run.report_blob_name
+        )]
+    else:
+        workbooks = builder.build(results, run.report_blob_name)
+
+    # upload the workbooks to blob container (exp backoff between upload attempts)
+    blob_names = [blob_name for blob_name, _ in workbooks]
+    upload_workbooks(workbooks)
+    return blob_names
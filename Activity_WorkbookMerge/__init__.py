@@ -0,0 +1,59 @@
+import io
+import logging
+import os
+from typing import Any, Dict, List, TypedDict
+
+from Utilities.profiling import profiler
+from Utilities.run_parameters import RunParameters
+from Utilities.utils import storage_handler
+from Utilities.workbook import WorkbookBuilder, upload_workbooks
+from Utilities.workbook_merge import WorkbookMerger, zip_workbooks
+
+class WorkbookMergeDict(TypedDict):
+    run: Dict[str, Any]
+    parts: List[Dict[str, Any]]
+
+@profiler.profiled('Activity_WorkbookMerge')
+def main(name: WorkbookMergeDict) -> List[str]:
+    """
+    Merges the accounts' workbooks staged by Activity_WorkbookPart into the published `On Hand Reports <date>.xlsx`
+    (split like the serial Assembler's, see Utilities.workbook), copying their sheets as they are, or zips them
+    with WORKBOOK_PUBLISH = 'zip'. Uploads the result, then deletes the staged workbooks
+
+    Parameters:
+        -name: A dictionary conforming to the WorkbookMergeDict class format: the run's parameters, and the
+        Activity_WorkbookPart results in tab order
+
+    Returns:
+        -List[str]: The blob names uploaded
+    """
+    run = RunParameters.from_payload(name.get('run'))
+    storage = storage_handler(os.getenv('ON_HAND_BLOB_CONTAINER_NAME'))
+
+    files = []
+    for part in name['parts']:
+        data = storage.get_bytes(part['blob_name'])
+        if data is None:
+            raise RuntimeError(f"The staged workbook of '{part['report_name']}' ({part['blob_name']}) is missing")
+        files.append(io.BytesIO(data))
+
+    builder = WorkbookBuilder.from_env()
+    if builder.publish == 'zip':
+        workbooks = [zip_workbooks(
+            [(part['report_name'], file) for part, file in zip(name['parts'], files)], run.report_blob_name
+        )]
+    else:
+        workbooks = WorkbookMerger(builder).merge(
+            [(part['report_name'], part['rows'], part['columns'], file) for part, file in zip(name['parts'], files)],
+            run.report_blob_name
+        )
+
+    blob_names = [blob_name for blob_name, _ in workbooks]
+    upload_workbooks(workbooks)
+
+    for part in name['parts']:
+        try:
+            storage.delete(part['blob_name'])
+        except Exception as e:
+            logging.warning(f"Could not delete the staged workbook {part['blob_name']}: {str(e)}")
+    return blob_names
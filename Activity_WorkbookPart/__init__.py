@@ -0,0 +1,55 @@
+import os
+from typing import Any, Dict, Optional, TypedDict
+
+from Utilities.profiling import profiler
+from Utilities.report_tools import ReportAssembler
+from Utilities.run_parameters import RunParameters
+from Utilities.snapshots import SnapshotStore
+from Utilities.tracing import tracer
+from Utilities.utils import storage_handler
+from Utilities.workbook import WorkbookBuilder
+
+class WorkbookPartDict(TypedDict):
+    run: Dict[str, Any]
+    account_name: Optional[str]
+    report_name: str
+    report: str
+    save_as: str
+
+@profiler.profiled('Activity_WorkbookPart')
+def main(name: WorkbookPartDict) -> Dict[str, Any]:
+    """
+    Builds and formats one account's sheets (WORKBOOK_BUILD_MODE = 'parallel'), in a standalone workbook staged in
+    ON_HAND_BLOB_CONTAINER_NAME (or LOCAL_STORAGE_DIR) for Activity_WorkbookMerge. One runs per account at once, so
+    the workbook takes about as long as the largest account instead of the sum of all of them
+
+    Parameters:
+        -name: A dictionary conforming to the WorkbookPartDict class format
+
+    Example_Dict = {
+        'run': run.to_payload(),
+        'account_name': 'DZ',  # the account whose snapshot is saved, None for none
+        'report_name': 'DZ On Hand 10-19-2026',
+        'report': payload,  # Activity_ReportCompiler's report (see Utilities.payload_codec)
+        'save_as': 'workbook-parts/2026-10-19/<instance id>/000.xlsx'
+    }
+
+    Returns:
+        -Dict[str, Any]: {'report_name', 'rows', 'columns', 'blob_name'}, the merge's input for this account
+    """
+    run = RunParameters.from_payload(name.get('run'))
+    report_name = name['report_name']
+    [(_, df)] = ReportAssembler.read_on_hand_results([(report_name, name['report'])])
+
+    with tracer.tags(account=name.get('account_name') or report_name.split(' ')[0]):
+        # keep a columnar history of the account's table, as the serial build does (never fails the run, today's
+        # default runs only)
+        snapshots = SnapshotStore.for_run() if name.get('account_name') and run.is_current() else None
+        if snapshots is not None:
+            snapshots.save_run(run.report_date, [name['account_name']], [(report_name, df)])
+
+        buffer = WorkbookBuilder.from_env().build_part(report_name, df)
+        with buffer:
+            storage_handler(os.getenv('ON_HAND_BLOB_CONTAINER_NAME')).save_to_blob(buffer, save_as=name['save_as'])
+
+    return {'report_name': report_name, 'rows': len(df), 'columns': len(df.columns), 'blob_name': name['save_as']}
@@ -2,7 +2,9 @@ import logging
 
 from azure.durable_functions import DurableOrchestrationContext, Orchestrator, RetryOptions
 
-from Utilities.report_tools import GenerateFBAReport
+from Utilities.retry import RetryPolicy
+from Utilities.run_parameters import RunParameters
+from Utilities.scheduler import AccountScheduler
 
 
 def main(context: DurableOrchestrationContext):
@@ -10,30 +12,43 @@ def main(context: DurableOrchestrationContext):
     Generates 'on-hand' .xlsx reports for your Amazon account(s) by fetching data from SP-API
 
     -Main orchestrator: Runs Generator for account(s) in parallel, and compiles with Assembler         
-    -SubOrchestrator_Generator: sequentially runs Activities Order1-3, Inventory, and ReportCompiler
+    (set MAX_CONCURRENT_ACCOUNTS to cap how many accounts run at once, and ACCOUNTS_PRIORITY to pick who starts first)
+    -SubOrchestrator_Generator: runs SubOrchestrator_Region for each region of the account's marketplaces in 
+    parallel (each sequentially runs Activities Orders, 1 per 30D of lookback, and Inventory), then ReportCompiler
     -SubOrchestrator_Assembler: Assembles the report created by Generator, and uploads to blob account
+
+    Input: the run parameters from HTTP_trigger (see `RunParameters.to_payload`). Default = all accounts, 90D, today
     """       
     # define a catch-all retry policy in case any of the API activities fail 
     retry_options = RetryOptions(
         first_retry_interval_in_milliseconds=(300),
         max_number_of_attempts=3
     )
+
+    # ...and a deadline for the whole run, which every retry loop downstream respects (RUN_DEADLINE_MINUTES)
+    run_policy = RetryPolicy.for_run(context.current_utc_datetime)
     
     try:
-        # fetch list of accounts to run reports for
-        fetcher = GenerateFBAReport()
-        accounts_list = fetcher.current_accounts
+        # fetch list of accounts to run reports for (ACCOUNTS_LIST, or the subset the run was triggered with)
+        run = RunParameters.from_payload(context.get_input(), now=context.current_utc_datetime)
+        accounts_list = run.accounts
         
-        # run sub-orchestrators in parallel for each account
-        parallel_tasks = []
-        for account in accounts_list:
-            task = context.call_sub_orchestrator_with_retry('SubOrchestrator_Generator', retry_options, account)
-            parallel_tasks.append(task) 
-            
-        results = yield context.task_all(parallel_tasks)
+        # run sub-orchestrators in parallel for each account (bounded by MAX_CONCURRENT_ACCOUNTS, if set)
+        # each account gets its own deadline (ACCOUNT_DEADLINE_MINUTES) from the moment it starts, within the run's
+        scheduler = AccountScheduler()
+        results = yield from scheduler.run(
+            context,
+            accounts_list,
+            lambda account: context.call_sub_orchestrator_with_retry(
+                'SubOrchestrator_Generator', 
+                retry_options, 
+                {**run_policy.for_account(context.current_utc_datetime).to_account_input(account), 
+                 'run': run.to_payload()}
+            )
+        )
         
         # assemble to final report, format, and upload to blob
-        yield context.call_sub_orchestrator('SubOrchestrator_Assembler', results)
+        yield context.call_sub_orchestrator('SubOrchestrator_Assembler', {'results': results, 'run': run.to_payload()})
 
         # exit explicitly to avoid unwanted restarts 
         context.set_custom_status("Completed")
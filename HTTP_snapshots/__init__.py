@@ -0,0 +1,47 @@
+# Queries the on-hand snapshot history (see Utilities/snapshots.py), without opening any workbook:
+#   GET /api/snapshots/trend?start=2026-09-01&end=2026-10-19&skus=SKU-1,SKU-2&accounts=DZ
+#   GET /api/snapshots/delta?start=2026-10-12&end=2026-10-19&accounts=DZ,QR
+# Optional: columns (default "on-hand,received"), accounts and skus (default all). Returns json records.
+
+import logging
+from typing import List, Optional
+
+from azure.functions import HttpRequest, HttpResponse
+
+from Utilities.snapshots import SnapshotStore
+
+
+QUERIES = ('trend', 'delta')
+
+
+def _list(value: Optional[str]) -> Optional[List[str]]:
+    """Comma-separated query parameter as a list, None if blank"""
+    items = [item.strip() for item in (value or '').split(',') if item.strip()]
+    return items or None
+
+
+def main(req: HttpRequest) -> HttpResponse:
+    query = req.route_params.get('query')
+    if query not in QUERIES:
+        return HttpResponse(f"Unknown query '{query}', use one of {list(QUERIES)}", status_code=404)
+
+    start, end = req.params.get('start'), req.params.get('end')
+    if not start or not end:
+        return HttpResponse("Pass the 'start' and 'end' dates (YYYY-MM-DD)", status_code=400)
+
+    arguments = {
+        'skus': _list(req.params.get('skus')),
+        'accounts': _list(req.params.get('accounts')),
+        'columns': _list(req.params.get('columns')) or ('on-hand', 'received')
+    }
+
+    try:
+        store = SnapshotStore()
+        df = store.trend(start, end, **arguments) if query == 'trend' else store.delta(start, end, **arguments)
+    except ValueError as e:
+        return HttpResponse(str(e), status_code=400)
+    except Exception as e:
+        logging.error(f"Snapshot {query} query failed: {str(e)}")
+        return HttpResponse(f"Snapshot {query} query failed: {str(e)}", status_code=500)
+
+    return HttpResponse(df.to_json(orient='records'), status_code=200, mimetype='application/json')
@@ -4,17 +4,118 @@
 # - create a Durable activity function (default name is "Hello")
 # - add azure-functions-durable to requirements.txt
 # - run pip install -r requirements.txt
+#
+# Optional parameters (query string or json body): accounts (e.g. "DZ,QR"), lookback_days, report_date 
+# ("YYYY-MM-DD"), and force ("true" to run even if the report already exists). The same parameters on the same day
+# always map to the same instance ID, so duplicate triggers attach to the running instance instead of starting
+# another one.
  
+from datetime import datetime, timedelta, timezone
+import json
 import logging
+import os
+from typing import Optional
+import uuid
 
 from azure.functions import HttpRequest, HttpResponse
-from azure.durable_functions import DurableOrchestrationClient
+from azure.durable_functions import DurableOrchestrationClient, OrchestrationRuntimeStatus
+
+import pytz
+
+from Utilities.run_parameters import RunParameters
+from Utilities.settings import get_settings
+from Utilities.utils import storage_handler
+
+
+ACTIVE_STATUSES = [
+    OrchestrationRuntimeStatus.Pending, 
+    OrchestrationRuntimeStatus.Running, 
+    OrchestrationRuntimeStatus.ContinuedAsNew,
+    OrchestrationRuntimeStatus.Suspended
+]
+
+
+def fresh_report(run: RunParameters) -> Optional[datetime]:
+    """
+    When the run's report was uploaded, if it was uploaded on/after the report date and at most REPORT_MAX_AGE_HOURS 
+    (default=12) ago. None otherwise ('0' turns the short-circuit off)
+    """
+    max_age_hours = float(os.getenv('REPORT_MAX_AGE_HOURS') or 12)
+    if max_age_hours <= 0:
+        return None
+
+    try:
+        last_modified = storage_handler(os.getenv('ON_HAND_BLOB_CONTAINER_NAME')).last_modified(run.report_blob_name)
+    except Exception as e:
+        logging.warning(f"Could not check for an existing '{run.report_blob_name}', running anyway: {str(e)}")
+        return None
+
+    if last_modified is None:
+        return None
+
+    report_day_start = pytz.timezone('US/Eastern').localize(datetime.combine(run.report_date, datetime.min.time()))
+    too_old = datetime.now(timezone.utc) - last_modified > timedelta(hours=max_age_hours)
+    return None if last_modified < report_day_start or too_old else last_modified
 
 
 async def main(req: HttpRequest, starter: str) -> HttpResponse:
     client = DurableOrchestrationClient(starter)
-    instance_id = await client.start_new(req.route_params["functionName"], None, None)
+    function_name = req.route_params["functionName"]
+
+    # parameters from the query string, overridden by the json body (if any)
+    query = dict(req.params)
+    try:
+        body = req.get_json()
+    except ValueError:
+        body = None
+    if body is not None and not isinstance(body, dict):
+        return HttpResponse("The json body must be an object of parameters", status_code=400)
+    query.update(body or {})
+
+    # a misconfigured app is our error, not the caller's: fail here, before anything is started
+    try:
+        settings = get_settings()
+    except (ValueError, SyntaxError) as e:
+        logging.error(f"Invalid Function App settings: {str(e)}")
+        return HttpResponse(f"Invalid Function App settings: {str(e)}", status_code=500)
+
+    try:
+        run = RunParameters.from_query(query, settings=settings)
+    except (ValueError, SyntaxError) as e:
+        return HttpResponse(str(e), status_code=400)
+
+    instance_id = run.instance_id(function_name)
+
+    # a run with the same parameters is in progress: attach to it
+    status = await client.get_status(instance_id)
+    if status is not None and status.runtime_status in ACTIVE_STATUSES:
+        logging.info(f"Orchestration '{instance_id}' is already {status.runtime_status.value}, attaching to it")
+        return client.create_check_status_response(req, instance_id)
+
+    # today's report is already there: nothing to do
+    uploaded = None if run.force else fresh_report(run)
+    if uploaded is not None:
+        logging.info(f"'{run.report_blob_name}' was uploaded at {uploaded.isoformat()}, not starting a new run")
+        return HttpResponse(
+            json.dumps({
+                'id': instance_id, 
+                'report': run.report_blob_name, 
+                'uploaded': uploaded.isoformat(),
+                'message': "Report is already up to date, pass force=true to regenerate it"
+            }),
+            status_code=200,
+            mimetype='application/json'
+        )
+
+    # a new ID for every run started, even on the same instance ID: its downloads are checkpointed under it
+    run.run_id = uuid.uuid4().hex
+    try:
+        instance_id = await client.start_new(function_name, instance_id, run.to_payload())
+    except Exception as e:
+        # another trigger started the same instance in the meantime (see overridableExistingInstanceStates)
+        logging.warning(f"Could not start '{instance_id}', attaching to the existing instance: {str(e)}")
+        return client.create_check_status_response(req, instance_id)
 
     logging.info(f"Started orchestration with ID = '{instance_id}'.")
 
-    return client.create_check_status_response(req, instance_id)
\ No newline at end of file
+    return client.create_check_status_response(req, instance_id)
@@ -0,0 +1,32 @@
+# Consumes SP-API REPORT_PROCESSING_FINISHED notifications (forwarded to the REPORT_NOTIFICATIONS_QUEUE storage 
+# queue), and raises the matching external event on the orchestration waiting for the report
+import logging
+
+from azure.functions import QueueMessage
+from azure.durable_functions import DurableOrchestrationClient
+
+from Utilities.report_events import ReportEventRegistry, parse_notification, report_event_name
+
+
+async def main(msg: QueueMessage, starter: str) -> None:
+    try:
+        notification = parse_notification(msg.get_body())
+    except ValueError as e:
+        # not for us (e.g. another notification type on the same queue), retrying won't change that
+        logging.warning(f"Ignoring queue message {msg.id}: {str(e)}")
+        return
+
+    registry = ReportEventRegistry()
+    instance_id = registry.lookup(notification['report_id'])
+    if instance_id is None:
+        logging.info(f"No orchestration waiting for report {notification['report_id']}, ignoring")
+        return
+
+    client = DurableOrchestrationClient(starter)
+    await client.raise_event(instance_id, report_event_name(notification['report_id']), notification)
+    registry.forget(notification['report_id'])
+
+    logging.info(
+        f"Report {notification['report_id']} is {notification['processing_status']}, "
+        f"notified orchestration '{instance_id}'"
+        )
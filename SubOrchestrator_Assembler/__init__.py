@@ -1,74 +1,71 @@
-import io 
-from io import StringIO
 import logging
-import os
-
-import openpyxl as xl
-import pandas as pd
 
 from azure.durable_functions import DurableOrchestrationContext, Orchestrator
 
-from Utilities.report_tools import ReportAssembler
-from Utilities.utils import Helpers, BlobHandler
+from Utilities.run_parameters import RunParameters
+from Utilities.workbook import WorkbookBuilder
+from Utilities.workbook_merge import WorkbookMerger
+
+
+def build_in_parallel(context: DurableOrchestrationContext, run: RunParameters, results: list):
+    """
+    WORKBOOK_BUILD_MODE = 'parallel': one Activity_WorkbookPart per account builds (and snapshots) its sheets at
+    once, then Activity_WorkbookMerge combines them into the published workbook(s), or a zip with WORKBOOK_PUBLISH =
+    'zip'
+    """
+    staging = f"{WorkbookMerger.prefix}/{run.report_date.isoformat()}/{context.instance_id}"
+    part_tasks = [
+        context.call_activity('Activity_WorkbookPart', {
+            'run': run.to_payload(),
+            'account_name': run.accounts[number] if number < len(run.accounts) else None,
+            'report_name': report_name,
+            'report': report,
+            'save_as': f"{staging}/{number:03}.xlsx"
+        })
+        for number, (report_name, report) in enumerate(results)
+    ]
+    parts = yield context.task_all(part_tasks)
+
+    yield context.call_activity('Activity_WorkbookMerge', {'run': run.to_payload(), 'parts': parts})
+    return None
 
 
 def orchestrator_function(context: DurableOrchestrationContext):
     """
     SubOrchestrator_Assembler: 
     
-    Uses results from the SubOrchestrator_Generator to create a final, formatted .xlsx report, and uploads to blob
+    Uses results from the SubOrchestrator_Generator to create a final, formatted .xlsx report, and uploads to blob,
+    in Activity_WorkbookBuild (no work nor I/O in the orchestrator itself, which replays). Reports past 
+    WORKBOOK_MAX_SHEET_ROWS/WORKBOOK_MAX_ROWS/WORKBOOK_MAX_MB are split across continuation sheets and workbooks 
+    (see Utilities.workbook). With WORKBOOK_BUILD_MODE = 'parallel' each account's sheets are built by
+    their own activity instead, and merged at the end (see `build_in_parallel`); WORKBOOK_PUBLISH = 'zip' publishes
+    a zip of one workbook per account.
+    With COMPILE_MODE = 'consolidated' the results are the accounts' raw reports, compiled all at once by 
+    Activity_WorkbookBuild (plus a cross-account summary tab) instead of by one Activity_ReportCompiler per account.
+    On today's default runs, each account's table is also saved to the snapshot history (see Utilities.snapshots, 
+    SNAPSHOTS_ENABLED, and `RunParameters.is_current`)
 
     Required Environment Variables:
         -STORAGE_ACCOUNT_NAME: the name of your storage account
         -ON_HAND_BLOB_CONTAINER_NAME: the name of the blob container within your storage        
     """
-    # get input - results from the parallel task run 
-    results = context.get_input()
-
-    helpers = Helpers()  # exp backoff helper method
+    # get input - results from the parallel task run, and the run's parameters (for the report name)
+    assembler_input = context.get_input()
+    results = assembler_input['results']
+    run = RunParameters.from_payload(assembler_input.get('run'), now=context.current_utc_datetime)
+    builder = WorkbookBuilder.from_env()
 
-    # write the raw reports to an Excel buffer (one tab for each account)
-    buffer = io.BytesIO()
-    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-        for report_name, report_contents in results:
-            df = pd.read_json(StringIO(report_contents))
-            df.to_excel(writer, sheet_name=report_name, index=False)
-    buffer.seek(0)
+    # consolidated mode: Generators return their compiler inputs (dicts), not (report name, json) tuples
+    consolidated = results and all(isinstance(result, dict) for result in results)
+    if builder.build_mode == 'parallel' and results and not consolidated:
+        yield from build_in_parallel(context, run, results)
+        return None
+    if builder.build_mode == 'parallel' and consolidated and not context.is_replaying:
+        logging.info("WORKBOOK_BUILD_MODE 'parallel' needs COMPILE_MODE 'per_account', building the workbook serially")
 
-    # now visually format with xl (can't do this in the previous loop as pd doesn't save io objects)
-    inst = ReportAssembler()
-    wb = xl.load_workbook(buffer)
-    for sheet in wb.sheetnames:
-        account_initials = sheet.split(' ')[0]  # for table names
-        ws = wb[sheet]
-        inst.on_hand_report_formatter(ws, table_name=account_initials)
-        buffer.seek(0)
-    wb.save(buffer)
-    buffer.seek(0)
-    
-    # upload buffer to blob container
-    uploaded = False
-    upload_attempt = 1
-    max_attempts = 3
-    while upload_attempt <= max_attempts:
-        try: 
-            blob_client = BlobHandler(
-                storage_account=os.getenv('STORAGE_ACCOUNT_NAME'), 
-                container_name=os.getenv('ON_HAND_BLOB_CONTAINER_NAME')
-                )        
-            blob_client.save_to_blob(buffer, save_as=f"On Hand Reports {inst.today}.xlsx")
-            uploaded = True
-            break
-        
-        except Exception as e:
-            logging.error(f"Failed to upload finished report to blob - {str(e)}")
-            helpers.exponential_backoff(upload_attempt)
-    
-    if not uploaded:
-        raise RuntimeError(
-            "Could not upload report to blob. Review the logs and check access to your storage account"
-            )
-    
+    yield context.call_activity(
+        'Activity_WorkbookBuild', {'run': run.to_payload(), 'results': results, 'consolidated': bool(consolidated)}
+    )
     return None
 
 
@@ -1,31 +1,51 @@
-from datetime import timedelta
-
 from azure.durable_functions import DurableOrchestrationContext, Orchestrator
 
+from Utilities.retry import RetryPolicy
+from Utilities.settings import get_settings
 
-def main(context: DurableOrchestrationContext):
-    """Compiles an on-hand report out of the prior activities (Orders_1-3, Inventory, ReportCompiler)"""
-    account_name = context.get_input()
-
-    # run sequentially, to avoid throttle
-    orders1_result = yield context.call_activity('Activity_Order1', account_name)
-    yield context.create_timer(context.current_utc_datetime + timedelta(seconds=3))
-    
-    orders2_result = yield context.call_activity('Activity_Order2', account_name)
-    yield context.create_timer(context.current_utc_datetime + timedelta(seconds=3))
-
-    orders3_result = yield context.call_activity('Activity_Order3', account_name)
-    yield context.create_timer(context.current_utc_datetime + timedelta(seconds=3))
 
-    inventory_result = yield context.call_activity('Activity_Inventory', account_name)
-    yield context.create_timer(context.current_utc_datetime + timedelta(seconds=1))
+def main(context: DurableOrchestrationContext):
+    """
+    Compiles an on-hand report out of the prior activities (Orders for each date range of the lookback, Inventory, 
+    ReportCompiler), for every marketplace of the account
+
+    -SubOrchestrator_Region: runs the reports of the account's marketplaces in one SP-API region, one per region 
+    at once (set <ACCOUNT>_MARKETPLACES to run more than MARKETPLACE_ID)
+    -Activity_ReportCompiler: merges every marketplace's reports into the account's report (COMPILE_MODE = 
+    'per_account'). With 'consolidated', the reports are returned as they are, for SubOrchestrator_Assembler to 
+    compile every account at once
+    """
+    account_input = context.get_input()
+    account_name, retry_policy = RetryPolicy.from_account_input(account_input)
+    run = account_input.get('run') if isinstance(account_input, dict) else None
+
+    # one sub-orchestrator per region: each has its own endpoint, connections and rate limits
+    settings = get_settings()
+    regions = settings.regions_of(account_name)
+    region_tasks = [
+        context.call_sub_orchestrator(
+            'SubOrchestrator_Region', 
+            {
+                **retry_policy.to_account_input(account_name), 
+                'run': run, 
+                'region': region, 
+                'marketplaces': list(marketplaces)
+            }
+        )
+        for region, marketplaces in regions.items()
+    ]
+    region_results = yield context.task_all(region_tasks)
 
     # pass dictionary of results to report compiler
     results = {
         'account_name': account_name,
-        'orders': [orders1_result, orders2_result, orders3_result],
-        'inventory': [inventory_result]
+        'marketplaces': [marketplace for region in region_results for marketplace in region],
+        'columns': list(settings.on_hand_columns) if settings.on_hand_columns else None,
+        'metrics': list(settings.sales_metrics) if settings.sales_metrics else None,
+        'report_date': run.get('report_date') if run else None  # the day the sales metrics' windows end
     }
+    if settings.compile_mode == 'consolidated':
+        return results  # the compiler's input, compiled with the other accounts' by SubOrchestrator_Assembler
     
     compiled_report = yield context.call_activity('Activity_ReportCompiler', results)
     return compiled_report  # returns a tuple with report name and the report itself, in json fmt
@@ -0,0 +1,134 @@
+from datetime import timedelta
+import logging
+
+from azure.durable_functions import DurableOrchestrationContext, Orchestrator
+
+from Utilities.report_events import completion_mode, event_timeout_minutes, report_event_name
+from Utilities.report_graph import ReportGraph
+from Utilities.retry import RetryPolicy
+from Utilities.run_parameters import ORDERS_REPORT_TYPE, RunParameters
+
+
+def report_via_event(context: DurableOrchestrationContext, report_input: dict):
+    """
+    Requests a report, then waits for its REPORT_PROCESSING_FINISHED notification (raised as an external event by 
+    QueueTrigger_ReportNotifications) instead of polling. Polls if none arrives within REPORT_EVENT_TIMEOUT_MINUTES
+    """
+    requested = yield context.call_activity(
+        'Activity_RequestReport', 
+        {**report_input, 'instance_id': context.instance_id}
+        )
+    if requested['report_id'] is None:
+        return requested['data']  # checkpointed by an earlier attempt
+
+    finished = context.wait_for_external_event(report_event_name(requested['report_id']))
+    timeout = context.create_timer(context.current_utc_datetime + timedelta(minutes=event_timeout_minutes()))
+    winner = yield context.task_any([finished, timeout])
+
+    download_input = {**report_input, **requested}
+    if winner == finished:
+        timeout.cancel()
+        download_input.update({
+            'processing_status': finished.result.get('processing_status'),
+            'document_id': finished.result.get('document_id')
+        })
+    elif not context.is_replaying:
+        logging.warning(f"No notification for report {requested['report_id']} in time, falling back to polling")
+
+    data = yield context.call_activity('Activity_DownloadReport', download_input)
+    return data
+
+
+def report_lane(context: DurableOrchestrationContext, retry_policy: RetryPolicy, report_inputs: list):
+    """
+    Runs the reports of one report type (e.g. every orders window) of one marketplace, one after the other, and 
+    returns their results in order
+    """
+    results = []
+    for i, report_input in enumerate(report_inputs):
+        report_type = report_input['report_type']
+
+        # don't start another report once the account's deadline is spent
+        retry_policy.check(
+            f"{report_type} {report_input['start_date']} - {report_input['end_date']} for "
+            f"'{report_input['account_name']}' ({report_input['marketplace_id']})", 
+            now=context.current_utc_datetime
+        )
+
+        if completion_mode() == 'events':
+            # request one report at a time (throttle), but let SP-API notify when each one is ready
+            results.append((yield from report_via_event(context, report_input)))
+
+        else:
+            activity = 'Activity_Orders' if report_type == ORDERS_REPORT_TYPE else 'Activity_Inventory'
+            results.append((yield context.call_activity(activity, report_input)))
+            if i < len(report_inputs) - 1:
+                yield context.create_timer(context.current_utc_datetime + timedelta(seconds=3))
+
+    return results
+
+
+def main(context: DurableOrchestrationContext):
+    """
+    Runs the reports of one account in one SP-API region (Orders for each date range of the lookback, Inventory), 
+    for each of the account's marketplaces in that region. SubOrchestrator_Generator runs one per region at once
+
+    The reports form a small dependency graph (see `ReportGraph`): each report type is a lane of its own, running 
+    its reports one after the other (with a 3 s pause in poll mode), so inventory overlaps the orders windows 
+    instead of waiting for them. A marketplace's lane starts once the previous marketplace's lane of the same type
+    is done, so each report type only ever has one report in flight per region
+
+    Input: the account input (see `RetryPolicy.to_account_input`), plus 'run' (see `RunParameters.to_payload`),
+    'region' and 'marketplaces' (the account's marketplace IDs in the region)
+
+    Returns: a list with a dictionary per marketplace: 'marketplace_id', 'orders' (json strings) and 'inventory' 
+    (json strings by report type, see INVENTORY_REPORTS)
+    """
+    region_input = context.get_input()
+    account_name, retry_policy = RetryPolicy.from_account_input(region_input)
+    run = RunParameters.from_payload(region_input.get('run'), now=context.current_utc_datetime)
+    region = region_input['region']
+
+    graph = ReportGraph()
+    previous_lane = {}
+    for marketplace_id in region_input['marketplaces']:
+        lanes = {}
+        for report_type, start_date, end_date in run.reports():
+            lanes.setdefault(report_type, []).append({
+                **retry_policy.to_account_input(account_name),
+                'report_type': report_type,
+                'start_date': start_date,
+                'end_date': end_date,
+                'report_date': run.report_date.isoformat(),
+                'marketplace_id': marketplace_id,
+                'run_id': run.run_id,
+                'force': run.force
+            })
+
+        for report_type, report_inputs in lanes.items():
+            node = f"{marketplace_id} {report_type}"
+            graph.add(
+                node, 
+                lambda done, report_inputs=report_inputs: report_lane(context, retry_policy, report_inputs),
+                after=[previous_lane[report_type]] if report_type in previous_lane else []
+            )
+            previous_lane[report_type] = node
+
+    results = yield from graph.run(context)
+
+    if not context.is_replaying:
+        logging.info(f"Finished {len(region_input['marketplaces'])} marketplace(s) in '{region}' for '{account_name}'")
+    return [
+        {
+            'marketplace_id': marketplace_id,
+            'orders': results.get(f"{marketplace_id} {ORDERS_REPORT_TYPE}", []),
+            'inventory': {
+                report_type: results[f"{marketplace_id} {report_type}"] 
+                for report_type in run.inventory_reports
+            }
+        }
+        for marketplace_id in region_input['marketplaces']
+    ]
+
+
+main = Orchestrator.create(main)
@@ -0,0 +1,478 @@
+"""
+Runs the on-hand report pipeline for a range of past report dates, outside the Functions host (historical backfills,
+local performance work): one report per date, like an HTTP_trigger run with that report_date, for every account
+
+Usage (from the repository root):
+    python -m Utilities.backfill --start 2025-10-01 --end 2026-09-30 --settings local.settings.json
+    python -m Utilities.backfill --start 2026-09-01 --end 2026-09-30 --accounts DZ,QR --every 7 --workers 8
+    python -m Utilities.backfill ... --local-storage ./backfill  # files instead of the storage account
+    python -m Utilities.backfill ... --storage-connection-string UseDevelopmentStorage=true  # storage emulator
+
+The orders are downloaded once, as 30-day windows tiling the whole range (plus the lookback), instead of the
+lookback's windows again for every report date: a year of daily reports is ~15 orders reports per marketplace, not
+~1100. Each report date is then compiled from the slice of orders in its lookback. Interrupted runs pick up where
+they stopped: finished downloads and report dates are kept in the progress file, and the downloaded windows in the
+checkpoint storage (see Utilities.checkpoints)
+"""
+import argparse
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import uuid
+
+import pytz
+
+from Utilities.checkpoints import CheckpointStore
+from Utilities.lazy import LazyModule
+from Utilities.report_tools import GenerateFBAReport, ReportAssembler, ReportDownloadOrchestrator
+from Utilities.retry import FatalError, RetryPolicy
+from Utilities.run_parameters import DEFAULT_LOOKBACK_DAYS, ORDERS_REPORT_TYPE, RunParameters
+from Utilities.settings import KEY_NAME_ENV_VARS, Settings, get_settings
+from Utilities.snapshots import SnapshotStore
+from Utilities.tracing import tracer
+from Utilities.utils import storage_handler
+from Utilities.workbook import WorkbookBuilder
+
+np = LazyModule('numpy')
+pd = LazyModule('pandas')
+
+# (account, marketplace ID, report type, start date, end date), dates 'mm-dd-YYYY' (None for inventory reports)
+Task = Tuple[str, str, str, Optional[str], Optional[str]]
+
+
+def task_key(task: Task) -> str:
+    """The task's name in the progress file"""
+    return '|'.join(part or '' for part in task)
+
+
+class BackfillProgress:
+    """
+    Progress file of a backfill (json): its run ID (which the downloads are checkpointed under), downloaded reports,
+    failed ones (with their last error) and compiled report dates. Written after every change, through a temporary
+    file, so an interrupted run loses nothing
+
+    Parameters:
+        -path: (str) The file, created if missing
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path) as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            state = {}
+        self.run_id = state.get('run_id') or f"backfill-{uuid.uuid4().hex}"
+        self.downloaded = set(state.get('downloaded', []))
+        self.failed: Dict[str, str] = dict(state.get('failed', {}))
+        self.compiled = set(state.get('compiled', []))
+
+    def __save(self) -> None:
+        """Private method: writes the file (call with the lock held)"""
+        state = {
+            'updated_at': datetime.now().isoformat(timespec='seconds'),
+            'run_id': self.run_id,
+            'downloaded': sorted(self.downloaded),
+            'failed': self.failed,
+            'compiled': sorted(self.compiled)
+        }
+        with open(self.path + '.tmp', 'w') as f:
+            json.dump(state, f, indent=1)
+        os.replace(self.path + '.tmp', self.path)
+
+    def mark_downloaded(self, key: str) -> None:
+        with self._lock:
+            self.downloaded.add(key)
+            self.failed.pop(key, None)
+            self.__save()
+
+    def mark_failed(self, key: str, error: str) -> None:
+        with self._lock:
+            self.failed[key] = error
+            self.__save()
+
+    def mark_compiled(self, report_date: str) -> None:
+        with self._lock:
+            self.compiled.add(report_date)
+            self.__save()
+
+
+class BackfillRunner:
+    """
+    Downloads and compiles the on-hand reports of past report dates, with a bounded thread pool instead of the
+    Durable Functions host
+
+    Parameters:
+        -start_date/end_date: (str) First and last report date, 'YYYY-MM-DD' (inclusive)
+        -accounts: (Optional[List[str]]) Subset of ACCOUNTS_LIST. Default=None (all of them)
+        -lookback_days: (Optional[int]) Days of orders in each report. Default=None (90)
+        -every_days: (int) Days between report dates, counted back from end_date. Default=1 (daily)
+        -max_workers: (int) Reports downloaded at the same time, across accounts. Default=4
+        -per_account: (int) Reports downloaded at the same time for one account. Default=1
+        -progress_path: (str) Progress file, see `BackfillProgress`. Default='backfill-progress.json'
+        -prefix: (str) Folder of the written reports in the container, '' for next to the published ones.
+        Default='backfill'
+        -snapshot: (bool) Also save the reports to the snapshot history (see SNAPSHOTS_ENABLED). Default=False
+        -settings: (Optional[Settings]) Validated configuration. Default=None (the process's)
+
+    Example:
+        >>runner = BackfillRunner('2025-10-01', '2026-09-30', accounts=['DZ', 'QR'], every_days=7, max_workers=8)
+        >>runner.run()  # downloads, then writes 'backfill/On Hand Reports <date> DZ-QR.xlsx' for each report date
+
+    Considerations:
+        -Every SP-API call still goes through the seller's rate-limit buckets and the circuit breakers (shared by
+        the threads, see Utilities.marketplaces), and `per_account` caps how many of an account's reports are in
+        flight, so a wide pool doesn't pile onto one seller's quota
+        -The inventory reports are current ones (SP-API has no history of them), downloaded once and used for
+        every report date, as a manual run with a past report_date does
+        -Reports are uploaded to ON_HAND_BLOB_CONTAINER_NAME (through LOCAL_STORAGE_DIR instead if it is set) under
+        `prefix`, apart from the published reports, and a report date whose blob is already there is skipped: a
+        backfill never replaces a report
+        -The snapshot history isn't written unless `snapshot` is set, as the inventory columns are today's, not the
+        report date's. Even then, an account's existing snapshot of a date is kept
+    """
+    def __init__(
+        self,
+        start_date: str,
+        end_date: str,
+        accounts: Optional[List[str]] = None,
+        lookback_days: Optional[int] = None,
+        every_days: int = 1,
+        max_workers: int = 4,
+        per_account: int = 1,
+        progress_path: str = 'backfill-progress.json',
+        prefix: str = 'backfill',
+        snapshot: bool = False,
+        settings: Optional[Settings] = None
+    ):
+        self.settings = settings if settings is not None else get_settings()
+        self.start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
+        self.end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
+        if self.start_date > self.end_date:
+            raise ValueError(f"start_date {start_date} is after end_date {end_date}")
+        if every_days < 1 or max_workers < 1 or per_account < 1:
+            raise ValueError("every_days, max_workers and per_account must be positive")
+
+        self.lookback_days = int(lookback_days) if lookback_days else DEFAULT_LOOKBACK_DAYS
+        self.every_days = every_days
+        self.max_workers = max_workers
+        self.per_account = per_account
+        self.progress = BackfillProgress(progress_path)
+        self.prefix = prefix.strip('/')
+        self.snapshot = snapshot
+
+        # one run covering every report date's lookback: its windows are the downloads (validates the accounts,
+        # the range and the dates, like an HTTP_trigger run)
+        self.download_run = RunParameters(
+            accounts=accounts,
+            lookback_days=(self.end_date - self.start_date).days + self.lookback_days,
+            report_date=self.end_date.isoformat(),
+            settings=self.settings
+        )
+        self.accounts = self.download_run.accounts
+
+        self._credentials: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._credential_locks: Dict[Tuple[str, str], threading.Lock] = defaultdict(threading.Lock)
+        self._account_slots = {account: threading.Semaphore(per_account) for account in self.accounts}
+
+    def plan(self) -> List[Task]:
+        """Every report to download, accounts interleaved so the pool spreads over them"""
+        per_account = [
+            [
+                (account, marketplace_id, report_type, start, end)
+                for marketplace_id in self.settings.marketplaces[account.upper()]
+                for report_type, start, end in self.download_run.reports()
+            ]
+            for account in self.accounts
+        ]
+        longest = max(len(tasks) for tasks in per_account)
+        return [tasks[i] for i in range(longest) for tasks in per_account if i < len(tasks)]
+
+    def report_dates(self) -> List[date]:
+        """The report dates, oldest first: end_date, then every `every_days` back to start_date"""
+        count = (self.end_date - self.start_date).days // self.every_days
+        return [self.end_date - timedelta(days=i * self.every_days) for i in range(count, -1, -1)]
+
+    def __credentials(self, account: str, generator: GenerateFBAReport) -> None:
+        """
+        Private method: gives a generator the account's SP-API keys and access token for its region, from a cache
+        shared by the workers: the Key Vault is only read once per region, and the LWA token only requested again
+        when it nears expiry. The lock is only held while the cache is checked (and, then, refreshed)
+        """
+        key = (account, generator.region)
+        with self._credential_locks[key]:
+            for attribute, value in self._credentials.get(key, {}).items():
+                setattr(generator, attribute, value)
+
+            if not generator.refresh_token:
+                generator.get_amz_keys(account_name=account)
+            if not generator.has_valid_access_token():
+                generator.request_access_token()
+
+            self._credentials[key] = {
+                attribute: getattr(generator, attribute) 
+                for attribute in ['account_name', *KEY_NAME_ENV_VARS, 'access_token', 'access_token_expires_at']
+            }
+
+    def __orchestrator(
+        self, account: str, marketplace_id: str, retry_policy: RetryPolicy
+    ) -> ReportDownloadOrchestrator:
+        """
+        Private method: a report orchestrator of its own for the calling thread (they hold per-report state), with
+        the account's cached keys and access token (see `__credentials`)
+        """
+        generator = GenerateFBAReport(retry_policy=retry_policy, settings=self.settings, marketplace_id=marketplace_id)
+        self.__credentials(account, generator)
+        return ReportDownloadOrchestrator(
+            account_name=account,
+            report_generator=generator,
+            retry_policy=retry_policy,
+            checkpoints=CheckpointStore(account_name=account, run_id=self.progress.run_id),
+            report_date=self.end_date.isoformat(),
+            settings=self.settings
+        )
+
+    def __download(self, task: Task) -> None:
+        """Private method: downloads one report (to the checkpoint storage), retrying like the activities do"""
+        account, marketplace_id, report_type, start, end = task
+        window = f" {start} - {end}" if start else ''
+        what = f"'{report_type}'{window} for '{account}' ({marketplace_id})"
+
+        with self._account_slots[account]:
+            retry_policy = RetryPolicy()
+            max_attempts = 3
+            for current_attempt in retry_policy.attempts(
+                max_attempts=max_attempts, base_seconds=5, rate_of_growth=1.75, what=what
+            ):
+                try:
+                    orchestrator = self.__orchestrator(account, marketplace_id, retry_policy)
+                    orchestrator.get_report(report_type=report_type, start_date=start, end_date=end)
+                    return
+
+                except FatalError:
+                    raise
+
+                except Exception as e:
+                    logging.error(f"Error on attempt #{current_attempt} of {what}: {str(e)}")
+
+        raise RuntimeError(f"Failed to download {what} after {current_attempt} attempts (attempt cap reached)")
+
+    def download(self, tasks: Sequence[Task]) -> int:
+        """
+        Downloads the reports not downloaded yet, `max_workers` at a time
+
+        Returns:
+            -int: Number of reports that failed (their errors are in the progress file)
+        """
+        pending = [task for task in tasks if task_key(task) not in self.progress.downloaded]
+        logging.info(f"{len(tasks) - len(pending)} of {len(tasks)} reports already downloaded")
+
+        failures = 0
+        with tracer.span('backfill.download', reports=len(pending)):
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                futures = {pool.submit(self.__download, task): task for task in pending}
+                for future in as_completed(futures):
+                    key = task_key(futures[future])
+                    try:
+                        future.result()
+                        self.progress.mark_downloaded(key)
+                    except Exception as e:
+                        failures += 1
+                        self.progress.mark_failed(key, str(e))
+                        logging.error(f"Backfill download failed ({key}): {str(e)}")
+        return failures
+
+    def __account_sources(self, account: str) -> Tuple['pd.DataFrame', Dict[str, 'pd.DataFrame'], 'np.ndarray']:
+        """
+        Private method: an account's downloaded reports, parsed once for every report date: the orders (sorted by
+        purchase time, with their times in UTC) and the inventory dfs by report type
+        """
+        checkpoints = CheckpointStore(account_name=account, run_id=self.progress.run_id)
+        run_date = self.end_date.isoformat()
+        marketplaces = []
+        for marketplace_id in self.settings.marketplaces[account.upper()]:
+            reports = {}
+            for report_type, start, end in self.download_run.reports():
+                data = checkpoints.load(run_date, report_type, start, end, marketplace_id)
+                if data is None:
+                    raise RuntimeError(
+                        f"'{report_type}' {start} - {end} of '{account}' ({marketplace_id}) is missing from the "
+                        f"checkpoints, remove it from '{self.progress.path}' to download it again"
+                    )
+                reports.setdefault(report_type, []).append(data)
+
+            marketplaces.append({
+                'marketplace_id': marketplace_id,
+                'orders': reports.pop(ORDERS_REPORT_TYPE, []),
+                'inventory': reports
+            })
+
+        tag_marketplace = len(marketplaces) > 1
+        orders, inventory = ReportAssembler(account_name=account).read_on_hand_sources(
+            [{'account_name': account, 'marketplaces': marketplaces}], tag_marketplace=tag_marketplace
+        )
+
+        # only what the compiler reads, sorted by purchase time so each report date's lookback is a slice
+        orders = orders.reindex(
+            columns=['sku', 'quantity', 'purchase-date'] + (['marketplace'] if tag_marketplace else [])
+        )
+        times = pd.to_datetime(orders['purchase-date'], utc=True, errors='coerce').dt.tz_convert(None).to_numpy()
+        order = np.argsort(times, kind='stable')
+        return orders.iloc[order].reset_index(drop=True), inventory, times[order]
+
+    @staticmethod
+    def __window_edge(day: date) -> 'np.datetime64':
+        """Private method: midnight US/Eastern of a day, in UTC (where the orders windows start and end)"""
+        midnight = pytz.timezone('US/Eastern').localize(datetime.combine(day, datetime.min.time()))
+        return np.datetime64(midnight.astimezone(pytz.utc).replace(tzinfo=None), 'ns')
+
+    def blob_name(self, run: RunParameters) -> str:
+        """Where the report of a report date is written: the run's report name, under `prefix`"""
+        return f"{self.prefix}/{run.report_blob_name}" if self.prefix else run.report_blob_name
+
+    def compile(self) -> List[str]:
+        """
+        Compiles, writes and uploads the report of every report date not compiled yet, skipping those whose blob
+        already exists
+
+        Returns:
+            -List[str]: The blob names of the reports written
+        """
+        pending = [day for day in self.report_dates() if day.isoformat() not in self.progress.compiled]
+        if not pending:
+            return []
+
+        sources = {account: self.__account_sources(account) for account in self.accounts}
+        storage = storage_handler(os.getenv('ON_HAND_BLOB_CONTAINER_NAME'))
+        snapshots = SnapshotStore.for_run() if self.snapshot else None
+        columns = list(self.settings.on_hand_columns) if self.settings.on_hand_columns else None
+        metrics = list(self.settings.sales_metrics) if self.settings.sales_metrics else None
+
+        written = []
+        for report_date in pending:
+            run = RunParameters(
+                accounts=self.accounts,
+                lookback_days=self.lookback_days,
+                report_date=report_date.isoformat(),
+                settings=self.settings
+            )
+            blob_name = self.blob_name(run)
+            if storage.last_modified(blob_name) is not None:
+                logging.warning(f"'{blob_name}' already exists, not backfilling {report_date.isoformat()}")
+                self.progress.mark_compiled(report_date.isoformat())
+                continue
+
+            # the orders a run for that day downloads: from midnight lookback_days before, up to its own midnight
+            oldest = self.__window_edge(report_date - timedelta(days=self.lookback_days))
+            newest = self.__window_edge(report_date)
+            results = []
+            with tracer.span('backfill.compile', report_date=report_date.isoformat(), accounts=len(self.accounts)):
+                for account in self.accounts:
+                    orders, inventory, times = sources[account]
+                    rows = slice(np.searchsorted(times, oldest), np.searchsorted(times, newest))
+                    assembler = ReportAssembler(account_name=account, report_date=report_date)
+                    report = assembler.on_hand_report_compiler(
+                        orders=orders.iloc[rows], inventory=inventory, columns=columns, metrics=metrics,
+                        as_of=report_date.isoformat()
+                    )
+                    results.append((assembler.set_on_hand_report_name(), report.reset_index(drop=True)))
+
+                for name, buffer in WorkbookBuilder.from_env().build(results, blob_name):
+                    with buffer:
+                        storage.save_to_blob(buffer, save_as=name)
+
+            if snapshots is not None:
+                existing = {account for _, account in snapshots.partitions(report_date, report_date)}
+                missing = [i for i, account in enumerate(run.accounts) if account not in existing]
+                snapshots.save_run(
+                    report_date, [run.accounts[i] for i in missing], [results[i] for i in missing]
+                )
+            self.progress.mark_compiled(report_date.isoformat())
+            written.append(blob_name)
+            logging.info(f"Backfilled '{blob_name}'")
+        return written
+
+    def run(self, download_only: bool = False) -> List[str]:
+        """
+        Downloads every report, then compiles every report date (unless `download_only`)
+
+        Returns:
+            -List[str]: The blob names of the reports written
+
+        Raises:
+            -RuntimeError: if any download failed (nothing is compiled then, re-run to retry the failures)
+        """
+        failures = self.download(self.plan())
+        if failures:
+            raise RuntimeError(
+                f"{failures} report(s) failed to download, see '{self.progress.path}'. Re-run to retry them"
+            )
+        return [] if download_only else self.compile()
+
+
+def load_settings_file(path: str) -> None:
+    """Sets the 'Values' of a local.settings.json as env-vars (those already set win), like the Functions host"""
+    with open(path) as f:
+        values = json.load(f).get('Values', {})
+    for name, value in values.items():
+        if value not in (None, ''):
+            os.environ.setdefault(name, str(value))
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Backfills the on-hand reports of past dates, without the host")
+    parser.add_argument('--start', required=True, help="first report date, YYYY-MM-DD")
+    parser.add_argument('--end', required=True, help="last report date, YYYY-MM-DD")
+    parser.add_argument('--accounts', help="comma-separated subset of ACCOUNTS_LIST (default: all)")
+    parser.add_argument('--lookback-days', type=int, default=DEFAULT_LOOKBACK_DAYS)
+    parser.add_argument('--every', type=int, default=1, help="days between report dates (default: 1, daily)")
+    parser.add_argument('--workers', type=int, default=4, help="reports downloaded at once (default: 4)")
+    parser.add_argument('--per-account', type=int, default=1, help="reports downloaded at once per account")
+    parser.add_argument('--progress', default='backfill-progress.json', help="progress file, to resume from")
+    parser.add_argument('--settings', help="a local.settings.json to read the env-vars from")
+    parser.add_argument('--local-storage', help="folder to use instead of the storage account (LOCAL_STORAGE_DIR)")
+    parser.add_argument('--storage-connection-string', help="e.g. 'UseDevelopmentStorage=true' for the emulator")
+    parser.add_argument('--download-only', action='store_true', help="skip compiling the reports")
+    parser.add_argument('--prefix', default='backfill', help="folder of the reports in the container ('' for none)")
+    parser.add_argument('--snapshot', action='store_true', help="also save the dates missing from the snapshots")
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    if args.settings:
+        load_settings_file(args.settings)
+    if args.local_storage:
+        os.environ['LOCAL_STORAGE_DIR'] = args.local_storage
+    if args.storage_connection_string:
+        os.environ['STORAGE_CONNECTION_STRING'] = args.storage_connection_string
+
+    runner = BackfillRunner(
+        start_date=args.start,
+        end_date=args.end,
+        accounts=args.accounts.split(',') if args.accounts else None,
+        lookback_days=args.lookback_days,
+        every_days=args.every,
+        max_workers=args.workers,
+        per_account=args.per_account,
+        progress_path=args.progress,
+        prefix=args.prefix,
+        snapshot=args.snapshot
+    )
+    started = time.perf_counter()
+    written = runner.run(download_only=args.download_only)
+    print(
+        f"{len(runner.accounts)} accounts, {len(runner.progress.downloaded)} reports downloaded, "
+        f"{len(written)} report dates written in {time.perf_counter() - started:.1f} s",
+        file=sys.stderr
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+from datetime import datetime, timezone
+import hashlib
+import json
+import logging
+import os
+from typing import Optional
+
+from Utilities.utils import storage_handler
+
+
+class CheckpointStore:
+    """
+    Completion markers for downloaded report windows, stored with the data, so the retried activities of a run skip
+    the windows it already has
+
+    Layout (blob container or LOCAL_STORAGE_DIR folder):
+        checkpoints/<run date>/<run ID>/<account>[/<marketplace>]/<report type>/<start>_<end>.json   the report
+        checkpoints/<run date>/<run ID>/<account>[/<marketplace>]/<report type>/<start>_<end>.done   the marker,
+        written once the data is
+
+    Parameters:
+        -account_name: (str) The account the reports belong to
+        -run_id: (str) The run the reports belong to (see `RunParameters.run_id`)
+        -container_name: (Optional[str]) Default = CHECKPOINT_CONTAINER_NAME, or ON_HAND_BLOB_CONTAINER_NAME
+
+    Considerations:
+        -CHECKPOINTS_ENABLED env-var ('false' by default) turns them on with 'true', see `for_account`
+        -Checkpoints are scoped to one run: a re-triggered run (force=true, or once the report is older than
+        REPORT_MAX_AGE_HOURS) gets a new run ID, so it downloads everything again, the current inventory included.
+        Old checkpoints are never read again, use a lifecycle rule on the 'checkpoints/' prefix to delete them
+    """
+    prefix = 'checkpoints'
+
+    def __init__(self, account_name: str, run_id: str, container_name: Optional[str] = None):
+        if not run_id:
+            raise ValueError("Checkpoints need a run ID")
+        self.account_name = account_name
+        self.run_id = run_id
+        self.container_name = container_name or os.getenv('CHECKPOINT_CONTAINER_NAME') \
+            or os.getenv('ON_HAND_BLOB_CONTAINER_NAME')
+        self.storage = storage_handler(self.container_name)
+
+    @classmethod
+    def for_account(cls, account_name: str, run_id: Optional[str]) -> Optional['CheckpointStore']:
+        """The account's store for a run, or None unless CHECKPOINTS_ENABLED is 'true' (or without a run ID)"""
+        if (os.getenv('CHECKPOINTS_ENABLED') or 'false').strip().lower() not in ('true', '1', 'yes'):
+            return None
+        return cls(account_name=account_name, run_id=run_id) if run_id else None
+
+    def __key(
+        self, 
+        run_date: str, 
+        report_type: str, 
+        start_date: Optional[str], 
+        end_date: Optional[str], 
+        marketplace_id: Optional[str]
+    ) -> str:
+        """Private method: blob name of a window, without extension"""
+        window = f"{start_date}_{end_date}" if start_date or end_date else 'current'
+        account = f"{self.account_name}/{marketplace_id}" if marketplace_id else self.account_name
+        return f"{self.prefix}/{run_date}/{self.run_id}/{account}/{report_type}/{window}"
+
+    def load(
+        self, 
+        run_date: str, 
+        report_type: str, 
+        start_date: Optional[str], 
+        end_date: Optional[str], 
+        marketplace_id: Optional[str] = None
+    ) -> Optional[str]:
+        """Returns the saved report of a completed window, or None if there is none (or it doesn't check out)"""
+        key = self.__key(run_date, report_type, start_date, end_date, marketplace_id)
+        try:
+            marker = self.storage.get_bytes(key + '.done')
+            if marker is None:
+                return None
+
+            marker = json.loads(marker)
+            data = self.storage.get_bytes(key + '.json')
+            if data is None or hashlib.sha256(data).hexdigest() != marker.get('sha256'):
+                logging.warning(f"Checkpoint '{key}' has a marker but its data is missing or corrupt, ignoring it")
+                return None
+
+        except Exception as e:
+            # a checkpoint is an optimization, never a reason to fail the run
+            logging.warning(f"Could not read checkpoint '{key}', regenerating the report: {str(e)}")
+            return None
+
+        logging.info(f"Resuming from checkpoint '{key}' (saved {marker.get('saved_at')})")
+        return data.decode('utf-8')
+
+    def save(
+        self, 
+        run_date: str, 
+        report_type: str, 
+        start_date: Optional[str], 
+        end_date: Optional[str], 
+        data: str, 
+        marketplace_id: Optional[str] = None
+    ) -> None:
+        """Saves the report of a completed window, then its marker"""
+        key = self.__key(run_date, report_type, start_date, end_date, marketplace_id)
+        try:
+            encoded = data.encode('utf-8')
+            self.storage.save_bytes(encoded, save_as=key + '.json')
+            marker = {
+                'saved_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                'bytes': len(encoded),
+                'sha256': hashlib.sha256(encoded).hexdigest()
+            }
+            self.storage.save_bytes(json.dumps(marker).encode('utf-8'), save_as=key + '.done')
+
+        except Exception as e:
+            logging.warning(f"Could not save checkpoint '{key}', a retry will regenerate this report: {str(e)}")
@@ -0,0 +1,292 @@
+from collections import deque
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+from Utilities.retry import RetryPolicy
+
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+MODES = ('fail_fast', 'wait', 'off')
+
+
+class CircuitOpenError(Exception):
+    """
+    The endpoint's breaker is open (outage in progress), so the call was not sent. Retryable: the caller's retry
+    policy waits until the breaker lets a probe through before its next attempt (see `RetryPolicy.defer`)
+    """
+    def __init__(self, message: str, retry_after: float = 0.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _is_outage_status(status_code: int) -> bool:
+    """5xx responses count against the endpoint. Client errors and throttling (429, per seller) mean it is up"""
+    return status_code >= 500
+
+
+class CircuitBreaker:
+    """
+    Failure-rate circuit breaker for one endpoint and operation (e.g. SP-API createReport in the NA region)
+
+    Closed: calls go through, and the outcome of the last `window` calls is kept. Once at least `min_calls` were
+    made and the share of failures (connection errors, timeouts, 5xx) reaches `failure_rate`, the breaker opens.
+    Open: calls are refused for `open_seconds`. Half-open: up to `half_open_probes` calls go through as probes,
+    and the breaker closes once all of them succeed, or opens again at the first failure.
+
+    Parameters:
+        -name: (str) Name of the breaker in the logs (e.g. 'sellingpartnerapi-na.amazon.com spapi.create_report')
+        -failure_rate: (float) Share of failed calls that opens the breaker. Default = CIRCUIT_BREAKER_FAILURE_RATE
+        -window: (int) Number of recent calls the failure rate is computed over. Default = CIRCUIT_BREAKER_WINDOW
+        -min_calls: (int) Calls needed in the window before it can open. Default = CIRCUIT_BREAKER_MIN_CALLS
+        -open_seconds: (float) How long the breaker stays open. Default = CIRCUIT_BREAKER_OPEN_SECONDS
+        -half_open_probes: (int) Successful probes needed to close. Default = CIRCUIT_BREAKER_HALF_OPEN_PROBES
+        -mode: (str) 'fail_fast' (raise CircuitOpenError, which the retry loops retry once the breaker lets a probe
+        through), 'wait' (sleep until a probe is allowed, within the retry deadline) or 'off'. Default =
+        CIRCUIT_BREAKER_MODE
+        -clock: (Callable[[], float]) Monotonic clock, in seconds. Default = time.monotonic
+
+    Example:
+        >>breaker = get_breaker(url=reports_url + '/reports', operation='spapi.create_report')
+        >>response = breaker.call(req.post, url=reports_url + '/reports', json=params, retry_policy=policy)
+
+    Considerations:
+        -Use `get_breaker` rather than instantiating this directly, so every account running in the worker process
+        shares the same breaker for an endpoint
+        -Only the probes' outcomes count while half-open: a call let through while closed that returns after the
+        breaker opened is ignored
+    """
+    def __init__(
+        self,
+        name: str,
+        failure_rate: Optional[float] = None,
+        window: Optional[int] = None,
+        min_calls: Optional[int] = None,
+        open_seconds: Optional[float] = None,
+        half_open_probes: Optional[int] = None,
+        mode: Optional[str] = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.name = name
+        self.failure_rate = failure_rate if failure_rate is not None else \
+            float(os.getenv('CIRCUIT_BREAKER_FAILURE_RATE') or 0.5)
+        self.window = window or int(os.getenv('CIRCUIT_BREAKER_WINDOW') or 20)
+        self.min_calls = min_calls or int(os.getenv('CIRCUIT_BREAKER_MIN_CALLS') or 5)
+        self.open_seconds = open_seconds if open_seconds is not None else \
+            float(os.getenv('CIRCUIT_BREAKER_OPEN_SECONDS') or 60)
+        self.half_open_probes = half_open_probes or int(os.getenv('CIRCUIT_BREAKER_HALF_OPEN_PROBES') or 1)
+        self.mode = (mode or os.getenv('CIRCUIT_BREAKER_MODE') or 'fail_fast').strip().lower()
+        self.clock = clock
+
+        if self.mode not in MODES:
+            logging.error(f"CIRCUIT_BREAKER_MODE must be one of {MODES}, got '{self.mode}'")
+            raise ValueError(f"CIRCUIT_BREAKER_MODE must be one of {MODES}, got '{self.mode}'")
+
+        self.state = CLOSED
+        self.opened_at = None
+        self.outcomes = deque(maxlen=self.window)  # True = success
+        self.probes_in_flight = 0
+        self.probe_successes = 0
+        self.half_open_round = 0  # incremented at every half-open, so late probes of an earlier round are ignored
+        self.rejected = 0
+        self._condition = threading.Condition()
+
+    def seconds_until_probe(self) -> float:
+        """Seconds until an open breaker lets a probe through (0 when closed/half-open)"""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.opened_at + self.open_seconds - self.clock())
+
+    def __try_acquire(self) -> Tuple[bool, Optional[int]]:
+        """
+        Private method (call with the lock held): whether a call may go out now, moving open -> half-open, and the
+        half-open round it probes (None for a call let through while closed)
+        """
+        if self.state == OPEN and self.seconds_until_probe() <= 0:
+            self.state = HALF_OPEN
+            self.probes_in_flight = 0
+            self.probe_successes = 0
+            self.half_open_round += 1
+            logging.warning(f"Circuit '{self.name}' half-open, letting {self.half_open_probes} probe(s) through")
+
+        if self.state == CLOSED:
+            return True, None
+
+        if self.state == HALF_OPEN and self.probes_in_flight + self.probe_successes < self.half_open_probes:
+            self.probes_in_flight += 1
+            return True, self.half_open_round
+
+        return False, None
+
+    def acquire(self, retry_policy: Optional[RetryPolicy] = None) -> Optional[int]:
+        """
+        Waits for (or refuses) permission to make a call
+
+        Parameters:
+            -retry_policy: (Optional[RetryPolicy]) In 'wait' mode, never waits past this policy's deadline. In
+            'fail_fast' mode, its next backoff is deferred until the breaker lets a probe through
+
+        Returns:
+            -Optional[int]: The half-open round the call probes, None if it isn't a probe. Pass it to `record`
+
+        Raises:
+            -CircuitOpenError: if the breaker is open in 'fail_fast' mode, or won't close before the deadline
+        """
+        if self.mode == 'off':
+            return None
+
+        with self._condition:
+            while True:
+                allowed, probe = self.__try_acquire()
+                if allowed:
+                    return probe
+
+                # a probe is in flight if the breaker is half-open: check again once it reports back
+                wait_seconds = self.seconds_until_probe() or 1.0
+                remaining = retry_policy.remaining_seconds() if retry_policy else float('inf')
+
+                if self.mode == 'fail_fast' or wait_seconds >= remaining:
+                    self.rejected += 1
+                    logging.error(f"Circuit '{self.name}' is {self.state}, not calling the endpoint")
+                    if retry_policy is not None:
+                        retry_policy.defer(wait_seconds)
+                    raise CircuitOpenError(
+                        f"Circuit '{self.name}' is {self.state} (next probe in {wait_seconds:.0f} s)",
+                        retry_after=wait_seconds
+                    )
+
+                logging.info(f"Circuit '{self.name}' is {self.state}, waiting {wait_seconds:.1f} s")
+                self._condition.wait(timeout=wait_seconds)
+
+    def record(self, success: bool, probe: Optional[int] = None) -> None:
+        """
+        Records the outcome of a call let through by `acquire` (with the round `acquire` returned), opening/closing
+        the breaker as needed
+        """
+        if self.mode == 'off':
+            return
+
+        with self._condition:
+            if probe is not None:
+                if self.state != HALF_OPEN or probe != self.half_open_round:
+                    return  # a probe of an earlier round, already settled by another one
+
+                self.probes_in_flight = max(0, self.probes_in_flight - 1)
+                if not success:
+                    self.__open("probe failed")
+                else:
+                    self.probe_successes += 1
+                    if self.probe_successes >= self.half_open_probes:
+                        self.state = CLOSED
+                        self.outcomes.clear()
+                        logging.warning(f"Circuit '{self.name}' closed, the endpoint recovered")
+                self._condition.notify_all()
+                return
+
+            # a call let through while closed only counts if the breaker still is
+            if self.state != CLOSED:
+                return
+            self.outcomes.append(success)
+            if len(self.outcomes) >= self.min_calls:
+                failures = self.outcomes.count(False)
+                if failures / len(self.outcomes) >= self.failure_rate:
+                    self.__open(f"{failures} of the last {len(self.outcomes)} calls failed")
+
+    def release(self, probe: Optional[int]) -> None:
+        """Gives back a permission `acquire` granted for a call that was never sent (no outcome to record)"""
+        if self.mode == 'off' or probe is None:
+            return
+        with self._condition:
+            if self.state == HALF_OPEN and probe == self.half_open_round:
+                self.probes_in_flight = max(0, self.probes_in_flight - 1)
+                self._condition.notify_all()
+
+    def __open(self, reason: str) -> None:
+        """Private method (call with the lock held): opens the breaker for `open_seconds`"""
+        self.state = OPEN
+        self.opened_at = self.clock()
+        self.outcomes.clear()
+        logging.error(f"Circuit '{self.name}' opened for {self.open_seconds:.0f} s: {reason}")
+
+    def call(
+        self,
+        func: Callable[..., Any],
+        *args,
+        retry_policy: Optional[RetryPolicy] = None,
+        before: Optional[Callable[[], Any]] = None,
+        **kwargs
+    ) -> Any:
+        """
+        Makes an HTTP call through the breaker, e.g. `breaker.call(req.get, url=..., timeout=15)`
+
+        Exceptions (connection errors, timeouts) and 5xx responses count as failures. The response is returned
+        as-is, whatever its status, so callers handle status codes like before. `before` runs once the breaker
+        lets the call through, right before it is sent (e.g. taking a rate-limit token, which a refused call then
+        doesn't spend)
+        """
+        probe = self.acquire(retry_policy)
+        try:
+            if before is not None:
+                before()
+        except BaseException:
+            self.release(probe)
+            raise
+
+        try:
+            response = func(*args, **kwargs)
+        except Exception:
+            self.record(False, probe)
+            raise
+
+        self.record(not _is_outage_status(response.status_code), probe)
+        return response
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current state, for logs and load tests"""
+        with self._condition:
+            return {
+                'state': self.state,
+                'recent_calls': len(self.outcomes),
+                'recent_failures': self.outcomes.count(False),
+                'rejected': self.rejected
+            }
+
+
+# process-wide registry: every account (activity) running in this worker shares the breakers
+_breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+_registry_lock = threading.Lock()
+
+
+def get_breaker(url: str, operation: str) -> CircuitBreaker:
+    """
+    Returns the shared breaker for an endpoint (host of the URL) and operation, creating it on first use
+
+    Parameters:
+        -url: (str) URL being called. Only the host is kept, so all report IDs share the 'poll' breaker
+        -operation: (str) Name of the API operation (e.g. 'spapi.poll_status')
+    """
+    key = (urlsplit(url).netloc, operation)
+    with _registry_lock:
+        breaker = _breakers.get(key)
+        if breaker is None:
+            breaker = _breakers[key] = CircuitBreaker(name=f"{key[0]} {operation}")
+        return breaker
+
+
+def breaker_states() -> Dict[str, Dict[str, Any]]:
+    """Snapshot of every breaker created in this process, by name"""
+    with _registry_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.snapshot() for breaker in breakers}
+
+
+def reset_breakers() -> None:
+    """Forgets every breaker (e.g. between load test runs, or after changing the CIRCUIT_BREAKER_* env-vars)"""
+    with _registry_lock:
+        _breakers.clear()
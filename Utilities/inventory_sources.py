@@ -0,0 +1,76 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+# the base inventory report: every SKU of the on-hand report comes from it
+INVENTORY_REPORT_TYPE = 'GET_FBA_MYI_UNSUPPRESSED_INVENTORY_DATA'
+
+# inventory reports the on-hand report can join, by report type: {report column: on-hand report column}
+# https://developer-docs.amazon.com/sp-api/docs/report-type-values-fba
+INVENTORY_SOURCES: Dict[str, Dict[str, str]] = {
+    INVENTORY_REPORT_TYPE: {'afn-fulfillable-quantity': 'on-hand'},
+    'GET_RESERVED_INVENTORY_DATA': {'reserved_qty': 'reserved'},
+    'GET_FBA_INVENTORY_PLANNING_DATA': {'inbound-quantity': 'inbound', 'unfulfillable-quantity': 'unfulfillable'},
+}
+
+# descriptive columns, only taken from the base report
+DESCRIPTION_COLUMNS = ['asin', 'product-name']
+
+# every column the on-hand report can have ('sold' is the orders quantity, 'received' = on-hand + sold)
+AVAILABLE_COLUMNS = ['sku', 'asin', 'product-name', 'on-hand', 'sold', 'received', 'marketplace'] + [
+    column for report_type, columns in INVENTORY_SOURCES.items() if report_type != INVENTORY_REPORT_TYPE
+    for column in columns.values()
+]
+
+
+def source_columns(report_type: str) -> List[str]:
+    """The columns of a source report the on-hand report needs (the rest is dropped right after parsing)"""
+    columns = ['sku'] + list(INVENTORY_SOURCES[report_type])
+    return columns[:1] + DESCRIPTION_COLUMNS + columns[1:] if report_type == INVENTORY_REPORT_TYPE else columns
+
+
+def default_columns(
+    report_types: Sequence[str], marketplace: bool = False, metrics: Sequence[str] = ()
+) -> List[str]:
+    """
+    The on-hand report columns when ON_HAND_COLUMNS isn't set: the original ones, plus those of the extra sources
+    (before 'received'), plus the SALES_METRICS (after it), plus 'marketplace' for reports of several marketplaces
+    """
+    extra = [
+        column for report_type in report_types if report_type != INVENTORY_REPORT_TYPE
+        for column in INVENTORY_SOURCES[report_type].values()
+    ]
+    return ['sku', 'asin', 'product-name', 'on-hand'] + extra + ['received'] + list(metrics) + (
+        ['marketplace'] if marketplace else []
+    )
+
+
+def validate(
+    report_types: Sequence[str], columns: Optional[Sequence[str]], metrics: Sequence[str] = ()
+) -> Tuple[Tuple[str, ...], Optional[Tuple[str, ...]]]:
+    """
+    Checks the INVENTORY_REPORTS/ON_HAND_COLUMNS settings, returns them as tuples, the base report first (the
+    SALES_METRICS, already validated, are columns too)
+
+    Raises:
+        -ValueError: on unknown report types or columns, or columns whose source report isn't fetched
+    """
+    report_types = tuple(dict.fromkeys([INVENTORY_REPORT_TYPE, *report_types]))
+    unknown = [report_type for report_type in report_types if report_type not in INVENTORY_SOURCES]
+    if unknown:
+        raise ValueError(f"Unsupported inventory reports {unknown}, pick from {list(INVENTORY_SOURCES)}")
+
+    if columns is None:
+        return report_types, None
+
+    available = set(AVAILABLE_COLUMNS).union(metrics) - {
+        column for report_type, mapping in INVENTORY_SOURCES.items() if report_type not in report_types
+        for column in mapping.values()
+    }
+    unavailable = [column for column in columns if column not in available]
+    if unavailable:
+        raise ValueError(
+            f"On-hand columns {unavailable} are unknown, or their report isn't in INVENTORY_REPORTS (metrics: in "
+            f"SALES_METRICS) "
+            f"(available: {sorted(available)})"
+        )
+    return report_types, tuple(columns)
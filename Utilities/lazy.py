@@ -0,0 +1,39 @@
+import importlib
+from types import ModuleType
+from typing import Any, Optional
+
+
+class LazyModule:
+    """
+    Stands in for a heavy module (pandas, openpyxl, the Azure SDKs...) until one of its attributes is first used
+
+    Every function app entry point imports the Utilities modules when the worker starts, so importing pandas and
+    co. at the top of them made even the orchestrators, which never touch a DataFrame, pay for it on cold start.
+
+    Parameters:
+        -name: (str) The module to import, e.g. 'pandas' or 'azure.storage.blob'
+
+    Example:
+        >>pd = LazyModule('pandas')  # nothing imported yet
+        >>pd.DataFrame()  # pandas is imported here, once
+
+    Considerations:
+        -Only for modules used through attributes (`pd.DataFrame`). `from x import y` imports eagerly, so keep
+        those out of module level (or under `typing.TYPE_CHECKING` for annotations)
+        -Modules using it in annotations need `from __future__ import annotations`
+    """
+    def __init__(self, name: str):
+        self._name = name
+        self._module: Optional[ModuleType] = None
+
+    def __getattr__(self, attribute: str) -> Any:
+        # only called for attributes missing on the proxy itself, i.e. the module's
+        module = self._module
+        if module is None:
+            # import_module holds the import lock, so concurrent first uses get the same module
+            module = self._module = importlib.import_module(self._name)
+        return getattr(module, attribute)
+
+    def __repr__(self) -> str:
+        state = 'loaded' if self._module is not None else 'not loaded yet'
+        return f"<lazy module '{self._name}' ({state})>"
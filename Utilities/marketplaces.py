@@ -0,0 +1,164 @@
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from Utilities.lazy import LazyModule
+from Utilities.retry import RetryBudgetExhausted, RetryPolicy
+
+req = LazyModule('requests')
+req_adapters = LazyModule('requests.adapters')
+
+
+# marketplace ID -> (country code, SP-API region)
+# https://developer-docs.amazon.com/sp-api/docs/marketplace-ids
+MARKETPLACES = {
+    'ATVPDKIKX0DER': ('US', 'na'),
+    'A2EUQ1WTGCTBG2': ('CA', 'na'),
+    'A1AM78C64UM0Y8': ('MX', 'na'),
+    'A2Q3Y263D00KWC': ('BR', 'na'),
+    'A1F83G8C2ARO7P': ('UK', 'eu'),
+    'A28R8C7NBKEWEA': ('IE', 'eu'),
+    'A1PA6795UKMFR9': ('DE', 'eu'),
+    'A13V1IB3VIYZZH': ('FR', 'eu'),
+    'APJ6JRA9NG5V4': ('IT', 'eu'),
+    'A1RKKUPIHCS9HS': ('ES', 'eu'),
+    'A1805IZSGTT6HS': ('NL', 'eu'),
+    'AMEN7PMS3EDWL': ('BE', 'eu'),
+    'A2NODRKZP88ZB9': ('SE', 'eu'),
+    'A1C3SOZRARQ6R3': ('PL', 'eu'),
+    'A33AVAJ2PDY3EV': ('TR', 'eu'),
+    'ARBP9OOSHTCHU': ('EG', 'eu'),
+    'A17E79C6D8DWNP': ('SA', 'eu'),
+    'A2VIGQ35RCS4UG': ('AE', 'eu'),
+    'A21TJRUUN4KGV': ('IN', 'eu'),
+    'AE08WJ6YKNBMC': ('ZA', 'eu'),
+    'A19VAU5U5O7RUS': ('SG', 'fe'),
+    'A39IBJ37TRP1C6': ('AU', 'fe'),
+    'A1VC38T7YXB528': ('JP', 'fe'),
+}
+
+# region -> (Reports API endpoint, LWA token endpoint)
+# https://developer-docs.amazon.com/sp-api/docs/sp-api-endpoints
+REGIONS = {
+    'na': ('https://sellingpartnerapi-na.amazon.com/reports/2021-06-30', 'https://api.amazon.com/auth/o2/token'),
+    'eu': ('https://sellingpartnerapi-eu.amazon.com/reports/2021-06-30', 'https://api.amazon.co.uk/auth/o2/token'),
+    'fe': ('https://sellingpartnerapi-fe.amazon.com/reports/2021-06-30', 'https://api.amazon.co.jp/auth/o2/token'),
+}
+
+# Reports API usage plans, per operation: (requests per second, burst)
+# https://developer-docs.amazon.com/sp-api/docs/reports-api-v2021-06-30-reference
+RATE_LIMITS = {
+    'spapi.create_report': (0.0167, 15),
+    'spapi.list_reports': (0.0222, 10),
+    'spapi.poll_status': (2.0, 15),
+    'spapi.get_report': (2.0, 15),
+    'spapi.get_document': (0.0167, 15),
+}
+
+
+def region_of(marketplace_id: str) -> str:
+    """The SP-API region ('na', 'eu' or 'fe') serving a marketplace, raises ValueError for unknown IDs"""
+    try:
+        return MARKETPLACES[marketplace_id][1]
+    except KeyError:
+        raise ValueError(f"Unknown marketplace ID '{marketplace_id}', see Utilities.marketplaces.MARKETPLACES")
+
+
+def country_of(marketplace_id: str) -> str:
+    """Country code of a marketplace (e.g. 'US'), the marketplace ID itself if unknown"""
+    return MARKETPLACES.get(marketplace_id, (marketplace_id, None))[0]
+
+
+class RateLimiter:
+    """
+    Token bucket for one SP-API operation: calls wait for a token instead of getting throttled (429)
+
+    Parameters:
+        -rate: (float) Tokens added per second (the operation's rate limit)
+        -burst: (int) Bucket size, full at start (the operation's burst)
+        -name: (str) For logs
+        -clock: (Callable[[], float]) Monotonic clock, for tests. Default=time.monotonic
+
+    Considerations:
+        -Buckets are per process, while Amazon's are per seller and region, so with several workers this only
+        smooths each worker's share. The retry loops still handle the 429s that get through
+    """
+    def __init__(self, rate: float, burst: int, name: str = '', clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.name = name
+        self.clock = clock
+        self.tokens = float(burst)
+        self.updated_at = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self, retry_policy: Optional[RetryPolicy] = None) -> float:
+        """
+        Takes a token, waiting for one if the bucket is empty. Returns the seconds waited
+
+        Raises:
+            -RetryBudgetExhausted: if the next token comes after the retry policy's deadline
+        """
+        with self._lock:
+            now = self.clock()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+
+            # reserve the token now (the balance may go negative), so concurrent callers queue up behind it
+            wait_seconds = max(0.0, (1 - self.tokens) / self.rate)
+            remaining = retry_policy.remaining_seconds() if retry_policy else float('inf')
+            if wait_seconds >= remaining:
+                raise RetryBudgetExhausted(f"Rate limit '{self.name}': next token in {wait_seconds:.0f} s, too late")
+            self.tokens -= 1
+
+        if wait_seconds > 0:
+            logging.info(f"Rate limit '{self.name}' reached, waiting {wait_seconds:.1f} s")
+            time.sleep(wait_seconds)
+        return wait_seconds
+
+
+# process-wide registries, so every account running in this worker shares a region's pool and buckets
+_limiters: Dict[Tuple[str, str, str], RateLimiter] = {}
+_sessions: Dict[str, 'req.Session'] = {}
+_registry_lock = threading.Lock()
+
+
+def rate_limits_enabled() -> bool:
+    """SPAPI_RATE_LIMITS env-var: 'on' (default) or 'off'"""
+    return (os.getenv('SPAPI_RATE_LIMITS') or 'on').strip().lower() not in ('off', 'false', '0')
+
+
+def get_rate_limiter(region: str, operation: str, seller: Optional[str] = None) -> Optional[RateLimiter]:
+    """
+    Returns the shared bucket of a seller's operation in a region, or None if the operation isn't rate-limited
+    (e.g. LWA and report document downloads) or SPAPI_RATE_LIMITS is 'off'
+    """
+    if operation not in RATE_LIMITS or not rate_limits_enabled():
+        return None
+
+    key = (region, operation, seller or '')
+    with _registry_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            rate, burst = RATE_LIMITS[operation]
+            limiter = _limiters[key] = RateLimiter(rate, burst, name=f"{seller or '-'} {region} {operation}")
+        return limiter
+
+
+def get_session(region: str) -> 'req.Session':
+    """
+    Returns the region's shared HTTP session, so calls to a region reuse its connections (and one slow region
+    can't starve the others' connection pool)
+    """
+    with _registry_lock:
+        session = _sessions.get(region)
+        if session is None:
+            pool_size = int(os.getenv('SPAPI_POOL_SIZE') or 10)
+            session = req.Session()
+            adapter = req_adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _sessions[region] = session
+        return session
@@ -0,0 +1,245 @@
+import gzip
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from typing import IO, TYPE_CHECKING, Iterable, List, Optional, Union
+
+from Utilities.inventory_sources import INVENTORY_SOURCES, source_columns
+from Utilities.payload_codec import PayloadCodec
+from Utilities.run_parameters import ORDERS_REPORT_TYPE
+
+if TYPE_CHECKING:
+    from requests import Response
+
+
+# order report columns kept in the low-memory modes: the ones the reports use, plus the ones telling lines apart
+# (duplicate lines of overlapping windows are dropped when compiling)
+ORDER_COLUMNS = [
+    'amazon-order-id', 'purchase-date', 'order-status', 'product-name', 'sku', 'asin', 'item-status', 'quantity',
+    'item-price'
+]
+
+# modes the governor picks from: everything in memory as usual, or the low-memory mode of the stage
+IN_MEMORY = 'in-memory'
+SPILL = 'spill'  # downloads: body streamed to a spill file, parsed in chunks of rows, narrow projection; workbooks: 
+# written to spill files
+CHUNKED = 'chunked'  # compiles: each report projected right after parsing, before the next one is
+
+# peak memory per byte of data, measured on synthetic documents (benchmarks/synthetic.py): a parsed TSV holds the
+# text twice (decompressed bytes and str), the df (~5x the text) and its json (~3.5x) at once; pandas' read_json
+# peaks at ~13x the json
+GZIP_RATIO = 8
+DOWNLOAD_PEAK_PER_TEXT_BYTE = 12
+COMPILE_PEAK_PER_JSON_BYTE = 13
+# size of a formatted .xlsx per cell, measured on on-hand reports: what a workbook written in write-only mode (see
+# Utilities.workbook) holds in memory, and what WORKBOOK_MAX_MB is estimated with
+XLSX_BYTES_PER_CELL = 6
+
+MIB = 2 ** 20
+
+# MEMORY_BUDGET_MB default, in MiB: within the Consumption plan's 1.5 GB per instance, whatever the machine has
+DEFAULT_BUDGET_MB = 1200
+
+
+def spill_file(suffix: str = '') -> IO[bytes]:
+    """A temporary file on disk (in MEMORY_SPILL_DIR, default the system's temp folder), deleted once closed"""
+    return tempfile.NamedTemporaryFile(prefix='spill-', suffix=suffix, dir=os.getenv('MEMORY_SPILL_DIR') or None)
+
+
+def decompressed(file: IO[bytes], compression: str, chunk_bytes: int = MIB) -> IO[bytes]:
+    """
+    The decompressed document of a spill file, in a second spill file (the file itself if not compressed), flushed
+    so it can be memory-mapped by name. Close it once parsed
+    """
+    file.flush()
+    if compression != 'GZIP':
+        return file
+
+    file.seek(0)
+    output = spill_file()
+    try:
+        with gzip.GzipFile(fileobj=file, mode='rb') as stream:
+            shutil.copyfileobj(stream, output, chunk_bytes)
+        output.flush()
+    except BaseException:
+        output.close()
+        raise
+    return output
+
+
+def report_columns(report_type: Optional[str]) -> Optional[List[str]]:
+    """The columns of a report kept by the low-memory modes (None: unknown report, keep them all)"""
+    if report_type == ORDERS_REPORT_TYPE:
+        return list(ORDER_COLUMNS)
+    if report_type in INVENTORY_SOURCES:
+        return source_columns(report_type)
+    return None
+
+
+class MemoryGovernor:
+    """
+    Keeps report downloads and compiles within a memory budget: before parsing, it projects the peak memory of the
+    usual in-memory path (the process RSS plus the document's expected footprint) and, if that goes over the
+    budget, switches the stage to its low-memory mode, so large accounts run slower instead of getting the worker
+    OOM-killed (and retried into the same failure)
+
+    Modes (logged, and set on the 'report.download' span as 'memory_mode'):
+        -in-memory: the usual path
+        -spill (downloads): the body is streamed to a temporary file, decompressed to a second one, and parsed from
+        a memory-mapped view `chunk_rows` rows at a time, keeping only the columns the reports use 
+        (`report_columns`): the document sits in the OS page cache instead of the Python heap
+        -spill (workbooks): the .xlsx is written to, and formatted into, temporary files instead of buffers
+        -chunked (compiles): every report is cut down to the columns the compiler uses right after parsing, so only
+        one full report is parsed at a time
+
+    Parameters:
+        -budget_bytes: (Optional[int]) Memory the worker may use. Default=None (no budget: always in memory)
+        -chunk_rows: (int) Rows parsed at a time in spill mode. Default=100,000
+
+    Example:
+        >>mode = governor.plan_download("'GET_FLAT_FILE_ALL_ORDERS_DATA_BY_ORDER_DATE_GENERAL' report",
+        >>    response.headers.get('Content-Length'), 'GZIP')  # 'in-memory' or 'spill'
+
+    Considerations:
+        -Use the module-level `governor`, configured by MEMORY_BUDGET_MB: a number of MiB (default DEFAULT_BUDGET_MB,
+        for the Consumption plan's 1.5 GB per instance), "auto" (80% of the container's memory limit, or of the
+        machine's memory: only on plans whose instances get the whole machine, e.g. Premium/Dedicated) or "0" (off).
+        An invalid value is logged and the default used
+        -The document size comes from Content-Length (times GZIP_RATIO if compressed). Without it, only the RSS
+        counts. The RSS includes the other invocations running on the worker
+        -Once the RSS goes over the budget during a chunked parse, `check` logs it (once per stage)
+        -Spill files go to MEMORY_SPILL_DIR (default the system's temp folder, local disk on Azure), and are deleted
+        once parsed or uploaded
+    """
+    def __init__(self, budget_bytes: Optional[int] = None, chunk_rows: int = 100_000):
+        self.budget_bytes = budget_bytes or None
+        self.chunk_rows = chunk_rows
+        self._warned = threading.local()
+
+    @classmethod
+    def from_env(cls) -> 'MemoryGovernor':
+        """Builds the governor from the MEMORY_BUDGET_MB env-var (a typo falls back to DEFAULT_BUDGET_MB, logged)"""
+        budget = (os.getenv('MEMORY_BUDGET_MB') or str(DEFAULT_BUDGET_MB)).strip().lower()
+        if budget == 'auto':
+            limit = cls.memory_limit()
+            return cls(budget_bytes=int(limit * 0.8) if limit else None)
+
+        try:
+            megabytes = float(budget)
+        except ValueError:
+            megabytes = float('nan')
+        if not 0 <= megabytes < float('inf'):
+            logging.error(
+                f"MEMORY_BUDGET_MB must be a number of MiB, 'auto' or '0', got '{budget}': using {DEFAULT_BUDGET_MB}"
+            )
+            megabytes = DEFAULT_BUDGET_MB
+        return cls(budget_bytes=int(megabytes * MIB))
+
+    @property
+    def enabled(self) -> bool:
+        return self.budget_bytes is not None
+
+    @staticmethod
+    def memory_limit() -> Optional[int]:
+        """The container's memory limit (cgroup v2 or v1), else the machine's memory, in bytes (None if unknown)"""
+        for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+            try:
+                with open(path) as file:
+                    value = file.read().strip()
+            except OSError:
+                continue
+            # 'max' or a huge v1 value mean no limit
+            if value.isdigit() and int(value) < 2 ** 60:
+                return int(value)
+
+        try:
+            return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+        except (AttributeError, ValueError, OSError):
+            return None
+
+    @staticmethod
+    def rss() -> int:
+        """The process's resident memory, in bytes (its peak where the current one can't be read, 0 if neither)"""
+        try:
+            with open('/proc/self/statm') as file:
+                return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError, IndexError, AttributeError):
+            pass
+
+        try:
+            import resource
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        except (ImportError, OSError):
+            return 0
+
+    def plan(self, what: str, expected_bytes: int, low_memory_mode: str) -> str:
+        """
+        Picks the mode of a stage
+
+        Parameters:
+            -what: (str) The stage, for the log
+            -expected_bytes: (int) Peak memory the in-memory path would add
+            -low_memory_mode: (str) The mode to pick if that goes over the budget (SPILL or CHUNKED)
+
+        Returns:
+            -str: IN_MEMORY, or `low_memory_mode`
+        """
+        if not self.enabled:
+            return IN_MEMORY
+
+        self._warned.stage = None
+        rss = self.rss()
+        projected = rss + expected_bytes
+        mode = IN_MEMORY if projected <= self.budget_bytes else low_memory_mode
+        logging.info(
+            f"Memory plan for {what}: {mode} (projected peak {projected / MIB:,.0f} MiB = RSS {rss / MIB:,.0f} MiB "
+            f"+ ~{expected_bytes / MIB:,.0f} MiB, budget {self.budget_bytes / MIB:,.0f} MiB)"
+        )
+        return mode
+
+    def plan_download(self, what: str, content_length: Optional[Union[str, int]], compression: str) -> str:
+        """`plan` of a report download: IN_MEMORY or SPILL, from the document's Content-Length"""
+        try:
+            size = int(content_length) * (GZIP_RATIO if compression == 'GZIP' else 1)
+        except (TypeError, ValueError):
+            size = 0
+        return self.plan(what, size * DOWNLOAD_PEAK_PER_TEXT_BYTE, SPILL)
+
+    def plan_compile(self, what: str, payloads: Iterable[str]) -> str:
+        """`plan` of a compile: IN_MEMORY or CHUNKED, from the size of the report payloads (as json)"""
+        sizes = [PayloadCodec.json_bytes(payload) for payload in payloads]
+        # the largest one parsed, the others held as dfs (about their json size)
+        expected = max(sizes, default=0) * COMPILE_PEAK_PER_JSON_BYTE + sum(sizes)
+        return self.plan(what, expected, CHUNKED)
+
+    def plan_workbook(self, what: str, cells: int) -> str:
+        """`plan` of a workbook: IN_MEMORY or SPILL, from its number of cells (its .xlsx size, XLSX_BYTES_PER_CELL)"""
+        return self.plan(what, cells * XLSX_BYTES_PER_CELL, SPILL)
+
+    def check(self, what: str) -> None:
+        """Logs (once per stage and thread) if the RSS is over the budget"""
+        if not self.enabled or getattr(self._warned, 'stage', None) == what:
+            return
+        rss = self.rss()
+        if rss > self.budget_bytes:
+            self._warned.stage = what
+            logging.warning(
+                f"Memory over budget during {what}: RSS {rss / MIB:,.0f} MiB > {self.budget_bytes / MIB:,.0f} MiB. "
+                f"Lower MEMORY_BUDGET_MB, or move the account to a larger plan"
+            )
+
+    def spill(self, response: 'Response', chunk_bytes: int = MIB) -> IO[bytes]:
+        """Streams a (stream=True) response's body to a spill file, returned at its end (tell() = its size)"""
+        file = spill_file()
+        try:
+            for chunk in response.iter_content(chunk_size=chunk_bytes):
+                file.write(chunk)
+        except BaseException:
+            file.close()
+            raise
+        return file
+
+
+governor = MemoryGovernor.from_env()
@@ -0,0 +1,229 @@
+from datetime import datetime, timezone
+from functools import wraps
+import io
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from Utilities.utils import storage_handler
+
+
+# tracemalloc is process-wide: started by the first profiled invocation, stopped by the last one to finish
+_memory_lock = threading.Lock()
+_memory_users = 0
+
+
+class Profiler:
+    """
+    Opt-in profiling of the function entry points: a CPU profile (cProfile) and the top allocation sites
+    (tracemalloc) of every invocation, saved with the function, account and run they belong to
+
+    Layout (blob container or LOCAL_STORAGE_DIR folder):
+        profiles/<run>/<function>/<account>/<time>.prof   the CPU profile (pstats, e.g. `snakeviz` or `pstats`)
+        profiles/<run>/<function>/<account>/<time>.txt    summary: top functions by cumulative time, memory peak,
+        and top allocation sites
+
+    Parameters:
+        -cpu: (bool) Capture CPU profiles
+        -memory: (bool) Capture allocation sites
+        -container_name: (Optional[str]) Default = PROFILE_CONTAINER_NAME, or ON_HAND_BLOB_CONTAINER_NAME
+        -top: (int) Functions and allocation sites listed in the summaries. Default=30
+
+    Example:
+        >>@profiler.profiled('Activity_Orders')
+        >>def main(name):
+        >>    ...
+
+    Considerations:
+        -Use the module-level `profiler`, configured by the PROFILING env-var: 'cpu', 'memory', or both comma
+        separated ('on' = both). Off by default, and then `profiled` returns the function itself: no wrapper, no cost
+        -The run is the report date (and the instance ID for orchestrators), the account the input's 'account_name'
+        -tracemalloc slows allocation-heavy code down 2-3x and counts every thread of the worker, so concurrent
+        invocations see each other's allocations. Profile with 'memory' on a dedicated worker or locally
+        -Saving a profile never fails the invocation
+    """
+    prefix = 'profiles'
+
+    def __init__(self, cpu: bool = False, memory: bool = False, container_name: Optional[str] = None, top: int = 30):
+        self.cpu = cpu
+        self.memory = memory
+        self.container_name = container_name or os.getenv('PROFILE_CONTAINER_NAME') \
+            or os.getenv('ON_HAND_BLOB_CONTAINER_NAME')
+        self.top = top
+        self._storage = None
+
+    @classmethod
+    def from_env(cls) -> 'Profiler':
+        """Builds the profiler from the PROFILING (and PROFILE_TOP) env-vars"""
+        modes = {mode.strip().lower() for mode in (os.getenv('PROFILING') or '').split(',') if mode.strip()}
+        modes.discard('off')
+        if 'on' in modes:
+            modes = (modes - {'on'}) | {'cpu', 'memory'}
+
+        unknown = modes - {'cpu', 'memory'}
+        if unknown:
+            raise ValueError(f"Unknown PROFILING values {sorted(unknown)}, expected 'cpu' and/or 'memory' (or 'on')")
+        return cls(cpu='cpu' in modes, memory='memory' in modes, top=int(os.getenv('PROFILE_TOP') or 30))
+
+    @property
+    def enabled(self) -> bool:
+        return self.cpu or self.memory
+
+    def profiled(self, function_name: str) -> Callable[[Callable], Callable]:
+        """Decorator profiling every call of a function entry point (the function itself while profiling is off)"""
+        def decorator(func):
+            if not self.enabled:
+                return func
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                return self.__call(function_name, func, args, kwargs)
+            return wrapper
+        return decorator
+
+    def __call(self, function_name: str, func: Callable, args: tuple, kwargs: dict) -> Any:
+        """Private method: runs the function under the profilers, then saves what they captured"""
+        import cProfile
+
+        account, run = self.__tags(args[0] if args else next(iter(kwargs.values()), None))
+        cpu_profile = cProfile.Profile() if self.cpu else None
+        memory = self.memory and self.__start_memory()
+        started_at = datetime.now(timezone.utc)
+        started = time.perf_counter()
+        error = None
+        try:
+            if cpu_profile is not None:
+                try:
+                    cpu_profile.enable()
+                except ValueError:  # another profiler is active on this thread
+                    cpu_profile = None
+            return func(*args, **kwargs)
+
+        except BaseException as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+
+        finally:
+            if cpu_profile is not None:
+                cpu_profile.disable()
+            seconds = time.perf_counter() - started
+            allocations = self.__stop_memory() if memory else None
+            self.__save(function_name, account, run, started_at, seconds, error, cpu_profile, allocations)
+
+    @staticmethod
+    def __tags(payload: Any) -> Tuple[str, str]:
+        """Private method: (account, run) of an invocation, from the activity input or orchestration context"""
+        instance_id = None
+        if hasattr(payload, 'get_input'):
+            instance_id = getattr(payload, 'instance_id', None)
+            payload = payload.get_input()
+
+        if isinstance(payload, str):
+            return payload, 'no-run'
+        if not isinstance(payload, dict):
+            return 'all', instance_id or 'no-run'
+
+        run = payload.get('report_date') or (payload.get('run') or {}).get('report_date') or 'no-run'
+        if instance_id:
+            run = f"{run}/{instance_id}"
+        return payload.get('account_name') or 'all', run
+
+    @staticmethod
+    def __start_memory() -> bool:
+        """Private method: starts tracemalloc for this invocation (shared with concurrent ones)"""
+        global _memory_users
+        import tracemalloc
+
+        with _memory_lock:
+            if _memory_users == 0:
+                tracemalloc.start()
+                tracemalloc.reset_peak()
+            _memory_users += 1
+        return True
+
+    def __stop_memory(self) -> Dict[str, Any]:
+        """Private method: the top allocation sites still held, and the traced peak, then stops if last"""
+        global _memory_users
+        import tracemalloc
+
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap*>')
+        ])
+        _, peak = tracemalloc.get_traced_memory()
+        with _memory_lock:
+            _memory_users -= 1
+            if _memory_users == 0:
+                tracemalloc.stop()
+        return {'peak': peak, 'sites': snapshot.statistics('lineno')[:self.top]}
+
+    def __summary(
+        self,
+        function_name: str,
+        account: str,
+        run: str,
+        seconds: float,
+        error: Optional[str],
+        cpu_profile: Optional[Any],
+        allocations: Optional[Dict[str, Any]]
+    ) -> str:
+        """Private method: the readable summary of an invocation's profile"""
+        import pstats
+
+        lines = [
+            f"{function_name} | account {account} | run {run} | {seconds:.3f} s" + (f" | failed: {error}" if error else '')
+        ]
+        if cpu_profile is not None:
+            stream = io.StringIO()
+            pstats.Stats(cpu_profile, stream=stream).sort_stats('cumulative').print_stats(self.top)
+            lines += ['', f"CPU: top {self.top} functions by cumulative time", stream.getvalue().strip()]
+
+        if allocations is not None:
+            lines += [
+                '', f"Memory: traced peak {allocations['peak'] / 2 ** 20:.1f} MiB; top {self.top} allocation sites "
+                "still held at the end (size, count, line)"
+            ]
+            lines += [
+                f"{site.size / 2 ** 10:>12,.1f} KiB {site.count:>9,} {site.traceback}" for site in allocations['sites']
+            ]
+        return '\n'.join(lines) + '\n'
+
+    def __save(
+        self,
+        function_name: str,
+        account: str,
+        run: str,
+        started_at: datetime,
+        seconds: float,
+        error: Optional[str],
+        cpu_profile: Optional[Any],
+        allocations: Optional[Dict[str, Any]]
+    ) -> None:
+        """Private method: uploads the profile and summary of an invocation"""
+        import marshal
+
+        name = f"{self.prefix}/{run}/{function_name}/{account}/{started_at:%Y%m%dT%H%M%S.%fZ}"
+        try:
+            if self._storage is None:
+                self._storage = storage_handler(self.container_name)
+
+            summary = self.__summary(function_name, account, run, seconds, error, cpu_profile, allocations)
+            self._storage.save_bytes(summary.encode('utf-8'), save_as=name + '.txt')
+            if cpu_profile is not None:
+                cpu_profile.create_stats()
+                self._storage.save_bytes(marshal.dumps(cpu_profile.stats), save_as=name + '.prof')
+            logging.info(f"Saved the profile of {function_name} ({account}) to '{name}'")
+
+        except Exception as e:
+            logging.warning(f"Could not save the profile of {function_name} ({account}): {str(e)}")
+
+
+# a typo in PROFILING/PROFILE_TOP must not break every function importing this module: profile nothing instead
+try:
+    profiler = Profiler.from_env()
+except ValueError as e:
+    logging.error(f"Profiling is off: {str(e)}")
+    profiler = Profiler()
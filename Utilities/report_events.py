@@ -0,0 +1,92 @@
+import json
+import logging
+import os
+from typing import Any, Dict, Optional, Union
+
+from Utilities.utils import storage_handler
+
+
+COMPLETION_MODES = ('poll', 'events')
+
+
+def completion_mode() -> str:
+    """REPORT_COMPLETION_MODE env-var: 'poll' (default, activities poll the report status) or 'events'"""
+    mode = (os.getenv('REPORT_COMPLETION_MODE') or 'poll').strip().lower()
+    if mode not in COMPLETION_MODES:
+        logging.error(f"REPORT_COMPLETION_MODE must be one of {COMPLETION_MODES}, got '{mode}'")
+        raise ValueError(f"REPORT_COMPLETION_MODE must be one of {COMPLETION_MODES}, got '{mode}'")
+    return mode
+
+
+def event_timeout_minutes() -> float:
+    """REPORT_EVENT_TIMEOUT_MINUTES env-var: how long to wait for a notification before polling (default=30)"""
+    return float(os.getenv('REPORT_EVENT_TIMEOUT_MINUTES') or 30)
+
+
+def report_event_name(report_id: str) -> str:
+    """Name of the Durable external event raised once the report is processed"""
+    return f"ReportProcessingFinished-{report_id}"
+
+
+def parse_notification(message: Union[str, bytes, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Extracts the report details from an SP-API REPORT_PROCESSING_FINISHED notification
+
+    Parameters:
+        -message: (Union[str, bytes, Dict]) The notification, as delivered to the queue
+
+    Returns:
+        -Dictionary with report_id, report_type, processing_status and document_id (None unless status is 'DONE')
+
+    Raises:
+        -ValueError: if the message isn't a REPORT_PROCESSING_FINISHED notification
+    """
+    if isinstance(message, bytes):
+        message = message.decode('utf-8')
+    if isinstance(message, str):
+        message = json.loads(message)
+
+    if message.get('notificationType') != 'REPORT_PROCESSING_FINISHED':
+        raise ValueError(f"Not a REPORT_PROCESSING_FINISHED notification: '{message.get('notificationType')}'")
+
+    details = message.get('payload', {}).get('reportProcessingFinishedNotification', {})
+    if not details.get('reportId'):
+        raise ValueError("Notification has no reportId")
+
+    return {
+        'report_id': str(details['reportId']),
+        'report_type': details.get('reportType'),
+        'processing_status': details.get('processingStatus'),
+        'document_id': details.get('reportDocumentId')
+    }
+
+
+class ReportEventRegistry:
+    """
+    Maps requested report IDs to the orchestration instance waiting for them, so notifications find their way back
+
+    Parameters:
+        -container_name: (Optional[str]) Blob container for the mapping. Default = REPORT_EVENTS_CONTAINER_NAME,
+        or ON_HAND_BLOB_CONTAINER_NAME if not set
+
+    Considerations:
+        -Set LOCAL_STORAGE_DIR to keep the mapping in a local folder instead (local runs, see `storage_handler`)
+    """
+    prefix = 'report-events'
+
+    def __init__(self, container_name: Optional[str] = None):
+        self.container_name = container_name or os.getenv('REPORT_EVENTS_CONTAINER_NAME') \
+            or os.getenv('ON_HAND_BLOB_CONTAINER_NAME')
+        self.storage = storage_handler(self.container_name)
+
+    def register(self, report_id: str, instance_id: str) -> None:
+        entry = json.dumps({'report_id': report_id, 'instance_id': instance_id})
+        self.storage.save_bytes(entry.encode('utf-8'), save_as=f"{self.prefix}/{report_id}.json")
+
+    def lookup(self, report_id: str) -> Optional[str]:
+        """Instance ID waiting for the report, or None if it isn't one of ours (or was already handled)"""
+        entry = self.storage.get_bytes(f"{self.prefix}/{report_id}.json")
+        return json.loads(entry)['instance_id'] if entry else None
+
+    def forget(self, report_id: str) -> None:
+        self.storage.delete(f"{self.prefix}/{report_id}.json")
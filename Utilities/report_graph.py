@@ -0,0 +1,89 @@
+import logging
+from typing import Any, Callable, Dict, Generator, Iterable, List, Tuple
+
+
+class ReportGraph:
+    """
+    Small dependency graph of durable work inside an orchestrator: each node is a chain of activities (a generator
+    yielding durable tasks, like `report_via_event`), started as soon as the nodes it depends on are done, and run
+    concurrently with every other started node
+
+    Example:
+        >>graph = ReportGraph()
+        >>graph.add('orders', lambda done: orders_chain(context))
+        >>graph.add('inventory', lambda done: inventory_chain(context))
+        >>graph.add('compile', lambda done: compile_chain(context, done['orders'], done['inventory']),
+        >>          after=['orders', 'inventory'])
+        >>results = yield from graph.run(context)  # {'orders': ..., 'inventory': ..., 'compile': ...}
+
+    Considerations:
+        -`run` is a generator meant to be delegated to with `yield from` inside an orchestrator function. Nodes
+        start in the order they were added, so the orchestration stays deterministic on replay
+        -Nodes can only depend on nodes added before them, which keeps the graph acyclic
+        -A failed activity fails the whole graph, like `task_all` would
+    """
+    def __init__(self):
+        self.nodes: Dict[str, Tuple[Callable[[Dict[str, Any]], Generator], Tuple[str, ...]]] = {}
+
+    def add(self, name: str, chain: Callable[[Dict[str, Any]], Generator], after: Iterable[str] = ()) -> None:
+        """
+        Adds a node
+
+        Parameters:
+            -name: (str) Unique name of the node, the key of its result
+            -chain: (Callable) Gets the results of the `after` nodes (by name), returns the node's generator
+            -after: (Iterable[str]) Nodes that must be done before this one starts. Default=() (starts right away)
+        """
+        after = tuple(after)
+        if name in self.nodes:
+            raise ValueError(f"Node '{name}' was already added to the graph")
+        unknown = [dependency for dependency in after if dependency not in self.nodes]
+        if unknown:
+            raise ValueError(f"Node '{name}' depends on nodes not added yet: {unknown}")
+        self.nodes[name] = (chain, after)
+
+    def run(self, context):
+        """
+        Runs every node, each one as soon as its dependencies are done
+
+        Parameters:
+            -context: (DurableOrchestrationContext) The context of the calling orchestrator
+
+        Returns:
+            -Dictionary of the nodes' results (their generators' return values), by name
+        """
+        results: Dict[str, Any] = {}
+        waiting = list(self.nodes)
+        in_flight: List[Tuple[str, Generator, Any]] = []
+
+        def advance(name: str, chain: Generator, value: Any) -> None:
+            """Resumes a node with the result of its last task, until it yields its next task or returns"""
+            try:
+                in_flight.append((name, chain, chain.send(value)))
+            except StopIteration as done:
+                results[name] = done.value
+
+        while waiting or in_flight:
+            for name in [name for name in waiting if all(dep in results for dep in self.nodes[name][1])]:
+                waiting.remove(name)
+                chain, after = self.nodes[name]
+                advance(name, chain({dependency: results[dependency] for dependency in after}), None)
+
+            if not in_flight:
+                continue  # nodes that finished without yielding anything may have unblocked others
+
+            finished = yield context.task_any([task for _, _, task in in_flight])
+
+            for i, (name, chain, task) in enumerate(in_flight):
+                if task is finished:
+                    in_flight.pop(i)
+                    break
+
+            # task_any completes on failures too, so surface them the same way task_all would
+            if isinstance(finished.result, Exception):
+                logging.error(f"Node '{name}' of the report graph failed: {str(finished.result)}")
+                raise finished.result
+
+            advance(name, chain, finished.result)
+
+        return results
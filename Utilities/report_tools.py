@@ -1,29 +1,61 @@
-from ast import literal_eval
-from datetime import datetime, timedelta
+from __future__ import annotations
+
+from datetime import date, datetime, timedelta
 import gzip
 import io
 import json
 import logging
-import os
 import re
-from typing import Optional, Tuple, Union
-
-from azure.identity import DefaultAzureCredential
-from azure.keyvault.secrets import SecretClient
+import time
+from typing import IO, TYPE_CHECKING, Any, Dict, List, Optional, Tuple, Union
 
-import openpyxl as xl
-from openpyxl.worksheet.worksheet import Worksheet
-import pandas as pd
 import pytz
-import requests as req
 
+from Utilities.checkpoints import CheckpointStore
+from Utilities.circuit_breaker import CircuitOpenError, get_breaker
+from Utilities.inventory_sources import (
+    AVAILABLE_COLUMNS, DESCRIPTION_COLUMNS, INVENTORY_REPORT_TYPE, INVENTORY_SOURCES, default_columns, source_columns
+)
+from Utilities.lazy import LazyModule
+from Utilities.marketplaces import country_of, get_rate_limiter, get_session
+from Utilities.payload_codec import payload_codec
+from Utilities.memory import CHUNKED, ORDER_COLUMNS, SPILL, decompressed, governor, report_columns, spill_file
+from Utilities.retry import FatalError, RetryPolicy
+from Utilities.run_parameters import eastern_today
+from Utilities.sales_metrics import MetricsEngine
+from Utilities.settings import KEY_NAME_ENV_VARS, Settings, get_settings
+from Utilities.sku_index import SkuIndex
+from Utilities.tracing import tracer
 from Utilities.utils import Helpers, Style
 
+# heavy dependencies are imported on first use, not when the function app loads this module (see Utilities.lazy)
+azure_identity = LazyModule('azure.identity')
+keyvault_secrets = LazyModule('azure.keyvault.secrets')
+xl = LazyModule('openpyxl')
+np = LazyModule('numpy')
+pd = LazyModule('pandas')
+req = LazyModule('requests')
+
+# identifiers and text of the flat-file reports, always read as text: pandas would otherwise guess a numeric-looking
+# SKU ('000123') is a number, dropping its leading zeros, and a chunked read guesses per chunk, mixing ints and strs
+TEXT_COLUMNS = (
+    'sku', 'asin', 'fnsku', 'product-name', 'condition', 'amazon-order-id', 'merchant-order-id', 'ship-postal-code'
+)
+
+if TYPE_CHECKING:
+    from azure.keyvault.secrets import SecretClient
+    from openpyxl.worksheet.worksheet import Worksheet
+
 
 class ZeroSalesError(Exception):
     pass
 
 
+class ReportFailedError(Exception):
+    """SP-API finished the report as FATAL/CANCELLED: polling it again won't help, requesting a new one might"""
+    pass
+
+
 class GenerateFBAReport:
     """Downloads data from the Amazon Reports SP-API
 
@@ -66,28 +98,44 @@ class GenerateFBAReport:
         
         -This class uses `DefaultAzureCredential` authentication, so ensure your managed identities are in order
 
-        -Eager-validates environment variables and keys, so ensure the above above requirements are all met
+        -Eager-validates environment variables and keys, so ensure the above above requirements are all met. The
+        variables are read and validated once per process (see Utilities.settings), pass `settings` to reuse them
 
         -Full list of available reports to generate using this class: 
         https://developer-docs.amazon.com/sp-api/docs/report-type-values-fba    
-    """
-    def __init__(self):    
-        # validating current accounts list
-        try:
-            self.current_accounts = literal_eval(os.getenv('ACCOUNTS_LIST'))
-        except SyntaxError:
-            raise SyntaxError("No accounts detected in ACCOUNTS_LIST env-var. Pass a list with at least one acc name")
 
-        if isinstance(self.current_accounts, list) and len(self.current_accounts) == 0:
-            raise SyntaxError("Empty list detected for ACCOUNTS_LIST. Please pass at least one acc name")
-        
-        # validating environment variables 
-        self.__validate_environment_variables()
+        -Every retry loop of this class follows `retry_policy`: no retries on fatal errors (e.g. 401/403), and none
+        past the policy deadline. Pass the policy of the run/account (see Utilities.retry.RetryPolicy)
+
+        -Every HTTP call goes through the shared circuit breaker of its endpoint (see Utilities.circuit_breaker), 
+        so during an SP-API outage calls fail fast with CircuitOpenError, retried once the breaker lets a probe
+        through
+
+        -One instance talks to one marketplace (`marketplace_id`, default MARKETPLACE_ID): the Reports API and LWA 
+        endpoints, the connection pool and the rate-limit buckets are those of the marketplace's region (see 
+        Utilities.marketplaces). Create one instance per marketplace to run several
+    """
+    def __init__(
+        self, 
+        retry_policy: Optional[RetryPolicy] = None, 
+        settings: Optional[Settings] = None, 
+        marketplace_id: Optional[str] = None
+    ):    
+        # validated environment variables (parsed once per process, not per instance)
+        self.settings = settings if settings is not None else get_settings()
+        self.current_accounts = list(self.settings.accounts)
+
+        # marketplace, and the region serving it
+        self.marketplace_id = marketplace_id or self.settings.marketplace_id
+        self.region = self.settings.region(self.marketplace_id)
+        self.reports_url, self.token_request_url = self.settings.regions[self.region]
+        self.session = get_session(self.region)
 
         # validating date range input (populates during `request_FBA_report` via `__validate_user_input`)
         self.start_date_iso, self.end_date_iso = None, None        
         
         # vault and api keys
+        self.account_name = None
         self.key_vault = None
         self.client_secret = None
         self.refresh_token = None
@@ -96,47 +144,34 @@ class GenerateFBAReport:
 
         # utils and general attributes
         self.backoff = Helpers()
-        self.reports_url = os.getenv("ENDPOINT")
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
         self.access_token = None
+        self.access_token_expires_at = None  # time.time() of the token's expiry
         self.report_id = None 
         self.report_endpoint = None
         self.report_type = None 
         self.download_url = None
         self.compression = None
     
-    def __validate_environment_variables(self) -> None:
-        """Private method: validates the Function App environmental variables upon class instantiation"""
+    def _send(self, operation: str, method: str, url: str, **kwargs) -> req.Response:
+        """
+        Sends one HTTP call through the region's connection pool and the endpoint's circuit breaker, then (once the
+        breaker lets it through) a token from the seller's rate-limit bucket for the operation, if it has one
 
-        # vault name environment variables per each account
-        account_env_vars_required = [f"{account.upper()}_VAULT_NAME" for account in self.current_accounts]
-        
-        # general environment variables 
-        general_env_vars_required = [
-            "ACCOUNTS_LIST",
-            "CLIENT_ID",
-            "CLIENT_SECRET",
-            "REFRESH_TOKEN",
-            "TOKEN_REQUEST_URL",
-            "MARKETPLACE_ID",
-            "ENDPOINT",
-            "ROTATION_DEADLINE"
-        ]
-        
-        required_env_vars = general_env_vars_required + account_env_vars_required
+        Parameters:
+            -operation: (str) API operation, names the breaker and bucket (e.g. 'spapi.create_report')
+            -method: (str) 'get' or 'post'
+            -url: (str) The URL to call. Other keyword arguments go to `requests`
+        """
+        limiter = get_rate_limiter(self.region, operation, seller=self.account_name)
+        return get_breaker(url, operation).call(
+            getattr(self.session, method),
+            retry_policy=self.retry_policy,
+            before=(lambda: limiter.acquire(self.retry_policy)) if limiter is not None else None,
+            url=url,
+            **kwargs
+        )
 
-        # break program if any env vars are missing
-        missing_vars = [var for var in required_env_vars if not os.getenv(var) or len(os.getenv(var)) == 0]        
- 
-        if missing_vars:
-            missing_vars = ', '.join(missing_vars)
-            logging.error(f"Missing the following environmental variables: {missing_vars}")
-            raise ValueError(
-                f"""Missing some environmental vars: check your 'ACCOUNTS_LIST' and '<name>_VAULT_NAME' vars. 
-                Missing: {missing_vars}"""
-                )
-        else:
-            logging.info("Successfully validated all required environment variables")
-         
     def __validate_user_input(self, start_date: str, end_date: str) -> Tuple[str, str]:
         """Private method: validates ['start_date', 'end_date'] inputs to `request_fba_report` method"""
         try:            
@@ -190,14 +225,12 @@ class GenerateFBAReport:
         Parameters:
             -account_name: (str) The account name initials of the key vault you wish to initialize (e.g. "PO")
         """
-        vault_name = os.getenv(f'{account_name.upper()}_VAULT_NAME')
-        if not vault_name or len(vault_name) == 0:
-            raise ValueError(f'Could not locate vault name environmental variable for account: {account_name}')
+        vault_name = self.settings.vault_name(account_name, region=self.region)
         
         try:             
-            secret_client = SecretClient(
+            secret_client = keyvault_secrets.SecretClient(
                 vault_url=f"https://{vault_name}.vault.azure.net",
-                credential=DefaultAzureCredential()
+                credential=azure_identity.DefaultAzureCredential()
             )
             
             # populate attribute
@@ -216,18 +249,10 @@ class GenerateFBAReport:
         if self.key_vault is None:
             raise ValueError("Must first initialize an instance of the key vault")
 
-        keys_needed_to_run_app = [
-            "CLIENT_SECRET",
-            "CLIENT_ID",
-            "REFRESH_TOKEN",
-            "ROTATION_DEADLINE"
-        ]
-        
         # making sure the key names exist and match to the env var names you set them as
         missing_keys = []
-        for env_var in keys_needed_to_run_app:
+        for env_var, key_name in zip(KEY_NAME_ENV_VARS.values(), self.settings.key_names.values()):
             try:
-                key_name = os.getenv(env_var)
                 self.key_vault.get_secret(key_name)
                 
             except Exception as e:
@@ -267,31 +292,28 @@ class GenerateFBAReport:
         Populates client_id, client_secret, rotation_deadline and refresh_token instance attributes 
         for an acccount, enables access to SP-API"""
 
-        # initialize the key vault 
-        if not self.key_vault:
-            self._init_key_vault(account_name=account_name)
-        
-        # validate the keys and env vars before proceeding
-        self._validate_key_vault()
-                
-        keys_dict = {
-            'client_id': os.getenv("CLIENT_ID"),
-            'client_secret': os.getenv("CLIENT_SECRET"),
-            'refresh_token': os.getenv("REFRESH_TOKEN"),
-            'rotation_deadline': os.getenv("ROTATION_DEADLINE")
-        }
-        
-        # populate instance attributes with the key secrets
-        for k, v in keys_dict.items():
-            try:
-                secret_value = self._fetch_from_key_vault(v) 
-                setattr(self, k, secret_value)
-                logging.debug(f"Successfully fetched key for {k}")   
-
-            # break program if any key names are missing                                  
-            except Exception as e:
-                logging.error(f"Could not fetch key for {k}: {str(e)}")
-                raise
+        self.account_name = account_name
+        with tracer.span('keyvault.fetch', account=account_name):
+            # initialize the key vault 
+            if not self.key_vault:
+                self._init_key_vault(account_name=account_name)
+            
+            # validate the keys and env vars before proceeding
+            self._validate_key_vault()
+                    
+            keys_dict = self.settings.key_names
+            
+            # populate instance attributes with the key secrets
+            for k, v in keys_dict.items():
+                try:
+                    secret_value = self._fetch_from_key_vault(v) 
+                    setattr(self, k, secret_value)
+                    logging.debug(f"Successfully fetched key for {k}")   
+
+                # break program if any key names are missing                                  
+                except Exception as e:
+                    logging.error(f"Could not fetch key for {k}: {str(e)}")
+                    raise
 
         logging.info("Successfully fetched all keys from vault")
         
@@ -309,49 +331,53 @@ class GenerateFBAReport:
             logging.error("Must first get the key vault secrets before requesting an access token")
             raise ValueError("Must populate the key vault instance attributes before requesting an access token")
 
-        token_request_url = os.getenv('TOKEN_REQUEST_URL')   
-
-        if not token_request_url or len(token_request_url) == 0:
-            logging.error("No environment variable for TOKEN_REQUEST_URL was located")
-            raise ValueError("No environment variable for TOKEN_REQUEST_URL was located")
+        token_request_url = self.token_request_url
         
         max_retries = 5
-        current_attempt = 1
-        
-        while current_attempt <= max_retries:
+        for current_attempt in self.retry_policy.attempts(max_attempts=max_retries, what='LWA token request'):
             try:
-                token_request = req.post(
-                    url=token_request_url,
-                    timeout=15,
-                    data={
-                        "grant_type": "refresh_token",
-                        "refresh_token": self.refresh_token,
-                        "client_id": self.client_id,
-                        "client_secret": self.client_secret                
-                    }
-                )
+                with tracer.span('lwa.token', attempt=current_attempt) as span:
+                    token_request = self._send(
+                        'lwa.token', 'post',
+                        url=token_request_url,
+                        timeout=15,
+                        data={
+                            "grant_type": "refresh_token",
+                            "refresh_token": self.refresh_token,
+                            "client_id": self.client_id,
+                            "client_secret": self.client_secret                
+                        }
+                    )
+                    span.set_attribute('status_code', token_request.status_code)
                 
                 if token_request.status_code == 200:    
-                    self.access_token = token_request.json().get('access_token', '')
+                    token = token_request.json()
+                    self.access_token = token.get('access_token', '')
+                    self.access_token_expires_at = time.time() + float(token.get('expires_in') or 3600)
                     logging.debug("Successfully fetched request token")
                     return self.access_token
                 
-                elif token_request.status_code in [400, 401, 403, 404]:
+                elif not RetryPolicy.is_retryable_status(token_request.status_code):
                     logging.error(f"{token_request.status_code} Error, couldn't fetch LWA token")
-                    raise RuntimeError(f"{token_request.status_code} Error, couldn't fetch LWA token")
+                    raise FatalError(f"{token_request.status_code} Error, couldn't fetch LWA token")
                     
                 else:
                     logging.error(f"{token_request.status_code} Error, failed to retrieve LWA token")
-                    self.backoff.exponential_backoff(current_attempt)
-                    current_attempt += 1
+
+            except FatalError:
+                raise
 
             except Exception as e:
                 logging.error(f"Failed to request LWA token: {str(e)}")
-                self.backoff.exponential_backoff(current_attempt)
-                current_attempt += 1
         
-        logging.error(f"Couldn't fetch access token after {max_retries} attempts")
-        raise RuntimeError(f"Could not fetch the access token after {max_retries} attempts")
+        logging.error(f"Couldn't fetch access token after {current_attempt} attempts (attempt cap reached)")
+        raise RuntimeError(f"Could not fetch the access token after {current_attempt} attempts (attempt cap reached)")
+    
+    def has_valid_access_token(self, margin_seconds: float = 300) -> bool:
+        """Whether the access token is set and won't expire within `margin_seconds` (LWA tokens last an hour)"""
+        if not self.access_token:
+            return False
+        return self.access_token_expires_at is None or time.time() + margin_seconds < self.access_token_expires_at
     
     def request_FBA_report(
         self, 
@@ -389,49 +415,53 @@ class GenerateFBAReport:
 
         # inv report doesn't take date params, but they dont break it either
         report_params = {
-            'marketplaceIds': [os.getenv("MARKETPLACE_ID")],
+            'marketplaceIds': [self.marketplace_id],
             'reportType': self.report_type,
             'dataStartTime': self.start_date_iso,
             'dataEndTime': self.end_date_iso
             }
 
-        current_attempt = 1 
+        self.report_id = None  # don't mistake the previous report for this one if every attempt fails
         max_attempts = 5        
-        while current_attempt <= max_attempts:
+        for current_attempt in self.retry_policy.attempts(max_attempts=max_attempts, what=f"'{self.report_type}' request"):
             try:                
                 report_endpoint = self.reports_url + '/reports' 
-                request_download = req.post(
-                    url=report_endpoint,
-                    headers={'x-amz-access-token': self.access_token},
-                    timeout=15,
-                    json=report_params
-                )
+                with tracer.span('spapi.create_report', report_type=self.report_type, attempt=current_attempt) as span:
+                    request_download = self._send(
+                        'spapi.create_report', 'post',
+                        url=report_endpoint,
+                        headers={'x-amz-access-token': self.access_token},
+                        timeout=15,
+                        json=report_params
+                    )
+                    span.set_attribute('status_code', request_download.status_code)
                                 
                 if request_download.status_code == 202:
                     self.report_id = request_download.json().get('reportId')           
+                    self.report_endpoint = self.reports_url + f"/reports/{self.report_id}"
                     return self.report_id
 
-                elif request_download.status_code in [400, 401, 403, 404]:
-                    logging.error(f"{request_download.status_code} Error for report ID {self.report_id}")
-                    raise RuntimeError(
-                        f"{request_download.status_code} Error for report ID {self.report_id}"
+                elif not RetryPolicy.is_retryable_status(request_download.status_code):
+                    logging.error(f"{request_download.status_code} Error requesting report '{self.report_type}'")
+                    raise FatalError(
+                        f"{request_download.status_code} Error requesting report '{self.report_type}'"
                         )
 
                 else:
-                    logging.error(f"{request_download.status_code} Error for report ID {self.report_id}")
-                    Helpers.exponential_backoff(current_attempt)
-                    current_attempt += 1
+                    logging.error(f"{request_download.status_code} Error requesting report '{self.report_type}'")
             
+            except FatalError:
+                raise
+
             except Exception as e:
                 logging.exception(f"Error attempting to request report: {str(e)}")
-                Helpers.exponential_backoff(current_attempt)
-                current_attempt += 1
 
-        if self.report_id is None:
-            logging(f"Maximum allotted retries reached, could not request report '{self.report_type}'")
-            raise ValueError(f"Maximum allotted retries reached: could not request report '{self.report_type}'")
-        else:
-            self.report_endpoint = self.reports_url + f"/reports/{self.report_id}"
+        logging.error(
+            f"Attempt cap reached after {current_attempt} attempts, could not request report '{self.report_type}'"
+        )
+        raise ValueError(
+            f"Attempt cap reached after {current_attempt} attempts: could not request report '{self.report_type}'"
+        )
 
     def check_report_status(self, report_id: Optional[str] = None) -> str:
         """
@@ -453,22 +483,29 @@ class GenerateFBAReport:
         current_endpoint = self.reports_url + f"/reports/{current_report_id}"
                 
         try:
-            request_status = req.get(
-                url=current_endpoint,
-                timeout=15,
-                headers={'x-amz-access-token': self.access_token}
-                )
+            with tracer.span('spapi.poll_status', report_id=current_report_id) as span:
+                request_status = self._send(
+                    'spapi.poll_status', 'get',
+                    url=current_endpoint,
+                    timeout=15,
+                    headers={'x-amz-access-token': self.access_token}
+                    )
 
-            if request_status.status_code != 200:
-                # dont break, since retry logic is handled outside of the method
-                logging.error(f"{request_status.status_code} Error: failed to get request status")
-                status = 'N/A'  
+                if request_status.status_code != 200:
+                    # dont break, since retry logic is handled outside of the method
+                    logging.error(f"{request_status.status_code} Error: failed to get request status")
+                    status = 'N/A'  
+
+                else:
+                    status = request_status.json().get('processingStatus')
+                    logging.info(f"Report ID {self.report_id} - '{self.report_type}' - Status: '{status}'")
+
+                span.set_attribute('processing_status', status)
 
-            else:
-                status = request_status.json().get('processingStatus')
-                logging.info(f"Report ID {self.report_id} - '{self.report_type}' - Status: '{status}'")
-                
             return status
+
+        except CircuitOpenError:
+            raise  # polling again won't help until the endpoint recovers
         
         except Exception as e:
             logging.exception(f'Unexpected error occurred trying to get report status {str(e)}')
@@ -502,10 +539,12 @@ class GenerateFBAReport:
         }
 
         params = {
-            "reportTypes": {report_type}
+            "reportTypes": {report_type},
+            "marketplaceIds": self.marketplace_id
         }
 
-        get_status = req.get(
+        get_status = self._send(
+            'spapi.list_reports', 'get',
             url=self.reports_url + '/reports',
             headers=headers,
             params=params
@@ -609,7 +648,8 @@ class GenerateFBAReport:
         
         # block 1: obtain document ID 
         try:
-            request_document_id = req.get(
+            request_document_id = self._send(
+                'spapi.get_report', 'get',
                 url=current_endpoint,
                 timeout=15,
                 headers={'x-amz-access-token': self.access_token}
@@ -629,8 +669,23 @@ class GenerateFBAReport:
             raise 
 
         # block 2: obtain download URL 
+        return self.get_document_url(document_id)
+
+    def get_document_url(self, document_id: str) -> Tuple[str, str]:
+        """
+        Fetches the download_url for a report document ID (e.g. from a REPORT_PROCESSING_FINISHED notification),
+        and populates the compression and download_url attributes
+
+        Returns: Tuple:
+            download_url (str) The link to the report which you can then download
+            compression (str) The compression of the downloadable file    
+        """
+        if self.access_token is None:
+            raise ValueError("No access token located. Need to run the `request_access_token` method first")
+
         try:
-            download_request = req.get(
+            download_request = self._send(
+                'spapi.get_document', 'get',
                 url=self.reports_url + f"/documents/{document_id}",
                 headers={'x-amz-access-token': self.access_token},
                 timeout=15
@@ -664,6 +719,10 @@ class GenerateFBAReport:
         
         Returns:
             pd.DataFrame with the downloaded data
+
+        Considerations:
+            -Documents whose parse would go over the memory budget are streamed to a spill file and parsed in chunks,
+            keeping only the columns the reports use (see Utilities.memory, MEMORY_BUDGET_MB)
         """
         if self.access_token is None:
             raise ValueError("No access token located. Need to run the `request_access_token` method first")
@@ -677,55 +736,149 @@ class GenerateFBAReport:
         # if parameter is passed, use it, otherwise default to instance attributes
         current_download_url = download_url if download_url else self.download_url
         current_compression = compression if compression else self.compression
+        what = f"'{self.report_type}' report" if self.report_type else 'report'
     
         # block 1: request the download contents 
-        attempt = 1
         max_attempts = 5
         download_successful = False
-        while attempt <= max_attempts:
+        for attempt in self.retry_policy.attempts(max_attempts=max_attempts, what='report download'):
             try:
-                download = req.get(
-                    url=current_download_url, 
-                    stream=True, 
-                    timeout=15
-                    )
-                
-                if download.status_code in [400, 401, 403, 404]:
-                    raise RuntimeError(f"{download.status_code} Error, could not download report")
+                with tracer.span('report.download', attempt=attempt) as span:
+                    download = self._send(
+                        'report.download', 'get',
+                        url=current_download_url, 
+                        stream=True, 
+                        timeout=15
+                        )
+                    span.set_attribute('status_code', download.status_code)
 
-                elif download.status_code != 200:
-                    logging.error(f"{download.status_code} Error, could not download report")
-                    self.backoff.exponential_backoff(attempt)
-                    attempt += 1                                
-                else:
+                    # read the streamed body here, so the transfer time counts towards the download (into a spill 
+                    # file if parsing it in memory would go over the memory budget)
+                    if download.status_code == 200:
+                        mode = governor.plan_download(
+                            what, download.headers.get('Content-Length'), current_compression
+                        )
+                        body = governor.spill(download) if mode == SPILL else download.content
+                        span.set_attribute('memory_mode', mode)
+                        span.set_attribute('bytes', body.tell() if mode == SPILL else len(body))
+                
+                if download.status_code == 200:
                     logging.debug(f"Download prepared, now decompressing and writing to df")
                     download_successful = True
                     break
+
+                elif not RetryPolicy.is_retryable_status(download.status_code):
+                    raise FatalError(f"{download.status_code} Error, could not download report")
+
+                else:
+                    logging.error(f"{download.status_code} Error, could not download report")
                     
+            except FatalError:
+                raise
+
             except Exception as e:
                 logging.error(f"Failed requesting download for the report on attempt {attempt}: {str(e)}")
-                self.backoff.exponential_backoff(attempt)
-                attempt += 1
 
         if not download_successful:
-            raise RuntimeError(f"Couldn't download from URL {current_download_url} after {max_attempts} attempts")
+            raise RuntimeError(
+                f"Couldn't download from URL {current_download_url} after {attempt} attempts (attempt cap reached)"
+            )
         
         # block 2: write contents to df
         try:
-            if current_compression == 'No compression':
-                report_contents = download.text
-            elif current_compression == 'GZIP':
-                buffer = io.BytesIO(download.content)
-                buffer.seek(0)
-                with gzip.GzipFile(fileobj=buffer) as gz:
-                    report_contents = gz.read().decode('latin1')
-                
-            df = pd.read_csv(io.StringIO(report_contents), sep='\t', encoding='latin1')
+            if mode == SPILL:
+                with body:
+                    return self.parse_report_file(
+                        body, compression=current_compression, columns=report_columns(self.report_type), what=what
+                    )
+
+            content = download.text if current_compression == 'No compression' else download.content
+            df = self.parse_report_document(content=content, compression=current_compression)
             return df       
 
         except Exception as e:
             logging.error(f"Downloaded report from {current_download_url} but could not process to df: {str(e)}")
             raise    
+
+    @staticmethod
+    def parse_report_document(content: Union[bytes, str], compression: str = 'No compression') -> pd.DataFrame:
+        """
+        Decompresses and parses a downloaded report document (tab-separated) into a Pandas DataFrame
+        
+        Parameters:
+            -content: (Union[bytes, str]) The raw document body, as downloaded from the document URL
+            -compression: (str) 'GZIP' or 'No compression', as returned by `get_download_url`
+        
+        Returns:
+            -pd.DataFrame with the report data
+        """
+        with tracer.span('report.decompress', compression=compression):
+            if compression == 'GZIP':
+                buffer = io.BytesIO(content)
+                buffer.seek(0)
+                with gzip.GzipFile(fileobj=buffer) as gz:
+                    report_contents = gz.read().decode('latin1')
+            elif compression == 'No compression':
+                report_contents = content.decode('latin1') if isinstance(content, bytes) else content
+            else:
+                raise ValueError(f"Unsupported compression '{compression}', expected 'GZIP' or 'No compression'")
+            
+        with tracer.span('report.parse') as span:
+            df = pd.read_csv(
+                io.StringIO(report_contents), sep='\t', encoding='latin1', dtype=dict.fromkeys(TEXT_COLUMNS, str)
+            )
+            span.set_attribute('rows', len(df))
+        return df
+
+    @staticmethod
+    def parse_report_file(
+        file: IO[bytes], 
+        compression: str = 'No compression', 
+        columns: Optional[List[str]] = None,
+        chunk_rows: Optional[int] = None,
+        what: str = 'report'
+    ) -> pd.DataFrame:
+        """
+        Low-memory `parse_report_document`: decompresses a document spilled to a file into a second spill file, and
+        parses it from a memory-mapped view a chunk of rows at a time, keeping only the given columns
+        
+        Parameters:
+            -file: (IO[bytes]) The raw document body, in a named file (see `MemoryGovernor.spill`)
+            -compression: (str) 'GZIP' or 'No compression', as returned by `get_download_url`
+            -columns: (Optional[List[str]]) Columns to keep, if the document has them. Default=None (all of them)
+            -chunk_rows: (Optional[int]) Rows parsed at a time. Default=None (the governor's)
+            -what: (str) The document, for the logs. Default='report'
+        
+        Returns:
+            -pd.DataFrame with the report data
+        """
+        if compression not in ('GZIP', 'No compression'):
+            raise ValueError(f"Unsupported compression '{compression}', expected 'GZIP' or 'No compression'")
+
+        with tracer.span('report.decompress', compression=compression, mode=SPILL):
+            document = decompressed(file, compression)
+
+        keep = set(columns) if columns else None
+        try:
+            with tracer.span('report.parse', mode=SPILL) as span:
+                chunks = []
+                reader = pd.read_csv(
+                    document.name, sep='\t', encoding='latin1', memory_map=True, 
+                    usecols=(lambda column: column in keep) if keep else None, 
+                    dtype=dict.fromkeys(TEXT_COLUMNS, str), 
+                    chunksize=chunk_rows or governor.chunk_rows
+                )
+                with reader:
+                    for chunk in reader:
+                        chunks.append(chunk)
+                        governor.check(f"the {what} parse")
+
+                df = pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
+                span.set_attribute('rows', len(df))
+        finally:
+            if document is not file:
+                document.close()
+        return df
             
 
 class ReportAssembler:
@@ -733,16 +886,21 @@ class ReportAssembler:
     
     Parameters:
         -account_name: (Optional[str]) adds name to the report title
+        -report_date: (Optional[Union[str, date]]) The run's report date ('YYYY-MM-DD' or date), which the report
+        titles are dated with. Default=None (today, US/Eastern)
     """
     
-    def __init__(self, account_name: Optional[str] = None):
+    def __init__(self, account_name: Optional[str] = None, report_date: Optional[Union[str, date]] = None):
                   
         # these will be used to define the report name 
         self.account_name = account_name        
         self.date_start = None
         self.date_end = None
         self.date_range = None
-        self.today = datetime.now().date().strftime("%m-%d-%Y")
+        if isinstance(report_date, str):
+            report_date = datetime.strptime(report_date, '%Y-%m-%d').date()
+        self.report_date = report_date or eastern_today()
+        self.report_day = self.report_date.strftime("%m-%d-%Y")
         
         # sales summary figures         
         self.revenue = 0
@@ -984,67 +1142,273 @@ class ReportAssembler:
             logging.error(f"Could not set the report name: {str(e)}")
             raise
 
-    def on_hand_report_compiler(self, orders: pd.DataFrame, inventory: pd.DataFrame) -> pd.DataFrame:
+    @staticmethod
+    def compiler_marketplaces(compiler_input: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        The marketplaces of an Activity_ReportCompiler input, each as {'marketplace_id', 'orders', 'inventory'} 
+        with the inventory jsons by report type (legacy inputs have top-level 'orders'/'inventory' lists)
+        """
+        marketplaces = compiler_input.get('marketplaces') or [{
+            'marketplace_id': None, 
+            'orders': compiler_input.get('orders'), 
+            'inventory': compiler_input.get('inventory')
+        }]
+        return [
+            {
+                **marketplace, 
+                'inventory': marketplace['inventory'] if isinstance(marketplace['inventory'], dict) 
+                else {INVENTORY_REPORT_TYPE: marketplace['inventory']}
+            }
+            for marketplace in marketplaces
+        ]
+
+    def read_on_hand_sources(
+        self, 
+        compiler_inputs: List[Dict[str, Any]], 
+        tag_marketplace: bool = False, 
+        tag_account: bool = False
+    ) -> Tuple[pd.DataFrame, Dict[str, pd.DataFrame]]:
+        """
+        Parses the report jsons of one or more Activity_ReportCompiler inputs, for `on_hand_report_compiler`
+
+        Parameters:
+            -compiler_inputs: (List[Dict[str, Any]]) Inputs of Activity_ReportCompiler (see CompilerDict)
+            -tag_marketplace: (bool) Adds a 'marketplace' column (country code) to every row. Default=False
+            -tag_account: (bool) Adds an 'account' column (account name) to every row. Default=False
+
+        Returns:
+            -Tuple with the orders df, and the inventory dfs by report type
+
+        Considerations:
+            -Inventory reports are cut down to the columns the on-hand report uses right after parsing, so each 
+            extra source adds a few columns, not a whole report
+            -If parsing them all would go over the memory budget, the order reports are cut down too (to 
+            `memory.ORDER_COLUMNS`), see Utilities.memory
+        """
+        order_df_list, inventory_lists = [], {}
+        marketplaces = [
+            (compiler_input, marketplace) for compiler_input in compiler_inputs 
+            for marketplace in self.compiler_marketplaces(compiler_input)
+        ]
+        what = f"the compile of {len(compiler_inputs)} account(s)"
+        mode = governor.plan_compile(what, (
+            payload for _, marketplace in marketplaces
+            for payloads in [marketplace['orders'], *marketplace['inventory'].values()] for payload in payloads
+        ))
+        order_columns = ORDER_COLUMNS if mode == CHUNKED else []
+
+        def read(payload: str, columns: List[str], tags: Dict[str, str]) -> pd.DataFrame:
+            df = payload_codec.decode(payload, columns or None)
+            governor.check(what)
+            return df.assign(**tags) if tags else df
+
+        with tracer.span('report.deserialize', accounts=len(compiler_inputs), memory_mode=mode):
+            for compiler_input, marketplace in marketplaces:
+                tags = {}
+                if tag_account:
+                    tags['account'] = compiler_input.get('account_name')
+                if tag_marketplace:
+                    # never None, groupby would drop the rows (legacy inputs have no marketplace ID)
+                    tags['marketplace'] = country_of(marketplace['marketplace_id'] or '')
+
+                order_df_list.extend(read(orders, order_columns, tags) for orders in marketplace['orders'])
+                for report_type, payloads in marketplace['inventory'].items():
+                    inventory_lists.setdefault(report_type, []).extend(
+                        read(payload, source_columns(report_type), tags) for payload in payloads
+                    )
+
+            order_df = pd.concat(order_df_list, ignore_index=True).drop_duplicates() 
+            inventory_dfs = {
+                report_type: pd.concat(df_list, ignore_index=True).drop_duplicates()
+                for report_type, df_list in inventory_lists.items()
+            }
+        return order_df, inventory_dfs
+
+    def on_hand_report_compiler(
+        self, 
+        orders: pd.DataFrame, 
+        inventory: Union[pd.DataFrame, Dict[str, pd.DataFrame]], 
+        columns: Optional[List[str]] = None,
+        metrics: Optional[List[str]] = None,
+        as_of: Optional[str] = None
+    ) -> pd.DataFrame:
         """
         Takes the concat'd orders and inventory df's and pivots them into a raw on-hand report
         
         Parameters:
             -orders: (pd.DataFrame) df of the 90D (or other date range) orders data
-            -inventory: (pd.DataFrame) df of the current inventory data
+            -inventory: (Union[pd.DataFrame, Dict[str, pd.DataFrame]]) df of the current inventory data, or a dict
+            of inventory dfs by report type (see Utilities.inventory_sources), which must include the 
+            'GET_FBA_MYI_UNSUPPRESSED_INVENTORY_DATA' one
+            -columns: (Optional[List[str]]) Output columns, out of `inventory_sources.AVAILABLE_COLUMNS` and the
+            metrics. Default=None (`inventory_sources.default_columns`)
+            -metrics: (Optional[List[str]]) Sell-through metrics to add (see Utilities.sales_metrics), e.g. 
+            ['units-7d', 'units-30d', 'velocity-30d', 'weeks-of-cover-30d', 'sell-through-90d']. Default=None
+            -as_of: (Optional[str]) The report date, 'YYYY-MM-DD': the metrics' windows are the days before it.
+            Default=None (today, US/Eastern)
         
         Returns: 
             -Pandas DataFrame with the on-hand report 
             columns=['SKU', 'ASIN', 'PRODUCT NAME', 'BRAND', 'ON HAND', 'RECEIVED']
+
+        Considerations:
+            -If the dfs have a 'marketplace' column (several marketplaces), rows are per SKU and marketplace, and
+            the column is kept last. Likewise with an 'account' column (see `consolidated_on_hand_reports`), which
+            is kept first
+            -Every source is cut down to the columns it contributes and summed per SKU first, then all of them are 
+            joined to the unsuppressed inventory in one go, so extra sources only cost a few columns each
+            -The metrics need the orders' 'purchase-date', and are only computed for the rows kept
         """
+        sources = inventory if isinstance(inventory, dict) else {INVENTORY_REPORT_TYPE: inventory}
+        inventory = sources.get(INVENTORY_REPORT_TYPE)
+
         # basic validation to make sure inputs are correct 
         if not any([isinstance(orders, pd.DataFrame), isinstance(inventory, pd.DataFrame)]):
             raise TypeError("Report compiler only accepts Pandas dfs - convert your order/inv data to df first")
         
-        required_order_columns = ['sku', 'quantity']
+        required_order_columns = ['sku', 'quantity'] + (['purchase-date'] if metrics else [])
         for column in required_order_columns:
             if column not in orders.columns:
                 raise KeyError(f"Required column {column} not found in your orders df")
                     
-        required_inventory_columns = ['sku', 'asin', 'product-name', 'afn-fulfillable-quantity']
-        for column in required_inventory_columns:
-            if column not in inventory.columns:
-                raise KeyError(f"Required column {column} not found in your inventory df")
+        for report_type, source in sources.items():
+            for column in source_columns(report_type):
+                if column not in source.columns:
+                    raise KeyError(f"Required column {column} not found in your '{report_type}' df")
         
         # proceed with report generation
         try:            
-            # pivot orders table
-            orders = orders.groupby('sku').agg({'quantity':'sum'}).reset_index()
-            
-            # merge to inventory df
-            final_df = pd.merge(inventory, orders, on='sku', how='left')
-            
-            # left join will inevitably lead to blanks in the orders.quantity column
-            final_df['quantity'] = final_df['quantity'].fillna(0)
-            
-            # add received col
-            final_df['received'] = final_df['afn-fulfillable-quantity'] + final_df['quantity']
-            
-            # filter out items we have not received 
-            final_df = final_df.loc[final_df['received'] > 0]
-            
-            # remove redundant cols
-            final_df = final_df[['sku', 'asin', 'product-name', 'afn-fulfillable-quantity', 'quantity', 'received']]
-            
-            # rename cols
-            final_df.rename(columns={'afn-fulfillable-quantity': 'on-hand'}, inplace=True)
-            
-            # drop quantity column as its no longer needed
-            final_df.drop('quantity', axis=1, inplace=True)
+            with tracer.span('report.compile', account=self.account_name, sources=len(sources)):
+                # the same SKU is a separate listing in each marketplace
+                keys = ['sku'] + [
+                    tag for tag in ('marketplace', 'account') 
+                    if all(tag in df.columns for df in [orders, *sources.values()])
+                ]
+
+                # factorize the keys of every report once, into codes shared with the inventory rows
+                extra_sources = {
+                    report_type: source for report_type, source in sources.items() 
+                    if report_type != INVENTORY_REPORT_TYPE
+                }
+                index = SkuIndex(inventory, keys, {'orders': orders, **extra_sources})
+
+                # pivot orders table, aligned to the inventory rows (0 where a SKU had no orders)
+                joined = {'sold': index.sum('orders', 'quantity')}
+
+                # pivot the other inventory sources, down to the columns they contribute
+                for report_type in extra_sources:
+                    mapping = INVENTORY_SOURCES[report_type]
+                    joined.update(zip(mapping.values(), index.sums(report_type, list(mapping))))
             
-            # sort by in-stock items
-            final_df.sort_values('on-hand', ascending=0, inplace=True)
+                # add received col
+                on_hand = inventory['afn-fulfillable-quantity'].to_numpy()
+                received = on_hand + joined['sold']
             
-            return final_df        
+                # filter out items we have not received, and sort by in-stock items (positions in the inventory df)
+                rows = np.flatnonzero(received > 0)
+                rows = pd.Series(on_hand[rows], index=rows).sort_values(ascending=0).index.to_numpy()
+
+                # keep the requested columns ('marketplace' only exists with several marketplaces)
+                if columns is None:
+                    columns = default_columns(list(sources), marketplace='marketplace' in keys, metrics=metrics or ())
+                if 'account' in keys:
+                    columns = ['account'] + [column for column in columns if column != 'account']
+
+                # every window of the sales metrics in one pass over the orders, for the kept rows only
+                requested = [metric for metric in metrics or [] if metric in columns]
+                sales = {}
+                if requested:
+                    engine = MetricsEngine(requested, as_of=as_of or eastern_today())
+                    sales = engine.compute(orders, index.codes['orders'], index.base_codes[rows], on_hand[rows])
+
+                # only now copy the rows, of the output columns alone
+                computed = {'on-hand': on_hand, 'received': received, **joined}
+                inventory_columns = keys + DESCRIPTION_COLUMNS
+                output = {}
+                for column in columns:
+                    if column in sales:
+                        output[column] = sales[column]
+                    elif column in computed:
+                        output[column] = computed[column][rows]
+                    elif column in inventory_columns and column in inventory.columns:
+                        output[column] = inventory[column].array.take(rows)
+                return pd.DataFrame(output, index=rows)
         
         except Exception as e:
             logging.error(f"Failure compiling the orders/inv dfs in report_compilter(): {str(e)}")
             raise
     
+    def consolidated_on_hand_reports(
+        self, 
+        compiler_inputs: List[Dict[str, Any]], 
+        columns: Optional[List[str]] = None,
+        metrics: Optional[List[str]] = None,
+        as_of: Optional[str] = None
+    ) -> List[Tuple[str, pd.DataFrame]]:
+        """
+        Compiles the on-hand reports of every account at once: all accounts' reports are stacked with an account 
+        key and pivoted in one grouped pass, instead of one `on_hand_report_compiler` call (and json round trip) 
+        per account. Also builds a cross-account summary, per ASIN
+
+        Parameters:
+            -compiler_inputs: (List[Dict[str, Any]]) Each account's Activity_ReportCompiler input (see CompilerDict)
+            -columns: (Optional[List[str]]) Output columns of the account reports, see `on_hand_report_compiler`.
+            Default=None
+            -metrics/as_of: (Optional) Sales metrics of the account reports, see `on_hand_report_compiler`
+        
+        Returns:
+            -List[Tuple[str, pd.DataFrame]]: (report name, report) of every account, in input order, then 
+            ('All Accounts On Hand <date>', summary) with the total 'on-hand' and 'received' of each ASIN, and the 
+            number of accounts holding it
+
+        Considerations:
+            -The account reports have the same rows and columns as `on_hand_report_compiler` gives for each account
+            alone, though SKUs with the same on-hand quantity may come in another order
+        """
+        several_marketplaces = {
+            compiler_input.get('account_name'): len(self.compiler_marketplaces(compiler_input)) > 1
+            for compiler_input in compiler_inputs
+        }
+        orders, sources = self.read_on_hand_sources(compiler_inputs, tag_marketplace=True, tag_account=True)
+
+        # every column any report needs, picked per account below
+        compiled = self.on_hand_report_compiler(
+            orders=orders, inventory=sources, columns=AVAILABLE_COLUMNS + list(metrics or []), metrics=metrics, 
+            as_of=as_of
+        )
+
+        # joined counts are floats (the left join's blanks), per-account reports get them back as ints from json
+        counts = compiled.select_dtypes('float').columns.difference(metrics or [])
+        compiled[counts] = compiled[counts].astype('int64')
+
+        with tracer.span('report.split', accounts=len(compiler_inputs), rows=len(compiled)):
+            by_account = dict(tuple(compiled.groupby('account', sort=False)))
+            reports = []
+            for account_name, marketplaces in several_marketplaces.items():
+                account_columns = columns or default_columns(
+                    list(sources), marketplace=marketplaces, metrics=metrics or ()
+                )
+                account_columns = [
+                    column for column in account_columns 
+                    if column in compiled.columns and (marketplaces or column != 'marketplace')
+                ]
+                report = by_account.get(account_name, compiled.iloc[:0])[account_columns].reset_index(drop=True)
+                report_name = ReportAssembler(
+                    account_name=account_name, report_date=self.report_date
+                ).set_on_hand_report_name()
+                reports.append((report_name, report))
+
+            summary = compiled.groupby('asin', sort=False).agg(**{
+                'product-name': ('product-name', 'first'),
+                'on-hand': ('on-hand', 'sum'),
+                'received': ('received', 'sum'),
+                'accounts': ('account', 'nunique')
+            })
+            summary = summary.sort_values('on-hand', ascending=0).reset_index()
+            reports.append((f"All Accounts On Hand {self.report_day}", summary))
+
+        return reports
+
     def on_hand_report_formatter(self, ws: Worksheet, table_name: str = 'Table1') -> None:
         """
         Formats the on-hand report created in `on_hand_report_compiler()` method with openpyxl 
@@ -1060,36 +1424,111 @@ class ReportAssembler:
             -Worksheet is not saved after formatting, you must save/close Workbook after running this method
         """
         # basic validation
-        if not isinstance(ws, Worksheet):
+        if not isinstance(ws, xl.worksheet.worksheet.Worksheet):
             raise TypeError("The input parameter must be an openpyxl Worksheet")
         
-        # init styler util   
-        pen = Style(ws)
-        
-        # center, align, create table out of array/range 
-        pen.align_and_center()
-        pen.create_table(table_name=table_name)
-        
-        # change header text to white 
-        for cell in ['A1', 'B1', 'C1', 'D1', 'E1']:
-            pen.change_font_color(cell=cell, color="FFFFFFFF")
+        with tracer.span('workbook.format', sheet=ws.title, rows=ws.max_row):
+            # init styler util   
+            pen = Style(ws)
+            
+            # center, align, create table out of array/range 
+            pen.align_and_center()
+            pen.create_table(table_name=table_name)
+            
+            # change header text to white 
+            for cell in ws[1]:
+                pen.change_font_color(cell=cell.coordinate, color="FFFFFFFF")
 
-        # add data bars         
-        for col in ['D', 'E']:
-            pen.data_bars(column=col)
+            # add data bars (found by header, as optional columns shift them)
+            for cell in ws[1]:
+                if cell.value in ('on-hand', 'received'):
+                    pen.data_bars(column=cell.column_letter)
         
         # exit
         return None
 
+    @staticmethod
+    def read_on_hand_results(results: List[Tuple[str, Union[str, pd.DataFrame]]]) -> List[Tuple[str, pd.DataFrame]]:
+        """
+        (report name, df) pairs out of Activity_ReportCompiler's (report name, payload) results, so they are parsed
+        once for everything downstream (the workbook, the snapshots). Pairs that already hold a df are kept as is
+        """
+        with tracer.span('report.deserialize', reports=len(results)):
+            return [
+                (report_name, contents if isinstance(contents, pd.DataFrame) else payload_codec.decode(contents))
+                for report_name, contents in results
+            ]
+
+    def write_on_hand_workbook(
+        self, 
+        results: List[Tuple[str, Union[str, pd.DataFrame]]], 
+        spill: Optional[bool] = None
+    ) -> IO[bytes]:
+        """
+        Writes the compiled on-hand reports of several accounts to an unformatted .xlsx workbook, one tab each
+        
+        Parameters:
+            -results: (List[Tuple[str, Union[str, pd.DataFrame]]]) (report name, report json) pairs, as returned by 
+            Activity_ReportCompiler, or (report name, df) pairs from `consolidated_on_hand_reports`
+            -spill: (Optional[bool]) Writes to a spill file (see Utilities.memory) instead of a buffer. Default=None
+            (if the memory budget calls for it)
+        
+        Returns:
+            -IO[bytes]: The workbook, ready for `format_on_hand_workbook` (io.BytesIO, or a spill file deleted once 
+            closed)
+        """
+        results = self.read_on_hand_results(results)
+        if spill is None:
+            cells = sum(df.size for _, df in results)
+            spill = governor.plan_workbook(f"the workbook of {len(results)} tab(s)", cells) == SPILL
+
+        buffer = spill_file('.xlsx') if spill else io.BytesIO()
+        with tracer.span('workbook.write', sheets=len(results), spill=spill):
+            with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+                for report_name, df in results:
+                    df.to_excel(writer, sheet_name=report_name, index=False)
+        buffer.seek(0)
+        return buffer
+
+    def format_on_hand_workbook(self, buffer: IO[bytes]) -> IO[bytes]:
+        """
+        Formats every tab of a workbook from `write_on_hand_workbook` with `on_hand_report_formatter`
+        
+        Parameters:
+            -buffer: (IO[bytes]) The unformatted workbook
+        
+        Returns:
+            -IO[bytes]: A new buffer with the formatted workbook, or a new spill file for a spilled workbook (the 
+            unformatted one is closed, i.e. deleted, once loaded)
+        """
+        # can't do this while writing, as pd doesn't save io objects
+        wb = xl.load_workbook(buffer)
+        spill = not isinstance(buffer, io.BytesIO)
+        if spill:
+            buffer.close()
+        for sheet in wb.sheetnames:
+            account_initials = sheet.split(' ')[0]  # for table names
+            ws = wb[sheet]
+            with tracer.tags(account=account_initials):
+                self.on_hand_report_formatter(ws, table_name=account_initials)
+
+        # fresh buffer, a shorter save would leave trailing bytes otherwise
+        output_buffer = spill_file('.xlsx') if spill else io.BytesIO()
+        with tracer.span('workbook.save', spill=spill):
+            wb.save(output_buffer)
+        output_buffer.seek(0)
+        self.formatted_workbook = output_buffer
+        return self.formatted_workbook
+
     def set_on_hand_report_name(self):
-        """Sets the on hand report name, using the account initials and date the report was ran"""
+        """Sets the on hand report name, using the account initials and the run's report date"""
 
         if self.account_name is None:
             logging.warning("Account name left blank, on hand report account is ambiguous")
-            self.report_name = f"On Hand {self.today}"
+            self.report_name = f"On Hand {self.report_day}"
             return self.report_name
         else:
-            self.report_name = f"{self.account_name.upper()} On Hand {self.today}"
+            self.report_name = f"{self.account_name.upper()} On Hand {self.report_day}"
             return self.report_name
 
 class ReportDownloadOrchestrator:
@@ -1098,56 +1537,95 @@ class ReportDownloadOrchestrator:
     
     Parameters:
         -account_name: (str) The account initials you wish to generate the report for 
+        -report_generator: (Optional[GenerateFBAReport]) An existing instance to reuse. If its SP-API keys are 
+        already populated, the Key Vault is skipped (e.g. for runs against the local SP-API emulator), and so is the
+        LWA token request if it has an access token (keep it fresh, see `GenerateFBAReport.has_valid_access_token`)
+        -retry_policy: (Optional[RetryPolicy]) The retry budget of the account (see Utilities.retry). Default=None
+        (no deadline, attempt caps only)
+        -checkpoints: (Optional[CheckpointStore]) If given, reports already downloaded by the run are read from it
+        instead of requested again, and new ones are saved to it. Default=None
+        -force: (bool) Never read checkpoints (still save them), as in a forced run. Default=False
+        -report_date: (Optional[str]) Day the date range properties count back from, as 'YYYY-MM-DD'. 
+        Default=None (today, US/Eastern)
+        -settings: (Optional[Settings]) Validated configuration, see Utilities.settings. Default=None (the process's)
+        -marketplace_id: (Optional[str]) The marketplace to run the reports for. Default=None (MARKETPLACE_ID)
     
     Considerations:
         -Note the requirements for `GenerateFBAReport` class (refer to its docstring)      
     """
-    def __init__(self, account_name: str):       
+    def __init__(
+        self, 
+        account_name: str, 
+        report_generator: Optional[GenerateFBAReport] = None, 
+        retry_policy: Optional[RetryPolicy] = None,
+        checkpoints: Optional[CheckpointStore] = None,
+        report_date: Optional[str] = None,
+        settings: Optional[Settings] = None,
+        marketplace_id: Optional[str] = None,
+        force: bool = False
+    ):       
         self.account_name = account_name
+        self.report_date = datetime.strptime(report_date, '%Y-%m-%d').date() if report_date else eastern_today()
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self.checkpoints = checkpoints
+        self.force = force
         
         # eager load the required classes
-        self.GenerateFBAReport = GenerateFBAReport()
+        self.GenerateFBAReport = report_generator if report_generator is not None \
+            else GenerateFBAReport(settings=settings, marketplace_id=marketplace_id)
+        self.GenerateFBAReport.retry_policy = self.retry_policy
+        self.marketplace_id = self.GenerateFBAReport.marketplace_id
         self.Helpers = Helpers() 
         
-        # get API keys, but catch any issues that may arise with account parameters
-        try:
-            self.GenerateFBAReport.get_amz_keys(account_name=self.account_name)
-        except Exception as e:
-            logging.error(
-                f"""Could not fetch API keys for '{account_name}' during report orchestration. 
-                Make sure the name exactly matches your environment-variables and key vault. For example, if your
-                FBA Seller Account is 'Test Seller', make sure you pass initials 'TS' to the account_name parameter, 
-                that your key vault is titled 'ts-kv', and that the env-variable is 'TS_VAULT_NAME'"""
-            )
-            raise
-        
-        # get access token once, so you needn't request it each time
-        self.GenerateFBAReport.request_access_token()
+        with tracer.tags(account=self.account_name):
+            # get API keys, but catch any issues that may arise with account parameters
+            try:
+                if not self.GenerateFBAReport.refresh_token:
+                    self.GenerateFBAReport.get_amz_keys(account_name=self.account_name)
+            except Exception as e:
+                logging.error(
+                    f"""Could not fetch API keys for '{account_name}' during report orchestration. 
+                    Make sure the name exactly matches your environment-variables and key vault. For example, if your
+                    FBA Seller Account is 'Test Seller', make sure you pass initials 'TS' to the account_name parameter, 
+                    that your key vault is titled 'ts-kv', and that the env-variable is 'TS_VAULT_NAME'"""
+                )
+                raise
+            
+            # get access token once, so you needn't request it each time (unless the generator came with one)
+            if not self.GenerateFBAReport.access_token:
+                self.GenerateFBAReport.request_access_token()
     
     # common date ranges as properties for easy access (TODO: add more later as they become necessary) 
+    # (counted from report_date, in US/Eastern like the SP-API date validation, so a UTC server past midnight 
+    # doesn't ask for 'tomorrow')
     @property
     def today(self):
-        today_date = datetime.now().date()
+        today_date = self.report_date
         today_str = today_date.strftime("%m-%d-%Y") 
         return today_str
     
+    @property
+    def run_date(self):
+        """The day the date ranges are computed from (ISO format), which checkpoints are kept under"""
+        return self.report_date.isoformat()
+
     @property
     def one_month_ago(self):
-        today_date = datetime.now().date()
+        today_date = self.report_date
         one_month_ago_date = today_date - timedelta(days=30)
         one_month_ago_str = one_month_ago_date.strftime("%m-%d-%Y")
         return one_month_ago_str
     
     @property
     def two_months_ago(self):
-        today_date = datetime.now().date()
+        today_date = self.report_date
         two_month_ago_date = today_date - timedelta(days=60)
         two_month_ago_str = two_month_ago_date.strftime("%m-%d-%Y")
         return two_month_ago_str
 
     @property
     def three_months_ago(self):
-        today_date = datetime.now().date()
+        today_date = self.report_date
         three_month_ago_date = today_date - timedelta(days=90)
         three_month_ago_str = three_month_ago_date.strftime("%m-%d-%Y")
         return three_month_ago_str
@@ -1162,62 +1640,130 @@ class ReportDownloadOrchestrator:
             -end_date: (str) The ending date of the range you wish to run the report for 
         
         Returns:
-            -str: report contents in json, so as to be transferable between durable functions
+            -str: report contents as a payload (json, or compact with PAYLOAD_CODEC, see Utilities.payload_codec), so as
+            to be transferable between durable functions
  
         Considerations:
             -Refer to 'GenerateFBAReport' class docstrings for specificities about possible parameters   
             -You can pass dates to `get_report` method, or use class properties containing some common date-ranges         
         """
-        
-        # request the report using the class input parameters 
-        self.GenerateFBAReport.request_FBA_report(
-            report_type=report_type,
-            start_date=start_date,
-            end_date=end_date
-        )
-        
-        # check report status and download once ready 
-        df = None
-        current_attempt = 1
+        # tag every span of this report (token, create, polls, download, parse...) with the account and report type
+        with tracer.tags(account=self.account_name, report_type=report_type):
+            cached = self.load_checkpoint(report_type=report_type, start_date=start_date, end_date=end_date)
+            if cached is not None:
+                return cached
+
+            data = self.__get_report(report_type=report_type, start_date=start_date, end_date=end_date)
+            self.save_checkpoint(report_type=report_type, start_date=start_date, end_date=end_date, data=data)
+            return data
+
+    def load_checkpoint(self, report_type: str, start_date: Optional[str], end_date: Optional[str]) -> Optional[str]:
+        """The report of this window if the run already downloaded it (and checkpoints are on, unforced), else None"""
+        if self.checkpoints is None or self.force:
+            return None
+        return self.checkpoints.load(self.run_date, report_type, start_date, end_date, self.marketplace_id)
+
+    def save_checkpoint(self, report_type: str, start_date: Optional[str], end_date: Optional[str], data: str) -> None:
+        if self.checkpoints is not None:
+            self.checkpoints.save(self.run_date, report_type, start_date, end_date, data, self.marketplace_id)
+
+    def __get_report(self, report_type: str, start_date: str, end_date: str) -> str:
+        """Private method: the request/poll/download loop behind `get_report`"""
+        self.request_report(report_type=report_type, start_date=start_date, end_date=end_date)
+        return self.__poll_and_download(report_type=report_type, start_date=start_date, end_date=end_date)
+
+    def request_report(self, report_type: str, start_date: Optional[str], end_date: Optional[str]) -> str:
+        """Requests the report without waiting for it (see `download_requested_report`), returns the report ID"""
+        with tracer.tags(account=self.account_name, report_type=report_type):
+            return self.GenerateFBAReport.request_FBA_report(
+                report_type=report_type,
+                start_date=start_date,
+                end_date=end_date
+            )
+
+    def download_requested_report(
+        self,
+        report_type: str,
+        report_id: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        processing_status: Optional[str] = None,
+        document_id: Optional[str] = None
+    ) -> str:
+        """
+        Downloads a report requested earlier with `request_report`, as a payload (see Utilities.payload_codec)
+
+        Parameters:
+            -report_type/report_id: (str) The report requested
+            -start_date/end_date: (Optional[str]) Its date range, for the error messages
+            -processing_status: (Optional[str]) Final status, if known (e.g. from a REPORT_PROCESSING_FINISHED
+            notification). Default=None: polls the status like `get_report` does
+            -document_id: (Optional[str]) The report document ID, if known. Skips the report lookup
+        """
+        self.GenerateFBAReport.report_id = report_id
+        self.GenerateFBAReport.report_type = report_type
+
+        with tracer.tags(account=self.account_name, report_type=report_type):
+            if processing_status is None:
+                data = self.__poll_and_download(report_type=report_type, start_date=start_date, end_date=end_date)
+            elif processing_status != 'DONE':
+                data = self.__handle_failed_report(report_type, processing_status, start_date, end_date)
+            elif document_id:
+                self.GenerateFBAReport.get_document_url(document_id)
+                data = self.__download_payload()
+            else:
+                self.GenerateFBAReport.get_download_url()
+                data = self.__download_payload()
+
+        self.save_checkpoint(report_type=report_type, start_date=start_date, end_date=end_date, data=data)
+        return data
+
+    def __download_payload(self) -> str:
+        """Private method: downloads the report of the current download URL, and serializes it (PAYLOAD_CODEC)"""
+        df = self.GenerateFBAReport.download_report()
+        with tracer.span('report.serialize'):
+            return payload_codec.encode(df)
+
+    def __handle_failed_report(self, report_type: str, status: str, start_date: str, end_date: str) -> str:
+        """Private method: falls back to the last ready inventory report, raises for (date-ranged) order reports"""
+        logging.warning(f"Status: {status} for {report_type}")
+        # if ORDER report fails, must break, as the date ranges are uncertain for existing reports
+        # INVENTORY reports, however, have no date range so we can default to the most recent report
+        # they generate every 30 min anyway, near real time data
+        if report_type in INVENTORY_SOURCES:
+            logging.info("Falling back to most recent available inventory report")
+            self.GenerateFBAReport.get_last_ready_report_id(report_type=report_type)
+            self.GenerateFBAReport.get_download_url()
+            return self.__download_payload()
+
+        # if order report, and not inventory, break (this report ID will stay failed, no use polling it)
+        raise ReportFailedError(f"Couldn't get orders for {start_date}-{end_date}, status {status}")
+
+    def __poll_and_download(self, report_type: str, start_date: str, end_date: str) -> str:
+        """Private method: polls the current report ID until it is ready, then downloads it"""
+        # check report status and download once ready (added longer timer here because SP-API is sensitive)
         max_attempts = 7
-        while current_attempt <= max_attempts:
+        for current_attempt in self.retry_policy.attempts(
+            max_attempts=max_attempts, base_seconds=10, rate_of_growth=1.75, what=f"'{report_type}' status polling"
+        ):
             try:
                 status = self.GenerateFBAReport.check_report_status()
                 
                 if status == 'DONE':
                     self.GenerateFBAReport.get_download_url()
-                    df = self.GenerateFBAReport.download_report()
-                    df = df.to_json(orient='records')
-                    return df
+                    return self.__download_payload()
                 
                 elif status in ['FATAL', 'CANCELLED']:
-                    logging.warning(f"Status: {status} for {report_type}")
-                    # if ORDER report fails, must break, as the date ranges are uncertain for existing reports
-                    # INVENTORY reports, however, have no date range so we can default to the most recent report
-                    # they generate every 30 min anyway, near real time data
-                    # TODO: must list all reports that dont require a date range, just doing unsupressed inv for now
-                    if report_type == 'GET_FBA_MYI_UNSUPPRESSED_INVENTORY_DATA':
-                        logging.info("Falling back to most recent available inventory report")
-                        self.GenerateFBAReport.get_last_ready_report_id(report_type=report_type)
-                        self.GenerateFBAReport.get_download_url()
-                        df = self.GenerateFBAReport.download_report()
-                        df = df.to_json(orient='records')
-                        return df                        
-
-                    # if order report, and not inventory, break
-                    else:
-                        raise RuntimeError(f"Couldn't get orders for {start_date}-{end_date}, {max_attempts} attempts")
-                
-                else:
-                    # added longer timer here because SP-API is sensitive
-                    self.Helpers.exponential_backoff(n=current_attempt, base_seconds=10, rate_of_growth=1.75)
-                    current_attempt += 1
+                    return self.__handle_failed_report(report_type, status, start_date, end_date)
                     
+            except (FatalError, ReportFailedError):
+                raise
+
             except Exception as e:
                 logging.error(f"Error on attempt {current_attempt}: {str(e)}")
-                self.Helpers.exponential_backoff(n=current_attempt, base_seconds=10, rate_of_growth=1.75)
-                current_attempt += 1
         
-        # break if couldn't populate df after max attempts
-        if df is None:
-            raise RuntimeError(f"Couldn't fetch orders for range {start_date}-{end_date} after max attempts")
\ No newline at end of file
+        # break if the report still isn't ready after every attempt (the deadline raises RetryBudgetExhausted instead)
+        raise RuntimeError(
+            f"'{report_type}' {start_date} - {end_date} wasn't ready after {current_attempt} status checks "
+            f"(attempt cap reached)"
+        )
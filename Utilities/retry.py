@@ -0,0 +1,203 @@
+from datetime import datetime, timedelta, timezone
+import logging
+import os
+import random
+import time
+from typing import Any, Dict, Iterator, Optional, Tuple, Union
+
+
+class FatalError(Exception):
+    """An error retrying cannot fix (e.g. rejected credentials or an invalid request), never retried"""
+    pass
+
+
+class RetryBudgetExhausted(FatalError):
+    """The run/account deadline is spent (or would be by the next backoff), so no further attempts are made"""
+    pass
+
+
+# HTTP status codes of the SP-API/LWA/blob endpoints, by whether another attempt can help
+RETRYABLE_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+FATAL_STATUS_CODES = {400, 401, 403, 404}
+
+
+def _utc(moment: datetime) -> datetime:
+    """Makes naive datetimes (e.g. the orchestration context clock) UTC-aware"""
+    return moment.replace(tzinfo=timezone.utc) if moment.tzinfo is None else moment.astimezone(timezone.utc)
+
+
+class RetryPolicy:
+    """
+    Single retry policy shared by every layer of a run: orchestrator, activities, polling and HTTP calls
+
+    Each retry loop still has its own attempt cap, but all of them stop as soon as the deadline is spent, and none
+    of them retry a FatalError. The deadline is carried in the durable inputs, so a retried sub-orchestrator or
+    activity inherits the remaining budget instead of starting over.
+
+    Parameters:
+        -deadline: (Optional[datetime]) Time after which nothing is retried anymore. Default=None (no deadline)
+        -max_attempts: (int) Default attempt cap of the loops using this policy (default=5)
+
+    Example:
+        >>policy = RetryPolicy.for_run(context.current_utc_datetime).for_account(context.current_utc_datetime)
+        >>for attempt in policy.attempts(max_attempts=3, what='orders report'):
+        >>    try:
+        >>        return do_work()
+        >>    except FatalError:
+        >>        raise
+        >>    except Exception as e:
+        >>        logging.error(f"Attempt {attempt} failed: {str(e)}")
+
+    Considerations:
+        -RUN_DEADLINE_MINUTES (default=180) and ACCOUNT_DEADLINE_MINUTES (default=90) env-vars set the budgets,
+        '0' turns either one off
+        -Orchestrators must pass `now=context.current_utc_datetime` to stay deterministic on replay
+    """
+    def __init__(self, deadline: Optional[datetime] = None, max_attempts: int = 5):
+        self.deadline = _utc(deadline) if deadline else None
+        self.max_attempts = max_attempts
+        self.not_before = None  # time.monotonic() the next backoff waits for at least, see `defer`
+
+    @classmethod
+    def for_run(cls, now: datetime) -> 'RetryPolicy':
+        """Policy for a whole run, starting at `now`, with a RUN_DEADLINE_MINUTES budget"""
+        minutes = float(os.getenv('RUN_DEADLINE_MINUTES') or 180)
+        return cls(deadline=_utc(now) + timedelta(minutes=minutes) if minutes > 0 else None)
+
+    def for_account(self, now: datetime) -> 'RetryPolicy':
+        """Policy for one account starting at `now`: ACCOUNT_DEADLINE_MINUTES budget, within the run deadline"""
+        minutes = float(os.getenv('ACCOUNT_DEADLINE_MINUTES') or 90)
+        if minutes <= 0:
+            return RetryPolicy(deadline=self.deadline, max_attempts=self.max_attempts)
+
+        account_deadline = _utc(now) + timedelta(minutes=minutes)
+        if self.deadline is not None:
+            account_deadline = min(account_deadline, self.deadline)
+        return RetryPolicy(deadline=account_deadline, max_attempts=self.max_attempts)
+
+
+    def to_payload(self) -> Dict[str, Any]:
+        """JSON-serializable form of the policy, to pass along in orchestrator/activity inputs"""
+        return {
+            'deadline': self.deadline.isoformat() if self.deadline else None,
+            'max_attempts': self.max_attempts
+        }
+
+    @classmethod
+    def from_payload(cls, payload: Optional[Dict[str, Any]]) -> 'RetryPolicy':
+        if not payload:
+            return cls()
+        deadline = payload.get('deadline')
+        return cls(
+            deadline=datetime.fromisoformat(deadline) if deadline else None,
+            max_attempts=payload.get('max_attempts') or 5
+        )
+
+    def to_account_input(self, account_name: str) -> Dict[str, Any]:
+        """Input of SubOrchestrator_Generator and the report activities: the account, plus this policy"""
+        return {'account_name': account_name, 'retry_policy': self.to_payload()}
+
+    @classmethod
+    def from_account_input(cls, payload: Union[str, Dict[str, Any]]) -> Tuple[str, 'RetryPolicy']:
+        """Unpacks an account input. A bare account name (older callers) gets a policy without a deadline"""
+        if isinstance(payload, str):
+            return payload, cls()
+        return payload['account_name'], cls.from_payload(payload.get('retry_policy'))
+
+
+    def remaining_seconds(self, now: Optional[datetime] = None) -> float:
+        """Seconds left until the deadline (infinite without a deadline, 0 once passed)"""
+        if self.deadline is None:
+            return float('inf')
+        now = _utc(now) if now else datetime.now(timezone.utc)
+        return max(0.0, (self.deadline - now).total_seconds())
+
+    def expired(self, now: Optional[datetime] = None) -> bool:
+        return self.remaining_seconds(now) <= 0
+
+    def check(self, what: str = 'operation', now: Optional[datetime] = None) -> None:
+        """Raises RetryBudgetExhausted if the deadline has passed"""
+        if self.expired(now):
+            logging.error(f"Retry budget spent (deadline {self.deadline.isoformat()}), giving up on {what}")
+            raise RetryBudgetExhausted(f"Deadline {self.deadline.isoformat()} passed, giving up on {what}")
+
+
+    @staticmethod
+    def is_retryable(error: BaseException) -> bool:
+        """Everything is worth another attempt, except fatal errors (and exhausted budgets)"""
+        return not isinstance(error, FatalError)
+
+    @staticmethod
+    def is_retryable_status(status_code: int) -> bool:
+        """Throttling (429), timeouts and 5xx are retryable, client errors such as 401/403 are fatal"""
+        return status_code in RETRYABLE_STATUS_CODES or status_code >= 500
+
+
+    def backoff(self, n: int, rate_of_growth: float = 1.5, base_seconds: float = 2, jitter: float = .01) -> None:
+        """
+        Exponential backoff like `Helpers.exponential_backoff`, but never sleeps past the deadline
+
+        Parameters:
+            -n: (int) the current iteration/attempt of your loop
+            -rate_of_growth: (float) multiple by which to increase each iteration (default=1.5x)
+            -base_seconds: (float) the starting number of seconds to sleep for (default=2)
+            -jitter: (float) offset to avoid exact seconds (default=.01)
+
+        Raises:
+            -RetryBudgetExhausted: if the sleep would end after the deadline (no point sleeping then)
+        """
+        x = base_seconds * (rate_of_growth ** n)
+        seconds = x + random.uniform(-jitter * x, jitter * x)
+        if self.not_before is not None:
+            seconds = max(seconds, self.not_before - time.monotonic())
+            self.not_before = None
+
+        if seconds >= self.remaining_seconds():
+            logging.error(f"Backoff of {seconds:.2f} s would pass the deadline, not retrying")
+            raise RetryBudgetExhausted(
+                f"Retry budget spent: {self.remaining_seconds():.0f} s left, next backoff is {seconds:.0f} s"
+            )
+
+        logging.info(f"\tRetry attempt #{n} - {seconds:.2f} seconds ...")
+        time.sleep(seconds)
+
+    def defer(self, seconds: float) -> None:
+        """Makes the next `backoff` wait at least `seconds` from now (e.g. until an open circuit lets a probe through)"""
+        not_before = time.monotonic() + seconds
+        self.not_before = not_before if self.not_before is None else max(self.not_before, not_before)
+
+    def attempts(
+        self,
+        max_attempts: Optional[int] = None,
+        rate_of_growth: float = 1.5,
+        base_seconds: float = 2,
+        what: str = 'operation'
+    ) -> Iterator[int]:
+        """
+        Yields attempt numbers (1, 2, ...), backing off between them, until `max_attempts` or the deadline
+
+        Parameters:
+            -max_attempts: (Optional[int]) Attempt cap of this loop. Default = the policy's `max_attempts`
+            -rate_of_growth/base_seconds: backoff settings between attempts (see `backoff`)
+            -what: (str) Name of the operation, for the logs/errors
+
+        Raises:
+            -RetryBudgetExhausted: once the deadline stops the loop, saying how many attempts ran
+
+        Considerations:
+            -`return` from the loop on success, `continue` (or let the loop body end) on retryable failures,
+            and raise on fatal ones. If the loop runs out, every attempt ran (the deadline raises instead): the caller
+            decides what to raise
+        """
+        max_attempts = max_attempts or self.max_attempts
+        for attempt in range(1, max_attempts + 1):
+            try:
+                if attempt > 1:
+                    self.backoff(attempt - 1, rate_of_growth=rate_of_growth, base_seconds=base_seconds)
+                self.check(what)
+            except RetryBudgetExhausted as e:
+                raise RetryBudgetExhausted(
+                    f"Gave up on {what} after {attempt - 1} of {max_attempts} attempts, stopped by the deadline: "
+                    f"{str(e)}"
+                ) from e
+            yield attempt
@@ -0,0 +1,168 @@
+from datetime import date, datetime, timedelta
+import hashlib
+import json
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import pytz
+
+from Utilities.settings import Settings, get_settings
+
+
+ORDERS_REPORT_TYPE = 'GET_FLAT_FILE_ALL_ORDERS_DATA_BY_ORDER_DATE_GENERAL'
+
+DEFAULT_LOOKBACK_DAYS = 90
+MAX_LOOKBACK_DAYS = 730  # the orders report only goes back about 2 years
+WINDOW_DAYS = 30  # the reports API caps a date range at 31 days
+
+
+def eastern_today(now: Optional[datetime] = None) -> date:
+    """
+    Today's date in US/Eastern, the timezone the SP-API date ranges are validated in (at `now`, e.g. the
+    orchestration context clock, naive datetimes being UTC. Default=None: the system clock)
+    """
+    if now is None:
+        return datetime.now(pytz.timezone('US/Eastern')).date()
+    now = pytz.utc.localize(now) if now.tzinfo is None else now
+    return now.astimezone(pytz.timezone('US/Eastern')).date()
+
+
+class RunParameters:
+    """
+    Parameters of one pipeline run, passed from HTTP_trigger down to the activities
+
+    Parameters:
+        -accounts: (Optional[List[str]]) Subset of ACCOUNTS_LIST to run. Default=None (all of them)
+        -lookback_days: (Optional[int]) How many days of orders the report covers. Default=None (90)
+        -report_date: (Optional[str]) Day the report is for, as 'YYYY-MM-DD' (orders up to that day).
+        Default=None (today, US/Eastern)
+        -settings: (Optional[Settings]) Validated configuration, see Utilities.settings. Default=None (the process's)
+        -run_id: (Optional[str]) Unique ID of this run, set by HTTP_trigger when it starts one: the downloads are
+        checkpointed under it (see Utilities.checkpoints). Default=None (no checkpoints)
+        -force: (bool) Regenerate everything: run even if the report exists, and download every report again
+        instead of reading checkpoints. Default=False
+
+    Example:
+        >>params = RunParameters(accounts=['DZ'], lookback_days=60)
+        >>params.windows()  # [('08-20-2026', '09-19-2026'), ('07-21-2026', '08-20-2026')] on 09-19-2026
+        >>params.instance_id('DurableFunctionsOrchestrator')  # same parameters -> same ID
+
+    Considerations:
+        -Raises ValueError on unknown accounts, a lookback outside 1-730 days, or a report date in the future
+    """
+    def __init__(
+        self,
+        accounts: Optional[List[str]] = None,
+        lookback_days: Optional[int] = None,
+        report_date: Optional[str] = None,
+        settings: Optional[Settings] = None,
+        run_id: Optional[str] = None,
+        force: bool = False
+    ):
+        settings = settings if settings is not None else get_settings()
+        all_accounts = list(settings.accounts)
+        self.inventory_reports = settings.inventory_reports
+
+        # keep the ACCOUNTS_LIST order, so the same subset always gives the same instance ID and report
+        # (matched case-insensitively, so 'dz,DZ' is one run of DZ, not two)
+        requested = list(all_accounts) if not accounts else [a.strip() for a in accounts if a.strip()]
+        known = {account.upper() for account in all_accounts}
+        unknown = [account for account in requested if account.upper() not in known]
+        if unknown:
+            logging.error(f"Accounts {unknown} are not in ACCOUNTS_LIST")
+            raise ValueError(f"Accounts {unknown} are not in ACCOUNTS_LIST {all_accounts}")
+        requested = {account.upper() for account in requested}
+        self.accounts = [account for account in all_accounts if account.upper() in requested]
+        self.all_accounts = len(self.accounts) == len(all_accounts)
+
+        self.lookback_days = int(lookback_days) if lookback_days else DEFAULT_LOOKBACK_DAYS
+        if not 1 <= self.lookback_days <= MAX_LOOKBACK_DAYS:
+            raise ValueError(f"lookback_days must be between 1 and {MAX_LOOKBACK_DAYS}, got {self.lookback_days}")
+
+        today = eastern_today()
+        self.report_date = datetime.strptime(report_date, '%Y-%m-%d').date() if report_date else today
+        if self.report_date > today:
+            raise ValueError(f"report_date {self.report_date} is in the future")
+        self.run_id = run_id
+        self.force = bool(force)
+
+    @classmethod
+    def from_query(cls, query: Dict[str, Any], settings: Optional[Settings] = None) -> 'RunParameters':
+        """
+        Builds the parameters from an HTTP request's query string/json body, e.g.
+        `?accounts=DZ,QR&lookback_days=60&report_date=2026-09-19&force=true` (accounts may also be a json list in
+        the body)
+        """
+        accounts = query.get('accounts')
+        if isinstance(accounts, str):
+            accounts = accounts.split(',')
+        return cls(
+            accounts=accounts,
+            lookback_days=query.get('lookback_days'),
+            report_date=query.get('report_date'),
+            settings=settings,
+            force=str(query.get('force', '')).lower() in ('true', '1', 'yes')
+        )
+
+    def to_payload(self) -> Dict[str, Any]:
+        """JSON-serializable form, to pass along in orchestrator/activity inputs"""
+        return {
+            'accounts': self.accounts,
+            'lookback_days': self.lookback_days,
+            'report_date': self.report_date.isoformat(),
+            'run_id': self.run_id,
+            'force': self.force
+        }
+
+    @classmethod
+    def from_payload(cls, payload: Optional[Dict[str, Any]], now: Optional[datetime] = None) -> 'RunParameters':
+        """
+        Inverse of `to_payload`. No payload (e.g. a run started without input) means the defaults, the report date
+        being today at `now`: pass `context.current_utc_datetime` in orchestrators, so replays see the same day
+        """
+        payload = dict(payload or {})
+        if not payload.get('report_date'):
+            payload['report_date'] = eastern_today(now).isoformat()
+        return cls(**payload)
+
+    def is_current(self, now: Optional[datetime] = None) -> bool:
+        """
+        Whether the run is today's report (at `now`, see `eastern_today`) with the default lookback: only then are its
+        inventory and 'received' columns what the snapshot history holds for the report date (see Utilities.snapshots)
+        """
+        return self.report_date == eastern_today(now) and self.lookback_days == DEFAULT_LOOKBACK_DAYS
+
+    def instance_id(self, function_name: str) -> str:
+        """Deterministic orchestration instance ID: the same parameters on the same day always map to one run"""
+        key = json.dumps({'accounts': self.accounts, 'lookback_days': self.lookback_days}, sort_keys=True)
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:12]
+        return f"{function_name}-{self.report_date.isoformat()}-{digest}"
+
+    @property
+    def report_blob_name(self) -> str:
+        """Name of the finished report in the blob container (the original name for a default, all-accounts run)"""
+        name = f"On Hand Reports {self.report_date.strftime('%m-%d-%Y')}"
+        if not self.all_accounts:
+            name += f" {'-'.join(self.accounts)}"
+        if self.lookback_days != DEFAULT_LOOKBACK_DAYS:
+            name += f" {self.lookback_days}D"
+        return name + '.xlsx'
+
+    def windows(self) -> List[Tuple[str, str]]:
+        """The orders date ranges (start, end) as 'mm-dd-YYYY', newest first, each at most 30 days long"""
+        windows = []
+        end = self.report_date
+        oldest = self.report_date - timedelta(days=self.lookback_days)
+        while end > oldest:
+            start = max(oldest, end - timedelta(days=WINDOW_DAYS))
+            windows.append((start.strftime('%m-%d-%Y'), end.strftime('%m-%d-%Y')))
+            end = start
+        return windows
+
+    def reports(self) -> List[Tuple[str, Optional[str], Optional[str]]]:
+        """
+        Every report of an account's run, as (report type, start date, end date): orders windows, then the inventory
+        reports (see INVENTORY_REPORTS)
+        """
+        orders = [(ORDERS_REPORT_TYPE, start, end) for start, end in self.windows()]
+        return orders + [(report_type, None, None) for report_type in self.inventory_reports]
@@ -0,0 +1,208 @@
+from datetime import date, datetime, timedelta
+import re
+from typing import Dict, Optional, Sequence, Tuple, Union
+
+import pytz
+
+from Utilities.lazy import LazyModule
+from Utilities.tracing import tracer
+
+np = LazyModule('numpy')
+pd = LazyModule('pandas')
+
+
+# <metric>-<N>d columns the engine computes, e.g. 'units-7d' or 'weeks-of-cover-30d'
+METRIC_KINDS = {
+    'units': "units sold over the last N days",
+    'velocity': "units sold per day over the last N days",
+    'weeks-of-cover': "weeks the on-hand units last at the N-day velocity (blank without sales)",
+    'sell-through': "% of the units available over the last N days that sold: units / (units + on-hand)"
+}
+
+_METRIC_PATTERN = re.compile(rf"^({'|'.join(map(re.escape, METRIC_KINDS))})-([1-9][0-9]*)d$")
+
+
+def parse_metric(metric: str) -> Tuple[str, int]:
+    """Splits a metric name into (kind, days), e.g. 'velocity-30d' -> ('velocity', 30). Raises ValueError if unknown"""
+    match = _METRIC_PATTERN.match(metric)
+    if not match:
+        raise ValueError(f"Unknown metric '{metric}', use <kind>-<days>d with a kind out of {list(METRIC_KINDS)}")
+    return match.group(1), int(match.group(2))
+
+
+class MetricsEngine:
+    """
+    Sell-through metrics of every SKU, over several windows at once (e.g. 7/30/60/90D units, daily velocity, weeks
+    of cover and sell-through %)
+
+    Parameters:
+        -metrics: (Sequence[str]) Metric columns, '<kind>-<days>d' with kinds out of METRIC_KINDS
+        -as_of: (Optional[Union[str, date]]) The report date, 'YYYY-MM-DD': the windows are the N days before it,
+        up to its midnight US/Eastern like the run's orders windows (a 7D window on 10-19 is 10-12 to 10-18).
+        Default=None (the day after the latest order)
+
+    Example:
+        >>engine = MetricsEngine(['units-7d', 'units-30d', 'velocity-30d', 'weeks-of-cover-30d'], as_of='2026-10-19')
+        >>engine.compute(orders, index.codes['orders'], index.base_codes, on_hand)  # {'units-7d': array, ...}
+
+    Considerations:
+        -Every window is computed in one pass over the orders: each line is bucketed by the window edges its date
+        falls between, summed per SKU and bucket with a single bincount, and the buckets are then cumulated, so the
+        N-day units are a column of the running sum. Adding metrics or windows adds no pass over the data
+        -Works from order lines ('purchase-date' and 'quantity', bucketed by their time against the windows' US/Eastern
+        edges) or daily per-SKU aggregates ('date' and 'units', US/Eastern days)
+        -A window as long as the lookback counts every order of the run
+        -Windows longer than the run's lookback only see the lookback's orders
+    """
+    def __init__(self, metrics: Sequence[str], as_of: Optional[Union[str, date]] = None):
+        self.metrics = tuple(metrics)
+        self.parsed = [parse_metric(metric) for metric in self.metrics]
+        self.windows = sorted({days for _, days in self.parsed})
+        self.as_of = datetime.strptime(str(as_of)[:10], '%Y-%m-%d').date() if as_of else None
+
+    @staticmethod
+    def days(values: 'pd.Series') -> 'np.ndarray':
+        """The day (datetime64[D]) of dates, e.g. '2026-10-18' -> 2026-10-18"""
+        if pd.api.types.is_datetime64_any_dtype(values):
+            return values.to_numpy().astype('datetime64[D]')
+        if values.hasnans:
+            values = values.fillna('NaT')
+        return values.to_numpy().astype('S10').astype('datetime64[D]')
+
+    @staticmethod
+    def instants(values: 'pd.Series') -> 'np.ndarray':
+        """The time (datetime64[s], UTC) of ISO timestamps, e.g. '2026-10-18T23:59:29+00:00' -> 2026-10-18T23:59:29"""
+        if pd.api.types.is_datetime64_any_dtype(values):
+            if getattr(values.dt, 'tz', None) is not None:
+                values = values.dt.tz_convert('UTC').dt.tz_localize(None)
+            return values.to_numpy().astype('datetime64[s]')
+
+        # the first 19 characters (bytes) are the UTC time, as the reports write it ('+00:00'): several times faster
+        # than parsing the whole timestamp. Blanks are NaT, which no window counts
+        if values.hasnans:
+            values = values.fillna('NaT')
+        return values.to_numpy().astype('S19').astype('datetime64[s]')
+
+    @staticmethod
+    def __window_edge(day: date) -> 'np.datetime64':
+        """Private method: midnight US/Eastern of a day, in UTC (where the run's orders windows start and end)"""
+        midnight = pytz.timezone('US/Eastern').localize(datetime.combine(day, datetime.min.time()))
+        return np.datetime64(midnight.astimezone(pytz.utc).replace(tzinfo=None), 's')
+
+    def __buckets(self, sales: 'pd.DataFrame') -> Tuple['np.ndarray', 'pd.Series']:
+        """
+        Private method: the window bucket of every row (0 = within the shortest window, -1 = outside every window),
+        and the units of every row
+        """
+        if 'units' in sales.columns:
+            days = self.days(sales['date'])
+            as_of = self.as_of
+            if as_of is None:
+                days = days[~np.isnat(days)]
+                as_of = days.max().astype(object) + timedelta(days=1) if len(days) else datetime.now(pytz.utc).date()
+
+            # days before the report date (0 = the day before), only those within the longest window count
+            offsets = (np.datetime64(as_of, 'D') - days).astype('int64') - 1
+            buckets = np.searchsorted(self.windows, offsets, side='right')
+            buckets[(offsets < 0) | (offsets >= self.windows[-1])] = -1
+            return buckets, sales['units']
+
+        times = self.instants(sales['purchase-date'])
+        as_of = self.as_of
+        if as_of is None:
+            known = times[~np.isnat(times)]
+            latest = pytz.utc.localize(known.max().astype(object)) if len(known) else datetime.now(pytz.utc)
+            as_of = latest.astimezone(pytz.timezone('US/Eastern')).date() + timedelta(days=1)
+
+        # the windows' starts, oldest first, and their common end (midnight US/Eastern of the report date)
+        starts = np.array([self.__window_edge(as_of - timedelta(days=days)) for days in reversed(self.windows)])
+        end = self.__window_edge(as_of)
+
+        # bucket i holds the times between the starts of windows i-1 and i (counted from the shortest)
+        buckets = len(self.windows) - np.searchsorted(starts, times, side='right')
+        buckets[np.isnat(times) | (times < starts[0]) | (times >= end)] = -1
+        return buckets, sales['quantity']
+
+    def window_units(self, sales: 'pd.DataFrame', codes: 'np.ndarray', size: int) -> Dict[int, 'np.ndarray']:
+        """
+        Units sold per code over every window
+
+        Parameters:
+            -sales: (pd.DataFrame) Order lines ('purchase-date', 'quantity') or daily aggregates ('date', 'units')
+            -codes: (np.ndarray) The SKU code of every row of `sales` (-1 to skip a row), see Utilities.sku_index
+            -size: (int) Number of codes
+
+        Returns:
+            -Dict[int, np.ndarray]: Units per code, by window length in days
+        """
+        buckets, quantities = self.__buckets(sales)
+        valid = (codes >= 0) & (codes < size) & (buckets >= 0)
+
+        # window i is the running sum up to bucket i
+        buckets = buckets[valid]
+        quantities = pd.to_numeric(quantities)
+        weights = np.nan_to_num(quantities.to_numpy(dtype='float64', na_value=np.nan)[valid])
+
+        length = max(size, 1) * len(self.windows)
+        totals = np.bincount(codes[valid] * len(self.windows) + buckets, weights=weights, minlength=length)
+        cumulative = totals.reshape(max(size, 1), len(self.windows)).cumsum(axis=1)[:size]
+        if quantities.dtype.kind in 'biu':
+            cumulative = cumulative.astype('int64')
+        return {days: cumulative[:, i] for i, days in enumerate(self.windows)}
+
+    def compute(
+        self,
+        sales: 'pd.DataFrame',
+        codes: 'np.ndarray',
+        row_codes: 'np.ndarray',
+        on_hand: 'np.ndarray'
+    ) -> Dict[str, 'np.ndarray']:
+        """
+        Computes the metrics of the report rows
+
+        Parameters:
+            -sales: (pd.DataFrame) Order lines or daily aggregates, see `window_units`
+            -codes: (np.ndarray) The SKU code of every row of `sales` (-1 to skip a row)
+            -row_codes: (np.ndarray) The SKU code of every report row (-1 for rows without sales)
+            -on_hand: (np.ndarray) On-hand units of every report row, for cover and sell-through
+
+        Returns:
+            -Dict[str, np.ndarray]: Every metric, by name, one value per report row
+        """
+        with tracer.span('report.metrics', metrics=len(self.metrics), windows=len(self.windows)):
+            row_codes = np.asarray(row_codes)
+            size = int(row_codes.max()) + 1 if len(row_codes) else 0
+            has_code = row_codes >= 0
+            rows = np.where(has_code, row_codes, 0)
+            units = {
+                days: np.where(has_code, sold[rows], 0) if len(sold) else np.zeros(len(rows), dtype=sold.dtype)
+                for days, sold in self.window_units(sales, codes, size).items()
+            }
+            on_hand = np.asarray(on_hand, dtype='float64')
+
+            results = {}
+            for metric, (kind, days) in zip(self.metrics, self.parsed):
+                sold = units[days]
+                if kind == 'units':
+                    results[metric] = sold
+                    continue
+
+                velocity = sold / days
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    if kind == 'velocity':
+                        results[metric] = velocity.round(2)
+                    elif kind == 'weeks-of-cover':
+                        results[metric] = np.where(velocity > 0, on_hand / (velocity * 7), np.nan).round(1)
+                    elif kind == 'sell-through':
+                        available = sold + on_hand
+                        results[metric] = np.where(available > 0, sold / available * 100, 0.0).round(1)
+            return results
+
+
+def validate_metrics(metrics: Optional[Sequence[str]]) -> Optional[Tuple[str, ...]]:
+    """Checks the SALES_METRICS setting, returns it as a tuple (None if blank). Raises ValueError on unknown metrics"""
+    if not metrics:
+        return None
+    for metric in metrics:
+        parse_metric(metric)
+    return tuple(dict.fromkeys(metrics))
@@ -0,0 +1,117 @@
+from ast import literal_eval
+import logging
+import os
+from typing import Any, Callable, Dict, List, Optional
+
+
+class AccountScheduler:
+    """
+    Schedules the per-account sub-orchestrators of the main orchestrator, either all at once or as a sliding window
+
+    Parameters:
+        -max_in_flight: (Optional[int]) Maximum number of accounts running at the same time. 0 or None runs every
+        account at once (the original fan-out). Default = MAX_CONCURRENT_ACCOUNTS env-var
+        -priorities: (Optional[Dict[str, float]]) Weight per account, higher weights start first (e.g. the typical
+        report processing time in minutes). Default = ACCOUNTS_PRIORITY env-var
+
+    Example:
+        >>scheduler = AccountScheduler(max_in_flight=10)
+        >>results = yield from scheduler.run(context, accounts, start_account)
+
+    Considerations:
+        -`run` is a generator meant to be delegated to with `yield from` inside an orchestrator function, so it
+        only ever yields durable tasks and stays deterministic on replay
+        -Accounts missing from the priorities keep their ACCOUNTS_LIST order, after the prioritized ones
+    """
+    def __init__(self, max_in_flight: Optional[int] = None, priorities: Optional[Dict[str, float]] = None):
+        if max_in_flight is None:
+            max_in_flight = int(os.getenv('MAX_CONCURRENT_ACCOUNTS') or 0)
+
+        if max_in_flight < 0:
+            raise ValueError("MAX_CONCURRENT_ACCOUNTS must be 0 (unbounded) or a positive integer")
+
+        if priorities is None:
+            priorities = self.__parse_priorities(os.getenv('ACCOUNTS_PRIORITY'))
+
+        self.max_in_flight = max_in_flight
+        self.priorities = priorities
+
+    @staticmethod
+    def __parse_priorities(raw: Optional[str]) -> Dict[str, float]:
+        """Private method: parses the ACCOUNTS_PRIORITY env-var, either a dict of weights or an ordered list"""
+        if not raw:
+            return {}
+
+        try:
+            parsed = literal_eval(raw)
+        except (SyntaxError, ValueError):
+            raise SyntaxError("ACCOUNTS_PRIORITY must be a dict (e.g. \"{'DZ': 40, 'QR': 5}\") or a list of accounts")
+
+        # a plain list means 'start in this order', so translate to descending weights
+        if isinstance(parsed, (list, tuple)):
+            return {account.upper(): float(len(parsed) - i) for i, account in enumerate(parsed)}
+
+        if isinstance(parsed, dict):
+            return {account.upper(): float(weight) for account, weight in parsed.items()}
+
+        raise SyntaxError("ACCOUNTS_PRIORITY must be a dict (e.g. \"{'DZ': 40, 'QR': 5}\") or a list of accounts")
+
+    def prioritize(self, accounts: List[str]) -> List[str]:
+        """Returns the accounts in start order: highest priority weight first, ties keep their original order"""
+        # sorted() is stable, so unweighted accounts keep the order of ACCOUNTS_LIST
+        return sorted(accounts, key=lambda account: -self.priorities.get(account.upper(), 0))
+
+    def run(self, context, accounts: List[str], start_task: Callable[[str], Any]):
+        """
+        Starts a task per account, keeping at most `max_in_flight` of them running, and returns their results
+
+        Parameters:
+            -context: (DurableOrchestrationContext) The context of the calling orchestrator
+            -accounts: (List[str]) The accounts to run, in ACCOUNTS_LIST order
+            -start_task: (Callable) Returns the durable task for one account
+            (e.g. a `call_sub_orchestrator_with_retry` wrapped in a lambda)
+
+        Returns:
+            -List of the task results, in the same order as the `accounts` parameter (not the start order)
+
+        Considerations:
+            -Accounts are matched case-insensitively and each one runs once: a repeated account gets the result of 
+            its first occurrence
+        """
+        # results are keyed by account, so a repeat would otherwise start a second task and share one result
+        unique = {}
+        for account in accounts:
+            unique.setdefault(account.upper(), account)
+        queue = self.prioritize(list(unique.values()))
+
+        # unbounded: fire everything at once, same as a plain fan-out
+        if not self.max_in_flight or self.max_in_flight >= len(queue):
+            tasks = [start_task(account) for account in queue]
+            results = yield context.task_all(tasks)
+            results_by_account = {account.upper(): result for account, result in zip(queue, results)}
+            return [results_by_account[account.upper()] for account in accounts]
+
+        logging.info(f"Running {len(queue)} accounts, at most {self.max_in_flight} at a time, in order: {queue}")
+
+        # sliding window: start a new account as soon as any running one finishes
+        results_by_account = {}
+        in_flight = []
+        while queue or in_flight:
+            while queue and len(in_flight) < self.max_in_flight:
+                account = queue.pop(0)
+                in_flight.append((account, start_task(account)))
+
+            finished = yield context.task_any([task for _, task in in_flight])
+
+            for i, (account, task) in enumerate(in_flight):
+                if task is finished:
+                    in_flight.pop(i)
+                    break
+
+            # task_any completes on failures too, so surface them the same way task_all would
+            if isinstance(finished.result, Exception):
+                raise finished.result
+
+            results_by_account[account.upper()] = finished.result
+
+        return [results_by_account[account.upper()] for account in accounts]
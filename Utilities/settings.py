@@ -0,0 +1,270 @@
+from ast import literal_eval
+import logging
+import os
+import threading
+from types import MappingProxyType
+from typing import Any, Mapping, Optional, Tuple
+
+from Utilities import inventory_sources
+from Utilities.sales_metrics import validate_metrics
+from Utilities.marketplaces import MARKETPLACES, REGIONS, region_of
+
+
+# env-vars holding the Key Vault *names* of the SP-API secrets, by the GenerateFBAReport attribute they populate
+KEY_NAME_ENV_VARS = {
+    'client_id': 'CLIENT_ID',
+    'client_secret': 'CLIENT_SECRET',
+    'refresh_token': 'REFRESH_TOKEN',
+    'rotation_deadline': 'ROTATION_DEADLINE'
+}
+
+# COMPILE_MODE values: one Activity_ReportCompiler per account, or all accounts at once in SubOrchestrator_Assembler
+COMPILE_MODES = ('per_account', 'consolidated')
+
+
+class Settings:
+    """
+    The Function App configuration the SP-API classes need, parsed and validated once, then read-only
+
+    Parameters:
+        -accounts: (Tuple[str, ...]) Account initials, in ACCOUNTS_LIST order
+        -vault_names: (Mapping[str, str]) Key Vault name per (upper-cased) account, from <ACCOUNT>_VAULT_NAME, and
+        per account and region if set (e.g. 'DZ_EU', from DZ_EU_VAULT_NAME)
+        -key_names: (Mapping[str, str]) Secret name per GenerateFBAReport attribute (see KEY_NAME_ENV_VARS)
+        -marketplace_id: (str) MARKETPLACE_ID, the default marketplace
+        -endpoint: (str) ENDPOINT, the Reports API base URL of the default marketplace's region
+        -token_request_url: (str) TOKEN_REQUEST_URL, the LWA token endpoint of the default marketplace's region
+        -marketplaces: (Optional[Mapping[str, Tuple[str, ...]]]) Marketplace IDs per (upper-cased) account, from
+        <ACCOUNT>_MARKETPLACES. Accounts without it only run the default marketplace
+        -regions: (Optional[Mapping[str, Tuple[str, str]]]) (Reports API endpoint, LWA token endpoint) per region. The
+        default region uses ENDPOINT/TOKEN_REQUEST_URL, the others <REGION>_ENDPOINT/<REGION>_TOKEN_REQUEST_URL
+        (e.g. EU_ENDPOINT) if set, else Amazon's (see Utilities.marketplaces.REGIONS)
+        -inventory_reports: (Optional[Tuple[str, ...]]) Inventory reports to fetch and join, from INVENTORY_REPORTS 
+        (see Utilities.inventory_sources). The unsuppressed inventory report is always first
+        -on_hand_columns: (Optional[Tuple[str, ...]]) Columns of the on-hand report, from ON_HAND_COLUMNS. 
+        Default=None (see `inventory_sources.default_columns`)
+        -compile_mode: (str) COMPILE_MODE, 'per_account' or 'consolidated' (see COMPILE_MODES). Default='per_account'
+        -sales_metrics: (Optional[Tuple[str, ...]]) Sell-through metric columns of the on-hand report, from 
+        SALES_METRICS (see Utilities.sales_metrics). Default=None (no metrics)
+
+    Example:
+        >>settings = get_settings()  # parsed on the first call of the process, cached after
+        >>settings.vault_name('DZ')  # 'dz-keyvault'
+        >>settings.regions_of('DZ')  # {'na': ('ATVPDKIKX0DER', 'A2EUQ1WTGCTBG2'), 'eu': ('A1PA6795UKMFR9',)}
+
+    Considerations:
+        -Use `get_settings` rather than `Settings.from_env`, so the env-vars are only read and validated once per
+        worker process instead of on every class instantiation (and every orchestrator replay)
+        -Attributes can't be reassigned. App settings changes restart the worker, which reloads them
+    """
+    __slots__ = (
+        'accounts', 'vault_names', 'key_names', 'marketplace_id', 'endpoint', 'token_request_url', 'marketplaces', 
+        'regions', 'default_region', 'inventory_reports', 'on_hand_columns', 'compile_mode', 'sales_metrics'
+    )
+
+    def __init__(
+        self,
+        accounts: Tuple[str, ...],
+        vault_names: Mapping[str, str],
+        key_names: Mapping[str, str],
+        marketplace_id: str,
+        endpoint: str,
+        token_request_url: str,
+        marketplaces: Optional[Mapping[str, Tuple[str, ...]]] = None,
+        regions: Optional[Mapping[str, Tuple[str, str]]] = None,
+        inventory_reports: Optional[Tuple[str, ...]] = None,
+        on_hand_columns: Optional[Tuple[str, ...]] = None,
+        compile_mode: str = 'per_account',
+        sales_metrics: Optional[Tuple[str, ...]] = None
+    ):
+        # MARKETPLACE_ID isn't checked against the known marketplaces (ENDPOINT says where it's served)
+        default_region = region_of(marketplace_id) if marketplace_id in MARKETPLACES else 'na'
+        sales_metrics = validate_metrics(sales_metrics)
+        inventory_reports, on_hand_columns = inventory_sources.validate(
+            inventory_reports or (), on_hand_columns, metrics=sales_metrics or ()
+        )
+        regions = {**REGIONS, **(regions or {}), default_region: (endpoint, token_request_url)}
+        if compile_mode not in COMPILE_MODES:
+            raise ValueError(f"COMPILE_MODE must be one of {COMPILE_MODES}, got '{compile_mode}'")
+        values = {
+            'accounts': tuple(accounts),
+            'vault_names': MappingProxyType(dict(vault_names)),
+            'key_names': MappingProxyType(dict(key_names)),
+            'marketplace_id': marketplace_id,
+            'endpoint': endpoint,
+            'token_request_url': token_request_url,
+            'marketplaces': MappingProxyType({
+                account.upper(): tuple((marketplaces or {}).get(account.upper()) or (marketplace_id,)) 
+                for account in accounts
+            }),
+            'regions': MappingProxyType(regions),
+            'default_region': default_region,
+            'inventory_reports': inventory_reports,
+            'on_hand_columns': on_hand_columns,
+            'compile_mode': compile_mode,
+            'sales_metrics': sales_metrics
+        }
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f"Settings are read-only, can't set '{name}'")
+
+    def __repr__(self) -> str:
+        return f"Settings(accounts={list(self.accounts)}, marketplace_id='{self.marketplace_id}', " \
+            f"endpoint='{self.endpoint}')"
+
+    @classmethod
+    def from_env(cls, environ: Optional[Mapping[str, str]] = None) -> 'Settings':
+        """
+        Parses and validates the settings from the environment variables
+
+        Parameters:
+            -environ: (Optional[Mapping[str, str]]) Variables to read. Default=None (os.environ)
+
+        Raises:
+            -SyntaxError: if ACCOUNTS_LIST is missing, not a list, empty, or lists an account twice
+            -ValueError: listing every other missing variable at once
+        """
+        environ = os.environ if environ is None else environ
+
+        try:
+            accounts = literal_eval(environ.get('ACCOUNTS_LIST') or '')
+        except (SyntaxError, ValueError):
+            raise SyntaxError("No accounts detected in ACCOUNTS_LIST env-var. Pass a list with at least one acc name")
+
+        if not isinstance(accounts, (list, tuple)) or len(accounts) == 0:
+            raise SyntaxError("Empty list detected for ACCOUNTS_LIST. Please pass at least one acc name")
+
+        # accounts share their vault/marketplace variables case-insensitively, so 'DZ' and 'dz' are the same account
+        duplicates = sorted({account for account in accounts if [a.upper() for a in accounts].count(account.upper()) > 1})
+        if duplicates:
+            raise SyntaxError(f"Duplicate accounts {duplicates} in ACCOUNTS_LIST. Please list each acc name once")
+
+        general = {
+            'marketplace_id': 'MARKETPLACE_ID',
+            'endpoint': 'ENDPOINT',
+            'token_request_url': 'TOKEN_REQUEST_URL'
+        }
+        vault_vars = {account.upper(): f"{account.upper()}_VAULT_NAME" for account in accounts}
+        marketplaces = {
+            account.upper(): cls.__parse_marketplaces(account, environ.get(f"{account.upper()}_MARKETPLACES"))
+            for account in accounts
+        }
+        inventory_reports = cls.__parse_list('INVENTORY_REPORTS', environ.get('INVENTORY_REPORTS'))
+        on_hand_columns = cls.__parse_list('ON_HAND_COLUMNS', environ.get('ON_HAND_COLUMNS'))
+        sales_metrics = cls.__parse_list('SALES_METRICS', environ.get('SALES_METRICS'))
+        required = list(general.values()) + list(KEY_NAME_ENV_VARS.values()) + list(vault_vars.values())
+
+        # break program if any env vars are missing
+        missing_vars = [var for var in required if not environ.get(var)]
+        if missing_vars:
+            missing_vars = ', '.join(missing_vars)
+            logging.error(f"Missing the following environmental variables: {missing_vars}")
+            raise ValueError(
+                f"""Missing some environmental vars: check your 'ACCOUNTS_LIST' and '<name>_VAULT_NAME' vars.
+                Missing: {missing_vars}"""
+                )
+
+        # optional per-region overrides: a vault per account and region (SP-API authorizations are regional), 
+        # and the endpoints of the regions other than the default one
+        vault_names = {account: environ[var] for account, var in vault_vars.items()}
+        for account in vault_vars:
+            for region in REGIONS:
+                if environ.get(f"{account}_{region.upper()}_VAULT_NAME"):
+                    vault_names[f"{account}_{region.upper()}"] = environ[f"{account}_{region.upper()}_VAULT_NAME"]
+
+        regions = {
+            region: (
+                environ.get(f"{region.upper()}_ENDPOINT") or endpoint, 
+                environ.get(f"{region.upper()}_TOKEN_REQUEST_URL") or token_request_url
+            )
+            for region, (endpoint, token_request_url) in REGIONS.items()
+        }
+
+        logging.info("Successfully validated all required environment variables")
+        return cls(
+            accounts=tuple(accounts),
+            vault_names=vault_names,
+            key_names={attribute: environ[var] for attribute, var in KEY_NAME_ENV_VARS.items()},
+            marketplaces=marketplaces,
+            regions=regions,
+            inventory_reports=inventory_reports,
+            on_hand_columns=on_hand_columns,
+            compile_mode=(environ.get('COMPILE_MODE') or 'per_account').strip().lower(),
+            sales_metrics=sales_metrics,
+            **{attribute: environ[var] for attribute, var in general.items()}
+        )
+
+    @staticmethod
+    def __parse_list(name: str, raw: Optional[str]) -> Optional[Tuple[str, ...]]:
+        """Private method: parses a list env-var, either a python list (e.g. "['a', 'b']") or comma-separated"""
+        if not raw:
+            return None
+
+        try:
+            parsed = literal_eval(raw) if raw.strip().startswith(('[', '(')) else raw.split(',')
+        except (SyntaxError, ValueError):
+            raise SyntaxError(f"{name} must be a list (e.g. \"['a', 'b']\") or comma-separated")
+
+        return tuple(dict.fromkeys(item.strip() for item in parsed if item.strip())) or None
+
+    @classmethod
+    def __parse_marketplaces(cls, account: str, raw: Optional[str]) -> Optional[Tuple[str, ...]]:
+        """Private method: parses <ACCOUNT>_MARKETPLACES, a list (e.g. "['ATVPDKIKX0DER', 'A1PA6795UKMFR9']")"""
+        marketplaces = cls.__parse_list(f"{account.upper()}_MARKETPLACES", raw)
+        if not marketplaces:
+            return None
+
+        unknown = [marketplace for marketplace in marketplaces if marketplace not in MARKETPLACES]
+        if unknown:
+            raise ValueError(f"Unknown marketplace IDs in {account.upper()}_MARKETPLACES: {unknown}")
+        return marketplaces or None
+
+    def vault_name(self, account_name: str, region: Optional[str] = None) -> str:
+        """
+        The Key Vault name of an account (in a region, if it has one there), raises ValueError for accounts missing 
+        from ACCOUNTS_LIST
+        """
+        vault_name = self.vault_names.get(f"{account_name.upper()}_{region.upper()}") if region else None
+        vault_name = vault_name or self.vault_names.get(account_name.upper())
+        if not vault_name:
+            raise ValueError(f'Could not locate vault name environmental variable for account: {account_name}')
+        return vault_name
+
+    def region(self, marketplace_id: str) -> str:
+        """The region serving a marketplace (the default region for a MARKETPLACE_ID we don't know)"""
+        return region_of(marketplace_id) if marketplace_id in MARKETPLACES else self.default_region
+
+    def regions_of(self, account_name: str) -> Mapping[str, Tuple[str, ...]]:
+        """An account's marketplaces grouped by region, default region first, in <ACCOUNT>_MARKETPLACES order"""
+        grouped = {}
+        for marketplace in self.marketplaces.get(account_name.upper()) or (self.marketplace_id,):
+            grouped.setdefault(self.region(marketplace), []).append(marketplace)
+        ordered = sorted(grouped, key=lambda region: region != self.default_region)
+        return {region: tuple(grouped[region]) for region in ordered}
+
+
+_settings: Optional[Settings] = None
+_settings_lock = threading.Lock()
+
+
+def get_settings() -> Settings:
+    """The process-wide Settings, loaded from the environment (and validated) on the first call only"""
+    global _settings
+    settings = _settings
+    if settings is None:
+        # activities run on a thread pool, so make sure only one of them parses the environment
+        with _settings_lock:
+            if _settings is None:
+                _settings = Settings.from_env()
+            settings = _settings
+    return settings
+
+
+def reload_settings() -> Settings:
+    """Re-reads the environment, for scripts that change env-vars after the settings were first loaded"""
+    global _settings
+    with _settings_lock:
+        _settings = Settings.from_env()
+        return _settings
@@ -0,0 +1,100 @@
+from typing import Dict, Mapping, Sequence, Tuple
+
+from Utilities.lazy import LazyModule
+
+np = LazyModule('numpy')
+pd = LazyModule('pandas')
+
+
+class SkuIndex:
+    """
+    Shared integer code space of the on-hand report's rows: the keys of the base inventory report ('sku', plus the
+    'marketplace'/'account' tags if any) and of every other report are factorized together, once, so the other
+    reports are summed and joined to the base rows with array reductions on the codes, instead of a string groupby
+    and a merge each
+
+    Parameters:
+        -base: (pd.DataFrame) The base inventory report (one output row per row, before filtering)
+        -keys: (Sequence[str]) The key columns, 'sku' first
+        -reports: (Mapping[str, pd.DataFrame]) The reports to join to the base rows, by name
+
+    Example:
+        >>index = SkuIndex(inventory, ['sku'], {'orders': orders})
+        >>sold = index.sum('orders', 'quantity')  # aligned to inventory's rows, like a left join of the groupby sum
+
+    Considerations:
+        -Mirrors `df.groupby(keys)[column].sum()` left-joined to the base rows: rows with blank keys or keys
+        missing from the base report are dropped, blank values count as 0, and base rows without a match get 0
+        (as a float column, like the NaNs a join would fill)
+    """
+    def __init__(self, base: 'pd.DataFrame', keys: Sequence[str], reports: Mapping[str, 'pd.DataFrame']):
+        self.keys = list(keys)
+        self.reports = dict(reports)
+        frames = [base, *reports.values()]
+        bounds = np.cumsum([0] + [len(frame) for frame in frames])
+
+        # base rows first, so their keys get the lowest codes: any higher code is a key the base report lacks
+        codes = self.__factorize([np.concatenate([frame[key].to_numpy() for frame in frames]) for key in self.keys])
+        self.base_codes = codes[:bounds[1]]
+        self.size = int(self.base_codes.max()) + 1 if len(self.base_codes) else 0
+        codes[codes >= self.size] = -1
+
+        self.codes: Dict[str, 'np.ndarray'] = {
+            name: codes[start:end] for name, start, end in zip(reports, bounds[1:-1], bounds[2:])
+        }
+
+    @staticmethod
+    def __factorize(columns: Sequence['np.ndarray']) -> 'np.ndarray':
+        """Private method: one code per distinct combination of the keys, in order of appearance (-1 if blank)"""
+        codes, uniques = pd.factorize(columns[0])
+        codes = codes.astype('int64')
+        if len(columns) == 1:
+            return codes
+
+        # mix in the other keys, then factorize the combinations again to keep the codes dense
+        missing = codes < 0
+        for column in columns[1:]:
+            column_codes, column_uniques = pd.factorize(column)
+            codes = codes * len(column_uniques) + column_codes
+            missing |= column_codes < 0
+        codes[missing] = -1
+        codes = pd.factorize(codes)[0]
+        codes[missing] = -1
+        return codes
+
+    def sum(self, report: str, column: str) -> 'np.ndarray':
+        """
+        Sums a column of one of the reports per key, aligned to the base rows
+
+        Parameters:
+            -report: (str) Name of the report, as passed to the constructor
+            -column: (str) Numeric column to sum
+
+        Returns:
+            -np.ndarray: One value per base row
+        """
+        codes = self.codes[report]
+        matched = codes >= 0
+        values = pd.to_numeric(self.reports[report][column])
+        length = max(self.size, 1)
+
+        # bincount sums in float64, exact for any realistic quantity; integer columns are cast back, like pandas
+        weights = np.nan_to_num(values.to_numpy(dtype='float64', na_value=np.nan)[matched])
+        totals = np.bincount(codes[matched], weights=weights, minlength=length)
+        if values.dtype.kind in 'biu':
+            totals = totals.astype('int64')
+
+        # base rows whose key never shows up in the report (or is blank)
+        found = np.bincount(codes[matched], minlength=length) > 0
+        has_code = self.base_codes >= 0
+        rows = np.where(has_code, self.base_codes, 0)
+        base_found = has_code & found[rows]
+
+        aligned = totals[rows]
+        if base_found.all():
+            return aligned
+        return np.where(base_found, aligned, 0).astype('float64')
+
+    def sums(self, report: str, columns: Sequence[str]) -> Tuple['np.ndarray', ...]:
+        """`sum` of several columns of one report"""
+        return tuple(self.sum(report, column) for column in columns)
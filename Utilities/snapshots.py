@@ -0,0 +1,269 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+import io
+import logging
+import os
+import re
+from typing import Iterable, List, Optional, Sequence, Tuple, Union
+
+from Utilities.lazy import LazyModule
+from Utilities.tracing import tracer
+from Utilities.utils import storage_handler
+
+pd = LazyModule('pandas')
+pq = LazyModule('pyarrow.parquet')
+
+
+class SnapshotStore:
+    """
+    Date-partitioned columnar history of the on-hand reports: every run saves each account's table as a Parquet
+    file, so trends and deltas are queried by date range, account, SKU and column instead of opening old workbooks
+
+    Layout (blob container or LOCAL_STORAGE_DIR folder):
+        snapshots/date=<YYYY-MM-DD>/account=<account>/on_hand.parquet   the account's report for that date
+
+    Parameters:
+        -container_name: (Optional[str]) Default = SNAPSHOT_CONTAINER_NAME, or ON_HAND_BLOB_CONTAINER_NAME
+        -max_workers: (int) Partitions downloaded at once by the queries. Default=8
+
+    Example:
+        >>store = SnapshotStore()
+        >>store.save('2026-10-19', 'DZ', report_df)
+        >>store.trend('2026-09-01', '2026-10-19', skus=['SKU-1'], accounts=['DZ'])  # one row per SKU and date
+        >>store.delta('2026-10-12', '2026-10-19', accounts=['DZ'])  # on-hand/received a week apart, and the change
+
+    Considerations:
+        -SNAPSHOTS_ENABLED env-var ('true' by default) turns the writes off with 'false', see `for_run`
+        -Saving a date an account already has replaces it, so re-runs of a day don't double count
+        -Queries list the partitions once, then only download those in the date range/accounts, and only parse the
+        requested columns (and SKUs) of each
+    """
+    prefix = 'snapshots'
+    file_name = 'on_hand.parquet'
+
+    def __init__(self, container_name: Optional[str] = None, max_workers: int = 8):
+        self.container_name = container_name or os.getenv('SNAPSHOT_CONTAINER_NAME') \
+            or os.getenv('ON_HAND_BLOB_CONTAINER_NAME')
+        self.storage = storage_handler(self.container_name)
+        self.max_workers = max_workers
+
+    @classmethod
+    def for_run(cls) -> Optional['SnapshotStore']:
+        """The store runs write to, or None if SNAPSHOTS_ENABLED is 'false' (or the storage can't be reached)"""
+        if (os.getenv('SNAPSHOTS_ENABLED') or 'true').strip().lower() in ('false', '0', 'no'):
+            return None
+        try:
+            return cls()
+        except Exception as e:
+            logging.warning(f"Snapshot storage unavailable, not saving this run's snapshots: {str(e)}")
+            return None
+
+    def __key(self, snapshot_date: str, account_name: str) -> str:
+        """Private method: blob name of an account's snapshot"""
+        return f"{self.prefix}/date={snapshot_date}/account={account_name}/{self.file_name}"
+
+    @staticmethod
+    def __date(value: Union[str, date]) -> str:
+        """Private method: validates a date ('YYYY-MM-DD' or date), returns it as 'YYYY-MM-DD'"""
+        if isinstance(value, datetime):
+            return value.date().isoformat()
+        if isinstance(value, date):
+            return value.isoformat()
+        try:
+            return datetime.strptime(str(value), '%Y-%m-%d').date().isoformat()
+        except ValueError:
+            raise ValueError(f"Dates must be 'YYYY-MM-DD', got '{value}'")
+
+    def save(self, snapshot_date: Union[str, date], account_name: str, report: 'pd.DataFrame') -> None:
+        """
+        Saves (or replaces) an account's on-hand report for a date
+
+        Parameters:
+            -snapshot_date: (Union[str, date]) The day the report is for, 'YYYY-MM-DD'
+            -account_name: (str) The account
+            -report: (pd.DataFrame) The account's compiled on-hand report
+        """
+        snapshot_date = self.__date(snapshot_date)
+        report = report.drop(columns=['account'], errors='ignore').reset_index(drop=True)
+
+        buffer = io.BytesIO()
+        with tracer.span('snapshot.save', account=account_name, rows=len(report)):
+            report.to_parquet(buffer, index=False)
+            self.storage.save_bytes(buffer.getvalue(), self.__key(snapshot_date, account_name))
+
+    def save_run(
+        self,
+        snapshot_date: Union[str, date],
+        accounts: Sequence[str],
+        reports: Sequence[Tuple[str, 'pd.DataFrame']]
+    ) -> None:
+        """
+        Saves the reports of a run, never raising: the history is a by-product, not a reason to fail the run
+
+        Parameters:
+            -snapshot_date: (Union[str, date]) The day the reports are for
+            -accounts: (Sequence[str]) The run's accounts, in the order of `reports`
+            -reports: (Sequence[Tuple[str, pd.DataFrame]]) (report name, report) of each account (any extra tab,
+            like the consolidated summary, is ignored)
+        """
+        for account_name, (_, report) in zip(accounts, reports):
+            try:
+                self.save(snapshot_date, account_name, report)
+            except Exception as e:
+                logging.warning(f"Could not save the {account_name} snapshot of {snapshot_date}: {str(e)}")
+
+    def partitions(
+        self,
+        start_date: Union[str, date],
+        end_date: Union[str, date],
+        accounts: Optional[Iterable[str]] = None
+    ) -> List[Tuple[str, str]]:
+        """The (date, account) snapshots between two dates (inclusive), oldest first"""
+        start_date, end_date = self.__date(start_date), self.__date(end_date)
+        accounts = set(accounts) if accounts else None
+
+        pattern = re.compile(rf"^{self.prefix}/date=([0-9-]+)/account=([^/]+)/{re.escape(self.file_name)}$")
+        found = []
+        for name in self.storage.list_names(f"{self.prefix}/"):
+            match = pattern.match(name)
+            if not match or not start_date <= match.group(1) <= end_date:
+                continue
+            if accounts is None or match.group(2) in accounts:
+                found.append((match.group(1), match.group(2)))
+        return sorted(found)
+
+    def __read(
+        self,
+        partition: Tuple[str, str],
+        columns: Optional[Sequence[str]],
+        skus: Optional[Sequence[str]]
+    ) -> Optional['pd.DataFrame']:
+        """Private method: one snapshot, cut down to the requested columns/SKUs, tagged with its date and account"""
+        snapshot_date, account_name = partition
+        data = self.storage.get_bytes(self.__key(snapshot_date, account_name))
+        if data is None:
+            return None
+
+        available = pq.read_schema(io.BytesIO(data)).names
+        columns = [column for column in columns if column in available] if columns else available
+        table = pq.read_table(
+            io.BytesIO(data),
+            columns=columns,
+            filters=[('sku', 'in', list(skus))] if skus and 'sku' in available else None
+        )
+        return table.to_pandas().assign(date=snapshot_date, account=account_name)
+
+    def load(
+        self,
+        start_date: Union[str, date],
+        end_date: Optional[Union[str, date]] = None,
+        accounts: Optional[Iterable[str]] = None,
+        columns: Optional[Sequence[str]] = None,
+        skus: Optional[Sequence[str]] = None
+    ) -> 'pd.DataFrame':
+        """
+        Reads the snapshots of a date range into one df
+
+        Parameters:
+            -start_date: (Union[str, date]) First day, 'YYYY-MM-DD'
+            -end_date: (Optional[Union[str, date]]) Last day (inclusive). Default=None (start_date only)
+            -accounts: (Optional[Iterable[str]]) Only these accounts. Default=None (all)
+            -columns: (Optional[Sequence[str]]) Only these report columns. Default=None (all)
+            -skus: (Optional[Sequence[str]]) Only these SKUs. Default=None (all)
+
+        Returns:
+            -pd.DataFrame: 'date' and 'account' columns, then the requested ones (those a snapshot lacks are blank)
+        """
+        return self.__load(self.partitions(start_date, end_date or start_date, accounts), columns, skus)
+
+    def __load(
+        self,
+        partitions: Sequence[Tuple[str, str]],
+        columns: Optional[Sequence[str]],
+        skus: Optional[Sequence[str]]
+    ) -> 'pd.DataFrame':
+        """Private method: downloads and parses partitions in parallel, into one df"""
+        with tracer.span('snapshot.load', partitions=len(partitions)):
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                frames = [df for df in pool.map(lambda p: self.__read(p, columns, skus), partitions) if df is not None]
+
+        if not frames:
+            return pd.DataFrame(columns=['date', 'account', *(columns or [])])
+        df = pd.concat(frames, ignore_index=True)
+
+        # accounts with a single marketplace have no 'marketplace' column, blank rather than NaN keeps them grouped
+        if 'marketplace' in df.columns:
+            df['marketplace'] = df['marketplace'].fillna('')
+        return df[['date', 'account'] + [column for column in df.columns if column not in ('date', 'account')]]
+
+    @staticmethod
+    def __keys(df: 'pd.DataFrame') -> List[str]:
+        """Private method: what identifies a row across snapshots (a SKU of an account, in a marketplace)"""
+        return ['account', 'sku'] + (['marketplace'] if 'marketplace' in df.columns else [])
+
+    def trend(
+        self,
+        start_date: Union[str, date],
+        end_date: Union[str, date],
+        skus: Optional[Sequence[str]] = None,
+        accounts: Optional[Iterable[str]] = None,
+        columns: Sequence[str] = ('on-hand', 'received')
+    ) -> 'pd.DataFrame':
+        """
+        The history of SKUs over a date range: one row per SKU, account (and marketplace) and date
+
+        Parameters:
+            -start_date/end_date: (Union[str, date]) The date range, 'YYYY-MM-DD' (inclusive)
+            -skus: (Optional[Sequence[str]]) Only these SKUs. Default=None (all)
+            -accounts: (Optional[Iterable[str]]) Only these accounts. Default=None (all)
+            -columns: (Sequence[str]) Report columns to follow. Default=('on-hand', 'received')
+
+        Returns:
+            -pd.DataFrame: account, sku, [marketplace], date, then the columns, sorted in that order
+        """
+        df = self.load(start_date, end_date, accounts, ['sku', 'marketplace', *columns], skus)
+        keys = self.__keys(df)
+        df = df[keys + ['date'] + [column for column in columns if column in df.columns]]
+        return df.sort_values(keys + ['date'], ignore_index=True)
+
+    def delta(
+        self,
+        from_date: Union[str, date],
+        to_date: Union[str, date],
+        skus: Optional[Sequence[str]] = None,
+        accounts: Optional[Iterable[str]] = None,
+        columns: Sequence[str] = ('on-hand', 'received')
+    ) -> 'pd.DataFrame':
+        """
+        How SKUs changed between two dates
+
+        Parameters:
+            -from_date/to_date: (Union[str, date]) The two snapshots to compare, 'YYYY-MM-DD'
+            -skus: (Optional[Sequence[str]]) Only these SKUs. Default=None (all)
+            -accounts: (Optional[Iterable[str]]) Only these accounts. Default=None (all)
+            -columns: (Sequence[str]) Report columns to compare. Default=('on-hand', 'received')
+
+        Returns:
+            -pd.DataFrame: account, sku, [marketplace], then '<column> <from_date>', '<column> <to_date>' and
+            '<column> change' per column. A SKU missing from one snapshot counts as 0 there (the report leaves out
+            SKUs with nothing received)
+        """
+        from_date, to_date = self.__date(from_date), self.__date(to_date)
+        partitions = self.partitions(from_date, from_date, accounts) + self.partitions(to_date, to_date, accounts)
+        df = self.__load(sorted(set(partitions)), ['sku', 'marketplace', *columns], skus)
+
+        keys = self.__keys(df)
+        columns = [column for column in columns if column in df.columns]
+        names = [f"{column} {part}" for column in columns for part in (from_date, to_date, 'change')]
+        if df.empty:
+            return pd.DataFrame(columns=keys + names)
+
+        wide = df.pivot_table(index=keys, columns='date', values=columns, aggfunc='sum', fill_value=0)
+        result = wide.reindex(
+            columns=pd.MultiIndex.from_product([columns, [from_date, to_date]]), fill_value=0
+        )
+        for column in columns:
+            result[(column, 'change')] = result[(column, to_date)] - result[(column, from_date)]
+        result = result[[(column, part) for column in columns for part in (from_date, to_date, 'change')]]
+        result.columns = names
+        return result.reset_index()
@@ -0,0 +1,239 @@
+from contextlib import contextmanager
+import contextvars
+from functools import wraps
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+
+# the span and tags of the current call stack (contextvars keep threads/async tasks apart)
+_current_span = contextvars.ContextVar('current_span', default=None)
+_current_tags = contextvars.ContextVar('current_tags', default={})
+
+
+class Span:
+    """
+    A single timed stage of the pipeline (e.g. a Key Vault fetch, one status poll, a blob upload)
+
+    Parameters:
+        -name: (str) The stage name, dot-separated by component (e.g. 'spapi.poll_status')
+        -attributes: (Dict[str, Any]) Tags for the span, such as account and report_type
+        -parent: (Optional[Span]) The enclosing span, if any. Spans inherit the trace ID of their parent
+    """
+    __slots__ = ('name', 'attributes', 'trace_id', 'span_id', 'parent_id', 'start_ns', 'end_ns', 'error')
+
+    def __init__(self, name: str, attributes: Dict[str, Any], parent: Optional['Span'] = None):
+        self.name = name
+        self.attributes = attributes
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent else None
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        """Adds a tag to the span after it started (e.g. the row count once a report is parsed)"""
+        self.attributes[key] = value
+
+    @property
+    def duration_ms(self) -> float:
+        end_ns = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end_ns - self.start_ns) / 1e6
+
+    def to_custom_dimensions(self) -> Dict[str, Any]:
+        """Flat dictionary for the 'custom_dimensions' of a log record (App Insights customDimensions)"""
+        dimensions = {
+            'span_name': self.name,
+            'duration_ms': round(self.duration_ms, 3),
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_span_id': self.parent_id or '',
+            'status': 'ERROR' if self.error else 'OK'
+        }
+        if self.error:
+            dimensions['error'] = self.error
+        dimensions.update({k: str(v) for k, v in self.attributes.items()})
+        return dimensions
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """The span in the OTLP/JSON span format, as written by the OpenTelemetry file exporter"""
+        otlp_span = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': 1,  # SPAN_KIND_INTERNAL
+            'startTimeUnixNano': str(self.start_ns),
+            'endTimeUnixNano': str(self.end_ns),
+            'attributes': [_otlp_attribute(k, v) for k, v in self.attributes.items()],
+            'status': {'code': 2, 'message': self.error} if self.error else {'code': 1}
+        }
+        if self.parent_id:
+            otlp_span['parentSpanId'] = self.parent_id
+        return otlp_span
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    """Converts a tag to an OTLP/JSON KeyValue"""
+    if isinstance(value, bool):
+        return {'key': key, 'value': {'boolValue': value}}
+    if isinstance(value, int):
+        return {'key': key, 'value': {'intValue': str(value)}}
+    if isinstance(value, float):
+        return {'key': key, 'value': {'doubleValue': value}}
+    return {'key': key, 'value': {'stringValue': str(value)}}
+
+
+class _NoOpSpan:
+    """Stands in for a Span while tracing is off, so instrumented code needs no `if` checks"""
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoOpSpan()
+
+
+class LogSpanExporter:
+    """
+    Writes each finished span as a log record, with the span fields as structured custom dimensions
+
+    Parameters:
+        -level: (int) The logging level of the span records (default=logging.INFO)
+    """
+    def __init__(self, level: int = logging.INFO):
+        self.level = level
+        self.logger = logging.getLogger('Utilities.tracing')
+
+    def export(self, span: Span) -> None:
+        self.logger.log(
+            self.level,
+            f"Span '{span.name}' took {span.duration_ms:.1f} ms",
+            extra={'custom_dimensions': span.to_custom_dimensions()}
+        )
+
+
+class OTLPJsonSpanExporter:
+    """
+    Writes each finished span as an OTLP/JSON line, readable by the OpenTelemetry collector's file receiver
+
+    Parameters:
+        -path: (Optional[str]) The file to append to. Default=None writes to the console (stdout)
+        -service_name: (str) The 'service.name' resource attribute of the spans
+    """
+    def __init__(self, path: Optional[str] = None, service_name: str = 'sell-thru-durable-etl'):
+        self.path = path
+        self.resource = {'attributes': [_otlp_attribute('service.name', service_name)]}
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        line = json.dumps({
+            'resourceSpans': [{
+                'resource': self.resource,
+                'scopeSpans': [{'scope': {'name': 'Utilities.tracing'}, 'spans': [span.to_otlp()]}]
+            }]
+        })
+        with self._lock:
+            if self.path:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(line + '\n')
+            else:
+                sys.stdout.write(line + '\n')
+
+
+class Tracer:
+    """
+    Lightweight tracer recording how long each stage of the pipeline takes
+
+    Parameters:
+        -exporters: (Optional[List]) Objects with an `export(span)` method. No exporters = tracing is off
+
+    Example:
+        >>with tracer.tags(account='DZ', report_type='GET_FBA_MYI_UNSUPPRESSED_INVENTORY_DATA'):
+        >>    with tracer.span('spapi.create_report'):
+        >>        ...
+
+    Considerations:
+        -Use the module-level `tracer`, which is configured by the TRACE_EXPORTERS env-var ('logs', 'otlp', or
+        both comma separated). 'otlp' appends to TRACE_OTLP_FILE if set, or prints to the console otherwise
+        -While tracing is off, `span` costs one attribute check and records nothing
+    """
+    def __init__(self, exporters: Optional[List] = None):
+        self.exporters = exporters or []
+
+    @classmethod
+    def from_env(cls) -> 'Tracer':
+        """Builds a tracer with the exporters named in the TRACE_EXPORTERS env-var"""
+        exporters = []
+        for name in (os.getenv('TRACE_EXPORTERS') or '').split(','):
+            name = name.strip().lower()
+            if not name or name == 'none':
+                continue
+            elif name == 'logs':
+                exporters.append(LogSpanExporter())
+            elif name == 'otlp':
+                exporters.append(OTLPJsonSpanExporter(path=os.getenv('TRACE_OTLP_FILE') or None))
+            else:
+                raise ValueError(f"Unknown TRACE_EXPORTERS value '{name}', expected 'logs' and/or 'otlp'")
+        return cls(exporters)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.exporters)
+
+    @contextmanager
+    def tags(self, **attributes):
+        """Tags every span opened within the block (e.g. account, report_type)"""
+        token = _current_tags.set({**_current_tags.get(), **attributes})
+        try:
+            yield
+        finally:
+            _current_tags.reset(token)
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Times the block as a span named `name`. Yields the span so tags can be added along the way"""
+        if not self.exporters:
+            yield _NOOP_SPAN
+            return
+
+        span = Span(name, {**_current_tags.get(), **attributes}, parent=_current_span.get())
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.end_ns = time.time_ns()
+            _current_span.reset(token)
+            self._export(span)
+
+    def traced(self, name: str):
+        """Decorator version of `span`, times every call to the decorated function"""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _export(self, span: Span) -> None:
+        # a broken sink must never break the pipeline itself
+        for exporter in self.exporters:
+            try:
+                exporter.export(span)
+            except Exception as e:
+                logging.warning(f"Could not export span '{span.name}': {str(e)}")
+
+
+# a typo in TRACE_EXPORTERS must not break every function importing this module: trace nothing instead
+try:
+    tracer = Tracer.from_env()
+except ValueError as e:
+    logging.error(f"Tracing is off: {str(e)}")
+    tracer = Tracer()
@@ -1,14 +1,26 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
 import io
 import logging
+import os
 import random
+import shutil
 import time
-from typing import List, Union
+from typing import IO, TYPE_CHECKING, List, Optional, Union
+
+from Utilities.lazy import LazyModule
+from Utilities.tracing import tracer
 
-import openpyxl as xl
-import pandas as pd
+# heavy dependencies are imported on first use, not when the function app loads this module (see Utilities.lazy)
+xl = LazyModule('openpyxl')
+pd = LazyModule('pandas')
+azure_exceptions = LazyModule('azure.core.exceptions')
+azure_identity = LazyModule('azure.identity')
+storage_blob = LazyModule('azure.storage.blob')
 
-from azure.identity import DefaultAzureCredential
-from azure.storage.blob import BlobServiceClient
+if TYPE_CHECKING:
+    from azure.storage.blob import BlobServiceClient
 
 class Style:
     """
@@ -34,6 +46,7 @@ class Style:
         """
         self.ws[cell].font = xl.styles.Font(color=color)
         
+    @tracer.traced('style.align_and_center')
     def align_and_center(self, start_row: int = 1, padding: int = 5) -> None:
         """ Auto align and widen all columns of your worksheet.
 
@@ -55,6 +68,7 @@ class Style:
                     vertical='center'
                 )
 
+    @tracer.traced('style.create_table')
     def create_table(self, table_name: str = 'Table1') -> None:
         """Formats an Excel array as a table, by identifying the first/last rows and columns of the worksheet.
         
@@ -81,6 +95,7 @@ class Style:
         create_table.tableStyleInfo = table_design
         self.ws.add_table(create_table)
 
+    @tracer.traced('style.data_bars')
     def data_bars(self, column: str, color: str = '5e9bdd', start_row: int = 2) -> None:
         """Creates data bars for a value column based on its min/max.
         
@@ -111,6 +126,7 @@ class Style:
         # apply
         self.ws.conditional_formatting.add(column_range, rule)
         
+    @tracer.traced('style.currency_formatter')
     def currency_formatter(self, columns: Union[List[str], str], max_row=None, currency: bool = True) -> None:
         """
         Formats every cell in a specified column as currency, or simply as a number with thousands separator
@@ -199,6 +215,8 @@ class BlobHandler:
     
     Considerations:
         -This class uses DefaultAzureCredential(), so make sure your managed identities are in order
+        -If the STORAGE_CONNECTION_STRING env-var is set, it is used instead (e.g. 'UseDevelopmentStorage=true' 
+        for the Azurite storage emulator)
     """
     def __init__(self, storage_account: str, container_name: str):
         self.storage_account = storage_account
@@ -208,32 +226,40 @@ class BlobHandler:
     def __init_blob_client(self) -> BlobServiceClient:
         """Private method: initiates and validates a blob client upon class instantiation. Returns client object"""        
         try:
-            return BlobServiceClient(
+            connection_string = os.getenv('STORAGE_CONNECTION_STRING')
+            if connection_string:
+                return storage_blob.BlobServiceClient.from_connection_string(connection_string)
+
+            return storage_blob.BlobServiceClient(
                 account_url=f"https://{self.storage_account}.blob.core.windows.net/", 
-                credential=DefaultAzureCredential()
+                credential=azure_identity.DefaultAzureCredential()
                 )
             
         except Exception as e:
             logging.error(f"Could not validate the BlobServiceClient: {str(e)}")
             raise
             
-    def save_to_blob(self, buffer: io.BytesIO, save_as: str) -> None:
+    def save_to_blob(self, buffer: IO[bytes], save_as: str) -> None:
         """Uploads in-memory buffer file to the blob container, titled after the save_as parameter
         
         Parameters:
-            -buffer: (io.BytesIO) The memory object you wish to upload
+            -buffer: (IO[bytes]) The memory object you wish to upload, or a binary file (e.g. a spill file, see 
+            Utilities.memory), streamed from its start
             -save_as: (str) The name of the file (be sure to add extension, e.g. '.xlsx')
         """
         
-        if not isinstance(buffer, io.BytesIO):
-            raise TypeError("The data passed to this method must be of io.BytesIO type")
+        if not isinstance(buffer, io.BytesIO) and not (hasattr(buffer, 'read') and hasattr(buffer, 'seek')):
+            raise TypeError("The data passed to this method must be of io.BytesIO type, or a binary file")
 
         try:
-            blob_client = self.blob_service_client.get_blob_client(
-                container=self.container_name, 
-                blob=save_as
-                )
-            blob_client.upload_blob(buffer, overwrite=True)
+            size = buffer.seek(0, io.SEEK_END)
+            buffer.seek(0)
+            with tracer.span('blob.upload', blob=save_as, bytes=size):
+                blob_client = self.blob_service_client.get_blob_client(
+                    container=self.container_name, 
+                    blob=save_as
+                    )
+                blob_client.upload_blob(buffer, length=size, overwrite=True)
             logging.info(f"Uploaded file '{save_as}' to the designated blob container")
 
         except Exception as e:
@@ -254,7 +280,8 @@ class BlobHandler:
                 container=self.container_name, 
                 blob=blob_name
                 )
-            blob_data = blob_client.download_blob().readall()
+            with tracer.span('blob.download', blob=blob_name):
+                blob_data = blob_client.download_blob().readall()
 
             if blob_name.endswith('xlsx'):
                 df = pd.read_excel(io.BytesIO(blob_data), engine='openpyxl')
@@ -273,3 +300,131 @@ class BlobHandler:
         except Exception as e:
             logging.error(f"Error getting your file from blob. {str(e)}")
             raise
+
+    def save_bytes(self, data: bytes, save_as: str) -> None:
+        """Uploads raw bytes (e.g. a json document) to the blob container, overwriting any existing blob"""
+        try:
+            with tracer.span('blob.upload', blob=save_as, bytes=len(data)):
+                blob_client = self.blob_service_client.get_blob_client(container=self.container_name, blob=save_as)
+                blob_client.upload_blob(data, overwrite=True)
+        
+        except Exception as e:
+            logging.error(f"Could not save {save_as} to blob. {str(e)}")
+            raise
+
+    def get_bytes(self, blob_name: str) -> Optional[bytes]:
+        """Downloads a blob as raw bytes. Returns None if the blob doesn't exist"""
+        try:
+            blob_client = self.blob_service_client.get_blob_client(container=self.container_name, blob=blob_name)
+            with tracer.span('blob.download', blob=blob_name):
+                return blob_client.download_blob().readall()
+
+        except azure_exceptions.ResourceNotFoundError:
+            return None
+
+        except Exception as e:
+            logging.error(f"Error getting {blob_name} from blob. {str(e)}")
+            raise
+
+    def delete(self, blob_name: str) -> None:
+        """Deletes a blob, if it exists"""
+        try:
+            self.blob_service_client.get_blob_client(container=self.container_name, blob=blob_name).delete_blob()
+        except azure_exceptions.ResourceNotFoundError:
+            pass
+
+    def list_names(self, prefix: str = '') -> List[str]:
+        """Names of the blobs starting with a prefix (e.g. 'snapshots/'), in name order"""
+        try:
+            container_client = self.blob_service_client.get_container_client(self.container_name)
+            with tracer.span('blob.list', prefix=prefix):
+                return sorted(blob.name for blob in container_client.list_blobs(name_starts_with=prefix))
+
+        except Exception as e:
+            logging.error(f"Error listing the blobs under '{prefix}'. {str(e)}")
+            raise
+
+    def last_modified(self, blob_name: str) -> Optional[datetime]:
+        """When the blob was last written (UTC), or None if it doesn't exist"""
+        try:
+            blob_client = self.blob_service_client.get_blob_client(container=self.container_name, blob=blob_name)
+            return blob_client.get_blob_properties().last_modified
+        except azure_exceptions.ResourceNotFoundError:
+            return None
+
+
+class LocalFileHandler:
+    """
+    Local-directory stand-in for `BlobHandler` (bytes methods and `save_to_blob`), for runs without a storage 
+    account
+
+    Parameters:
+        -directory: (str) Folder the files are written to (created if missing)
+    """
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(self.directory, exist_ok=True)
+
+    def __path(self, name: str) -> str:
+        """Private method: full path of a file, creating its sub-folders ('/' in the name, like blob prefixes)"""
+        path = os.path.join(self.directory, *name.split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def save_to_blob(self, buffer: IO[bytes], save_as: str) -> None:
+        if isinstance(buffer, io.BytesIO):
+            self.save_bytes(buffer.getvalue(), save_as)
+            return
+
+        path = self.__path(save_as)
+        buffer.seek(0)
+        with open(path + '.tmp', 'wb') as f:
+            shutil.copyfileobj(buffer, f)
+        os.replace(path + '.tmp', path)
+
+    def save_bytes(self, data: bytes, save_as: str) -> None:
+        path = self.__path(save_as)
+        # write then rename, so readers never see a half-written file
+        with open(path + '.tmp', 'wb') as f:
+            f.write(data)
+        os.replace(path + '.tmp', path)
+
+    def get_bytes(self, blob_name: str) -> Optional[bytes]:
+        try:
+            with open(self.__path(blob_name), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def delete(self, blob_name: str) -> None:
+        try:
+            os.remove(self.__path(blob_name))
+        except FileNotFoundError:
+            pass
+
+    def list_names(self, prefix: str = '') -> List[str]:
+        names = []
+        for folder, _, files in os.walk(self.directory):
+            relative = os.path.relpath(folder, self.directory).replace(os.sep, '/')
+            for file in files:
+                name = file if relative == '.' else f"{relative}/{file}"
+                if name.startswith(prefix) and not name.endswith('.tmp'):
+                    names.append(name)
+        return sorted(names)
+
+    def last_modified(self, blob_name: str) -> Optional[datetime]:
+        try:
+            return datetime.fromtimestamp(os.path.getmtime(self.__path(blob_name)), tz=timezone.utc)
+        except FileNotFoundError:
+            return None
+
+
+def storage_handler(container_name: str) -> Union[BlobHandler, LocalFileHandler]:
+    """
+    Returns the storage for a container: a `LocalFileHandler` under the LOCAL_STORAGE_DIR env-var if it is set 
+    (local runs, tests), otherwise a `BlobHandler` on the STORAGE_ACCOUNT_NAME storage account
+    """
+    local_dir = os.getenv('LOCAL_STORAGE_DIR')
+    if local_dir:
+        return LocalFileHandler(os.path.join(local_dir, container_name))
+    return BlobHandler(storage_account=os.getenv('STORAGE_ACCOUNT_NAME'), container_name=container_name)
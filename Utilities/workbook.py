@@ -0,0 +1,431 @@
+from __future__ import annotations
+
+import io
+import logging
+import os
+import re
+import warnings
+from typing import IO, List, NamedTuple, Optional, Tuple
+
+from Utilities.lazy import LazyModule
+from Utilities.memory import SPILL, XLSX_BYTES_PER_CELL, governor, spill_file
+from Utilities.retry import RetryPolicy
+from Utilities.tracing import tracer
+from Utilities.utils import storage_handler
+
+xl = LazyModule('openpyxl')
+pd = LazyModule('pandas')
+
+# Excel's limits: rows per sheet (one is the header), characters of a sheet name
+EXCEL_MAX_ROWS = 1_048_576
+SHEET_NAME_LENGTH = 31
+
+INDEX_SHEET = 'Index'
+INDEX_COLUMNS = ['report', 'workbook', 'sheet', 'rows', 'first row', 'last row']
+
+# the columns getting data bars, found by header
+DATA_BAR_COLUMNS = ('on-hand', 'received')
+
+# named styles of the header (white text on the table's header) and body cells, centered
+HEADER_STYLE = 'On Hand Header'
+BODY_STYLE = 'On Hand Body'
+
+# WORKBOOK_BUILD_MODE values: every sheet written by SubOrchestrator_Assembler, or each report's by its own activity
+# (Activity_WorkbookPart), merged by Activity_WorkbookMerge
+BUILD_MODES = ('serial', 'parallel')
+# WORKBOOK_PUBLISH values: the workbook(s) of every report, or a zip of one workbook per report
+PUBLISH_MODES = ('workbook', 'zip')
+
+_INVALID_SHEET_CHARACTERS = re.compile(r"[\[\]:*?/\\]")
+_CELL_REFERENCE = re.compile(r"^([A-Za-z]{1,3}[0-9]+|[RrCc]|[Rr][0-9]*[Cc][0-9]*)$")  # A1 and R1C1 styles
+
+
+class SheetPart(NamedTuple):
+    """One sheet of the output: rows [start, stop) of a report, in workbook `workbook` (0-based)"""
+    report: int
+    workbook: int
+    sheet_name: str
+    table_name: str
+    start: int
+    stop: int
+
+
+def sheet_title(name: str, suffix: str = '') -> str:
+    """A valid sheet name out of a report name: no []:*?/\\ characters, 31 characters at most with the suffix"""
+    name = _INVALID_SHEET_CHARACTERS.sub('-', name).strip("'") or 'Sheet'
+    return name[:SHEET_NAME_LENGTH - len(suffix)].rstrip() + suffix
+
+
+def table_title(name: str) -> str:
+    """
+    A valid Excel table name out of a report's first word (the account initials, as before): letters, digits, '_'
+    and '.' only, starting with a letter or '_', and not a cell reference (e.g. 'B1' becomes 'T_B1')
+    """
+    name = re.sub(r"[^A-Za-z0-9_.]", '_', name) or 'Table'
+    if not re.match(r"[A-Za-z_]", name) or _CELL_REFERENCE.match(name):
+        name = f"T_{name}"
+    return name
+
+
+def part_blob_name(blob_name: str, part: int) -> str:
+    """Blob name of the workbook `part` (1-based) of a split report: the first one keeps the report's name"""
+    if part == 1:
+        return blob_name
+    stem, extension = os.path.splitext(blob_name)
+    return f"{stem} - Part {part}{extension}"
+
+
+class WorkbookBuilder:
+    """
+    Streams on-hand reports into formatted .xlsx workbooks, splitting them across continuation sheets and workbooks
+
+    Every sheet is written row by row with openpyxl's write-only mode and formatted as it is written (centered
+    cells and widened columns, a table, white headers, data bars on 'on-hand'/'received'), so the builder only ever
+    holds the rows of the sheet being written, and never loads the workbook back to format it
+
+    Parameters:
+        -max_sheet_rows: (Optional[int]) Data rows per sheet, past which a report continues on a new sheet
+        ('DZ On Hand 10-19-2026 (2)'). Default=None (Excel's limit, 1,048,575)
+        -max_workbook_rows: (Optional[int]) Data rows per workbook. Default=None (no limit)
+        -max_workbook_bytes: (Optional[int]) Estimated size per workbook (XLSX_BYTES_PER_CELL a cell). Default=None
+        (no limit)
+
+        -build_mode: (str) 'serial' (`build`) or 'parallel' (`build_part` per report, then `WorkbookMerger`), see
+        BUILD_MODES. Default='serial'
+        -publish: (str) 'workbook' or 'zip' (one workbook per report, see `zip_workbooks`), see PUBLISH_MODES.
+        Default='workbook'
+
+    Example:
+        >>builder = WorkbookBuilder.from_env()
+        >>for blob_name, buffer in builder.build(results, run.report_blob_name):
+        >>    storage.save_to_blob(buffer, save_as=blob_name)
+
+    Considerations:
+        -Configured by WORKBOOK_MAX_SHEET_ROWS, WORKBOOK_MAX_ROWS and WORKBOOK_MAX_MB ("0" or blank: no limit),
+        WORKBOOK_BUILD_MODE and WORKBOOK_PUBLISH
+        -A report starts a new workbook if it doesn't fit in what's left of the current one; a report larger than
+        a whole workbook is split across several, a sheet at a time. Extra workbooks are named '<report> - Part
+        N.xlsx' (see `part_blob_name`)
+        -Once anything is split, every workbook starts with an 'Index' sheet listing where each report's rows are
+        -Sheet names are unique (case-insensitive) and at most 31 characters, table names are unique and valid
+        (cell references like 'B1' get a 'T_' prefix). 'Index' is kept for the index sheet and its table
+    """
+    def __init__(
+        self,
+        max_sheet_rows: Optional[int] = None,
+        max_workbook_rows: Optional[int] = None,
+        max_workbook_bytes: Optional[int] = None,
+        build_mode: str = 'serial',
+        publish: str = 'workbook'
+    ):
+        if build_mode not in BUILD_MODES:
+            raise ValueError(f"WORKBOOK_BUILD_MODE must be one of {BUILD_MODES}, got '{build_mode}'")
+        if publish not in PUBLISH_MODES:
+            raise ValueError(f"WORKBOOK_PUBLISH must be one of {PUBLISH_MODES}, got '{publish}'")
+
+        self.max_sheet_rows = min(max_sheet_rows or EXCEL_MAX_ROWS - 1, EXCEL_MAX_ROWS - 1)
+        self.max_workbook_rows = max_workbook_rows or None
+        self.max_workbook_bytes = max_workbook_bytes or None
+        self.build_mode = build_mode
+        self.publish = publish
+
+    @classmethod
+    def from_env(cls) -> 'WorkbookBuilder':
+        """
+        Builds the builder from the WORKBOOK_MAX_SHEET_ROWS, WORKBOOK_MAX_ROWS, WORKBOOK_MAX_MB, WORKBOOK_BUILD_MODE
+        and WORKBOOK_PUBLISH env-vars
+        """
+        return cls(
+            max_sheet_rows=int(os.getenv('WORKBOOK_MAX_SHEET_ROWS') or 0),
+            max_workbook_rows=int(os.getenv('WORKBOOK_MAX_ROWS') or 0),
+            max_workbook_bytes=int(float(os.getenv('WORKBOOK_MAX_MB') or 0) * 2 ** 20),
+            build_mode=(os.getenv('WORKBOOK_BUILD_MODE') or 'serial').strip().lower(),
+            publish=(os.getenv('WORKBOOK_PUBLISH') or 'workbook').strip().lower()
+        )
+
+    def layout(self, reports: List[Tuple[str, int, int]]) -> List[SheetPart]:
+        """
+        Splits reports into sheets and workbooks, from their sizes alone
+
+        Parameters:
+            -reports: (List[Tuple[str, int, int]]) (report name, rows, columns) of every report, in tab order
+
+        Returns:
+            -List[SheetPart]: Every sheet, in order
+        """
+        # the index sheet (and its table) keeps its name in every workbook
+        parts, sheet_names, table_names = [], {INDEX_SHEET.lower()}, {INDEX_SHEET.lower()}
+        workbook, workbook_rows, workbook_bytes = 0, 0, 0
+
+        def fits(rows: int, columns: int) -> bool:
+            if workbook_rows == 0:
+                return True
+            over_rows = self.max_workbook_rows and workbook_rows + rows > self.max_workbook_rows
+            over_bytes = self.max_workbook_bytes and \
+                workbook_bytes + rows * columns * XLSX_BYTES_PER_CELL > self.max_workbook_bytes
+            return not (over_rows or over_bytes)
+
+        for report, (report_name, rows, columns) in enumerate(reports):
+            # a report that doesn't fit in what's left starts a new workbook
+            if not fits(rows, columns):
+                workbook, workbook_rows, workbook_bytes = workbook + 1, 0, 0
+
+            starts = range(0, max(rows, 1), self.max_sheet_rows)
+            for number, start in enumerate(starts, start=1):
+                stop = min(start + self.max_sheet_rows, rows)
+                if not fits(stop - start, columns):
+                    workbook, workbook_rows, workbook_bytes = workbook + 1, 0, 0
+
+                sheet_name = self.__unique(
+                    lambda n: sheet_title(report_name, f" ({n})" if n > 1 else ''), sheet_names, number, str.lower
+                )
+                base = table_title(report_name.split(' ')[0])
+                table_name = self.__unique(
+                    lambda n: f"{base}_{n}" if n > 1 else base, table_names, number, str.lower
+                )
+                parts.append(SheetPart(report, workbook, sheet_name, table_name, start, stop))
+                workbook_rows += stop - start
+                workbook_bytes += (stop - start) * columns * XLSX_BYTES_PER_CELL
+        return parts
+
+    @staticmethod
+    def __unique(name_of, taken: set, number: int, key) -> str:
+        """Private method: the first name_of(n), n >= number, not taken yet (compared by key), marked as taken"""
+        while key(name_of(number)) in taken:
+            number += 1
+        name = name_of(number)
+        taken.add(key(name))
+        return name
+
+    def build(
+        self,
+        results: List[Tuple[str, 'pd.DataFrame']],
+        blob_name: str
+    ) -> List[Tuple[str, IO[bytes]]]:
+        """
+        Writes the reports to one or more formatted workbooks
+
+        Parameters:
+            -results: (List[Tuple[str, pd.DataFrame]]) (report name, df) pairs, one tab each (see
+            `ReportAssembler.read_on_hand_results`)
+            -blob_name: (str) Name of the (first) workbook, e.g. RunParameters.report_blob_name
+
+        Returns:
+            -List[Tuple[str, IO[bytes]]]: (blob name, workbook) pairs, rewound. Workbooks are spill files when the
+            memory budget calls for it (see Utilities.memory): close them once uploaded
+        """
+        parts = self.layout([(name, len(df), len(df.columns)) for name, df in results])
+        workbooks = max((part.workbook for part in parts), default=0) + 1
+        split = workbooks > 1 or len(parts) > len(results)
+        names = [part_blob_name(blob_name, number) for number in range(1, workbooks + 1)]
+        if split:
+            logging.info(f"Splitting {len(results)} report(s) into {len(parts)} sheets over {workbooks} workbook(s)")
+
+        index = (parts, [name for name, _ in results], names) if split else None
+        return [
+            (names[workbook], self.__save(names[workbook], parts, workbook, results, index))
+            for workbook in range(workbooks)
+        ]
+
+    def build_part(self, report_name: str, df: 'pd.DataFrame') -> IO[bytes]:
+        """
+        Writes one report to a standalone workbook, to be merged with the other reports' (see `WorkbookMerger`)
+
+        Parameters:
+            -report_name: (str) The report's name (its tab's)
+            -df: (pd.DataFrame) The report
+
+        Returns:
+            -IO[bytes]: The workbook, rewound: the report's sheets (continuation ones past max_sheet_rows), with no
+            workbook limit nor index. A spill file when the memory budget calls for it: close it once saved
+        """
+        parts = WorkbookBuilder(max_sheet_rows=self.max_sheet_rows).layout([(report_name, len(df), len(df.columns))])
+        return self.__save(report_name, parts, 0, [(report_name, df)])
+
+    def build_index(self, parts: List[SheetPart], report_names: List[str], names: List[str]) -> IO[bytes]:
+        """
+        Writes the 'Index' sheet of a split output to a standalone workbook, to be merged in front of the reports'
+
+        Parameters:
+            -parts: (List[SheetPart]) Every sheet, from `layout`
+            -report_names: (List[str]) The reports' names, in `layout` order
+            -names: (List[str]) The blob name of every workbook
+
+        Returns:
+            -IO[bytes]: The workbook, rewound
+        """
+        wb = self.__workbook()
+        self.__write_index(wb, parts, report_names, names)
+        buffer = io.BytesIO()
+        wb.save(buffer)
+        buffer.seek(0)
+        return buffer
+
+    def __save(
+        self,
+        what: str,
+        parts: List[SheetPart],
+        workbook: int,
+        results: List[Tuple[str, 'pd.DataFrame']],
+        index: Optional[Tuple[List[SheetPart], List[str], List[str]]] = None
+    ) -> IO[bytes]:
+        """
+        Private method: writes the sheets of workbook `workbook` (after the index, if any) to a rewound buffer, named
+        `what` in the logs and spans
+        """
+        sheets = [part for part in parts if part.workbook == workbook]
+        cells = sum((part.stop - part.start) * len(results[part.report][1].columns) for part in sheets)
+        spill = governor.plan_workbook(f"'{what}'", cells) == SPILL
+
+        with tracer.span('workbook.build', workbook=what, sheets=len(sheets), spill=spill):
+            wb = self.__workbook()
+            if index is not None:
+                self.__write_index(wb, *index)
+            for part in sheets:
+                report_name, df = results[part.report]
+                with tracer.tags(account=report_name.split(' ')[0]):
+                    self.__write_sheet(wb, part, df.iloc[part.start:part.stop])
+
+            buffer = spill_file('.xlsx') if spill else io.BytesIO()
+            with tracer.span('workbook.save', spill=spill):
+                wb.save(buffer)
+            buffer.seek(0)
+        return buffer
+
+    @staticmethod
+    def __workbook():
+        """
+        Private method: a write-only workbook with the header and body named styles registered up front, in this
+        order, so every workbook has the same styles part (merged workbooks share theirs, see
+        Utilities.workbook_merge). The body keeps the workbook's default font
+        """
+        wb = xl.Workbook(write_only=True)
+        alignment = xl.styles.Alignment(horizontal='center', vertical='center')
+        border = xl.styles.borders.DEFAULT_BORDER
+        wb.add_named_style(xl.styles.NamedStyle(
+            name=HEADER_STYLE, font=xl.styles.Font(color='FFFFFFFF'), border=border, alignment=alignment
+        ))
+        wb.add_named_style(xl.styles.NamedStyle(
+            name=BODY_STYLE, font=xl.styles.fonts.DEFAULT_FONT, border=border, alignment=alignment
+        ))
+        return wb
+
+    @staticmethod
+    def __cell(ws, value, style: str):
+        """Private method: a write-only cell with one of the workbook's named styles (much faster than its styles)"""
+        cell = xl.cell.WriteOnlyCell(ws, value=value)
+        cell.style = style
+        return cell
+
+    def __write_table(self, ws, df: 'pd.DataFrame', table_name: str, data_bars: bool = True) -> None:
+        """Private method: streams a df to a write-only sheet, formatted like `ReportAssembler.on_hand_report_formatter`"""
+        columns = [str(column) for column in df.columns]
+        values = df.astype(object).where(df.notna(), None) if len(df) else df
+
+        # widths first (write-only sheets can't change them after the rows), like Style.align_and_center
+        for number, column in enumerate(columns, start=1):
+            longest = values[df.columns[number - 1]].astype(str).str.len().max() if len(df) else 0
+            ws.column_dimensions[xl.utils.get_column_letter(number)].width = max(len(column), longest or 0) + 5
+
+        # an empty table still spans a column and a blank row (see below): they're styled like the others, so every
+        # workbook uses, and has the same styles part with, both named styles whatever its rows and columns
+        header = columns or [None]
+        ws.append([self.__cell(ws, column, HEADER_STYLE) for column in header])
+        for row in values.itertuples(index=False, name=None):
+            ws.append([self.__cell(ws, value, BODY_STYLE) for value in row])
+        if not len(df):
+            ws.append([self.__cell(ws, None, BODY_STYLE) for _ in header])
+
+        last_column = xl.utils.get_column_letter(max(len(columns), 1))
+        last_row = len(df) + 1
+        # a table needs a row below its header, as Excel adds to an empty one
+        table = xl.worksheet.table.Table(displayName=table_name, ref=f"A1:{last_column}{max(last_row, 2)}")
+        table.tableColumns = [
+            xl.worksheet.table.TableColumn(id=number, name=column) for number, column in enumerate(columns, start=1)
+        ]
+        table.tableStyleInfo = xl.worksheet.table.TableStyleInfo(
+            name="TableStyleMedium9",
+            showFirstColumn=False,
+            showLastColumn=False,
+            showRowStripes=True,
+            showColumnStripes=True
+        )
+        with warnings.catch_warnings():
+            # write-only sheets always warn about the table columns, set above
+            warnings.simplefilter('ignore', UserWarning)
+            ws.add_table(table)
+
+        if not data_bars or not len(df):
+            return
+        for number, column in enumerate(columns, start=1):
+            if column in DATA_BAR_COLUMNS and pd.api.types.is_numeric_dtype(df.iloc[:, number - 1]):
+                letter = xl.utils.get_column_letter(number)
+                largest = df.iloc[:, number - 1].max()
+                ws.conditional_formatting.add(f"{letter}2:{letter}{last_row}", xl.formatting.rule.DataBarRule(
+                    start_type='num',
+                    start_value=1,
+                    end_type='num',
+                    end_value=largest.item() if largest > 0 else 0,
+                    color='5e9bdd'
+                ))
+
+    def __write_sheet(self, wb, part: SheetPart, df: 'pd.DataFrame') -> None:
+        """Private method: one sheet of a report"""
+        with tracer.span('workbook.sheet', sheet=part.sheet_name, rows=len(df)):
+            ws = wb.create_sheet(part.sheet_name)
+            self.__write_table(ws, df, part.table_name)
+
+    def __write_index(
+        self,
+        wb,
+        parts: List[SheetPart],
+        report_names: List[str],
+        names: List[str]
+    ) -> None:
+        """Private method: the 'Index' sheet, listing every sheet of every workbook (rows numbered from 1)"""
+        index = pd.DataFrame(
+            [
+                (report_names[part.report], names[part.workbook], part.sheet_name, part.stop - part.start,
+                 part.start + 1, part.stop)
+                for part in parts
+            ],
+            columns=INDEX_COLUMNS
+        )
+        ws = wb.create_sheet(INDEX_SHEET)
+        self.__write_table(ws, index, INDEX_SHEET, data_bars=False)
+
+
+def upload_workbooks(workbooks: List[Tuple[str, IO[bytes]]], max_attempts: int = 3) -> None:
+    """
+    Uploads finished workbooks to the ON_HAND_BLOB_CONTAINER_NAME blob container (or LOCAL_STORAGE_DIR, see
+    `storage_handler`), with exponential backoff between attempts, closing each one once uploaded (which deletes it, if spilled to a file; see Utilities.memory)
+
+    Parameters:
+        -workbooks: (List[Tuple[str, IO[bytes]]]) (blob name, workbook) pairs, e.g. from `WorkbookBuilder.build`
+        -max_attempts: (int) Attempts per workbook. Default=3
+
+    Considerations:
+        -Raises a RuntimeError once a workbook fails every attempt (the ones after it are closed, not uploaded)
+    """
+    retry_policy = RetryPolicy()
+    try:
+        for blob_name, buffer in workbooks:
+            uploaded = False
+            for upload_attempt in retry_policy.attempts(max_attempts=max_attempts, what='report upload'):
+                try:
+                    blob_client = storage_handler(os.getenv('ON_HAND_BLOB_CONTAINER_NAME'))
+                    blob_client.save_to_blob(buffer, save_as=blob_name)
+                    uploaded = True
+                    break
+
+                except Exception as e:
+                    logging.error(f"Failed to upload finished report to blob - {str(e)}")
+
+            buffer.close()
+            if not uploaded:
+                raise RuntimeError(
+                    "Could not upload report to blob. Review the logs and check access to your storage account"
+                )
+    finally:
+        for _, buffer in workbooks:
+            buffer.close()
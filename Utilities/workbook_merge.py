@@ -0,0 +1,282 @@
+from __future__ import annotations
+
+import io
+import logging
+import os
+import posixpath
+import re
+import shutil
+import zipfile
+from typing import IO, Dict, List, NamedTuple, Optional, Tuple
+from xml.etree import ElementTree
+from xml.sax.saxutils import quoteattr
+
+from Utilities.memory import MIB, SPILL, governor, spill_file
+from Utilities.tracing import tracer
+from Utilities.workbook import WorkbookBuilder, part_blob_name, sheet_title
+
+# the package parts every workbook of the builder shares, copied from the first source (workbook.xml gets its
+# sheets replaced)
+SHARED_PARTS = ('_rels/.rels', 'docProps/app.xml', 'docProps/core.xml', 'xl/theme/theme1.xml', 'xl/styles.xml')
+
+_RELATIONSHIPS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+_OFFICE_RELATIONSHIPS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument'
+_TABLE_TAG = re.compile(rb"<table\b[^>]*>")
+_TARGET = re.compile(rb'Target="([^"]*)"')
+_SHEETS = re.compile(r"<sheets>.*</sheets>|<sheets\s*/>", re.DOTALL)
+
+
+class SourceSheet(NamedTuple):
+    """A sheet of a source workbook: its part, its relationships part, and the table parts those point to"""
+    path: str
+    rels_path: Optional[str]
+    tables: List[str]
+
+
+class WorkbookMerger:
+    """
+    Merges standalone workbooks of one report each (`WorkbookBuilder.build_part`, built in parallel by
+    Activity_WorkbookPart) into the published workbook(s), at the package level: each sheet's XML is copied into the
+    output as it is, never parsed, and only the small parts naming and linking the sheets (workbook.xml, the
+    relationships, the content types, the tables' names) are written anew. Merging costs about the time to copy
+    the sheets, so a parallel run takes about as long as its largest account
+
+    Parameters:
+        -builder: (Optional[WorkbookBuilder]) The limits to lay the sheets out with. Default=WorkbookBuilder.from_env()
+
+    Example:
+        >>merger = WorkbookMerger()
+        >>for blob_name, buffer in merger.merge([(report_name, rows, columns, part), ...], run.report_blob_name):
+        >>    storage.save_to_blob(buffer, save_as=blob_name)
+
+    Considerations:
+        -The output is the one `WorkbookBuilder.build` writes from the same reports: same sheets, names, split into
+        the same workbooks with the same 'Index' sheet. Parts must come from the same max_sheet_rows (the same app
+        settings), and share their styles (the same openpyxl version), else `merge` raises a ValueError
+        -Sheets hold inline strings (openpyxl's write-only mode), so there is no shared-strings table to merge
+        -The report workbooks are staged under 'workbook-parts/<report date>/<instance ID>/' (`prefix`) in
+        ON_HAND_BLOB_CONTAINER_NAME, and deleted once merged
+    """
+    prefix = 'workbook-parts'
+
+    def __init__(self, builder: Optional[WorkbookBuilder] = None):
+        self.builder = builder or WorkbookBuilder.from_env()
+
+    def merge(
+        self,
+        reports: List[Tuple[str, int, int, IO[bytes]]],
+        blob_name: str
+    ) -> List[Tuple[str, IO[bytes]]]:
+        """
+        Merges report workbooks into the published workbook(s)
+
+        Parameters:
+            -reports: (List[Tuple[str, int, int, IO[bytes]]]) (report name, rows, columns, workbook) of every report,
+            in tab order
+            -blob_name: (str) Name of the (first) workbook, e.g. RunParameters.report_blob_name
+
+        Returns:
+            -List[Tuple[str, IO[bytes]]]: (blob name, workbook) pairs, rewound. Spill files when the memory budget
+            calls for it: close them once uploaded
+        """
+        parts = self.builder.layout([(name, rows, columns) for name, rows, columns, _ in reports])
+        workbooks = max((part.workbook for part in parts), default=0) + 1
+        names = [part_blob_name(blob_name, number) for number in range(1, workbooks + 1)]
+
+        sources = [zipfile.ZipFile(file) for *_, file in reports]
+        sheets = [self.__sheets(source) for source in sources]
+        for number, (name, *_) in enumerate(reports):
+            expected = sum(1 for part in parts if part.report == number)
+            if len(sheets[number]) != expected:
+                raise ValueError(
+                    f"The workbook of '{name}' has {len(sheets[number])} sheet(s), {expected} expected: were the "
+                    f"parts built with another WORKBOOK_MAX_SHEET_ROWS?"
+                )
+
+        index = None
+        if workbooks > 1 or len(parts) > len(reports):
+            logging.info(f"Splitting {len(reports)} report(s) into {len(parts)} sheets over {workbooks} workbook(s)")
+            index = zipfile.ZipFile(self.builder.build_index(parts, [name for name, *_ in reports], names))
+
+        shared = self.__shared(([index] if index else []) + sources)
+        outputs = []
+        for workbook in range(workbooks):
+            # the sheets of this workbook, as (source, sheet, name, table name)
+            placed, seen = [], {}
+            if index is not None:
+                placed.append((index, self.__sheets(index)[0], 'Index', 'Index'))
+            for part in parts:
+                position = seen[part.report] = seen.get(part.report, -1) + 1
+                if part.workbook == workbook:
+                    sheet = sheets[part.report][position]
+                    placed.append((sources[part.report], sheet, part.sheet_name, part.table_name))
+
+            size = sum(source.getinfo(sheet.path).file_size for source, sheet, *_ in placed)
+            spill = governor.plan(f"'{names[workbook]}' merge", size, SPILL) == SPILL
+            with tracer.span('workbook.merge', workbook=names[workbook], sheets=len(placed), spill=spill):
+                buffer = spill_file('.xlsx') if spill else io.BytesIO()
+                self.__write(buffer, shared, placed)
+                buffer.seek(0)
+            outputs.append((names[workbook], buffer))
+
+        for source in sources + ([index] if index else []):
+            source.close()
+        return outputs
+
+    @staticmethod
+    def __sheets(source: zipfile.ZipFile) -> List[SourceSheet]:
+        """Private method: the sheets of a workbook, in tab order"""
+        def resolve(base: str, target: str) -> str:
+            return target.lstrip('/') if target.startswith('/') else posixpath.normpath(posixpath.join(base, target))
+
+        def relationships(path: str) -> Dict[str, str]:
+            rels = ElementTree.fromstring(source.read(path))
+            return {rel.get('Id'): rel.get('Target') for rel in rels.iter(f"{{{_RELATIONSHIPS}}}Relationship")}
+
+        workbook_rels = relationships('xl/_rels/workbook.xml.rels')
+        workbook = ElementTree.fromstring(source.read('xl/workbook.xml'))
+        sheets = []
+        for sheet in workbook.iter('{http://schemas.openxmlformats.org/spreadsheetml/2006/main}sheet'):
+            path = resolve('xl', workbook_rels[sheet.get(f"{{{_OFFICE_RELATIONSHIPS}}}id")])
+            folder, file = posixpath.split(path)
+            rels_path = f"{folder}/_rels/{file}.rels"
+            if rels_path not in source.namelist():
+                sheets.append(SourceSheet(path, None, []))
+                continue
+            tables = [resolve(folder, target) for target in relationships(rels_path).values() if '/tables/' in target]
+            sheets.append(SourceSheet(path, rels_path, tables))
+        return sheets
+
+    @staticmethod
+    def __shared(sources: List[zipfile.ZipFile]) -> Dict[str, bytes]:
+        """Private method: the parts the workbooks share, checking they all have the same styles"""
+        shared = {name: sources[0].read(name) for name in SHARED_PARTS + ('xl/workbook.xml',)}
+        for source in sources[1:]:
+            if source.read('xl/styles.xml') != shared['xl/styles.xml']:
+                raise ValueError(
+                    "The report workbooks have different styles (built by different openpyxl versions?), so their "
+                    "sheets can't be merged as they are. Use WORKBOOK_BUILD_MODE='serial'"
+                )
+        return shared
+
+    @staticmethod
+    def __write(
+        buffer: IO[bytes],
+        shared: Dict[str, bytes],
+        placed: List[Tuple[zipfile.ZipFile, SourceSheet, str, str]]
+    ) -> None:
+        """Private method: writes a workbook package out of its sheets: copied as they are, renumbered and renamed"""
+        overrides = {
+            '/xl/workbook.xml': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml',
+            '/xl/styles.xml': f"{_CONTENT_TYPE}.spreadsheetml.styles+xml",
+            '/xl/theme/theme1.xml': f"{_CONTENT_TYPE}.theme+xml",
+            '/docProps/core.xml': 'application/vnd.openxmlformats-package.core-properties+xml',
+            '/docProps/app.xml': f"{_CONTENT_TYPE}.extended-properties+xml"
+        }
+        sheet_entries, workbook_rels = [], []
+        table_number = 0
+
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as package:
+            for name in SHARED_PARTS:
+                package.writestr(name, shared[name])
+
+            for number, (source, sheet, sheet_name, table_name) in enumerate(placed, start=1):
+                path = f"xl/worksheets/sheet{number}.xml"
+                with source.open(sheet.path) as reader, package.open(path, 'w', force_zip64=True) as writer:
+                    shutil.copyfileobj(reader, writer, MIB)
+                overrides[f"/{path}"] = f"{_CONTENT_TYPE}.spreadsheetml.worksheet+xml"
+
+                if sheet.rels_path is not None:
+                    # tables are renumbered across the workbook; a sheet's only table takes the sheet's table name
+                    targets = {}
+                    for table in sheet.tables:
+                        table_number += 1
+                        targets[posixpath.basename(table)] = new_table = f"xl/tables/table{table_number}.xml"
+                        package.writestr(new_table, WorkbookMerger.__renamed_table(
+                            source.read(table), table_number, table_name if len(sheet.tables) == 1 else None
+                        ))
+                        overrides[f"/{new_table}"] = f"{_CONTENT_TYPE}.spreadsheetml.table+xml"
+
+                    def retarget(match) -> bytes:
+                        new_table = targets.get(posixpath.basename(match.group(1).decode()))
+                        return f'Target="/{new_table}"'.encode() if new_table else match.group(0)
+                    rels = _TARGET.sub(retarget, source.read(sheet.rels_path))
+                    package.writestr(f"xl/worksheets/_rels/sheet{number}.xml.rels", rels)
+
+                sheet_entries.append(
+                    f'<sheet name={quoteattr(sheet_name)} sheetId="{number}" state="visible" r:id="rId{number}" />'
+                )
+                workbook_rels.append(
+                    f'<Relationship Type="{_OFFICE_RELATIONSHIPS}/worksheet" Target="/{path}" Id="rId{number}" />'
+                )
+
+            count = len(placed)
+            workbook_rels += [
+                f'<Relationship Type="{_OFFICE_RELATIONSHIPS}/styles" Target="styles.xml" Id="rId{count + 1}" />',
+                f'<Relationship Type="{_OFFICE_RELATIONSHIPS}/theme" Target="theme/theme1.xml" Id="rId{count + 2}" />'
+            ]
+            sheets = f'<sheets>{"".join(sheet_entries)}</sheets>'
+            package.writestr(
+                'xl/workbook.xml', _SHEETS.sub(lambda _: sheets, shared['xl/workbook.xml'].decode('utf-8'), count=1)
+            )
+            package.writestr(
+                'xl/_rels/workbook.xml.rels',
+                f'<Relationships xmlns="{_RELATIONSHIPS}">{"".join(workbook_rels)}</Relationships>'
+            )
+            package.writestr('[Content_Types].xml', (
+                '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+                '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml" />'
+                '<Default Extension="xml" ContentType="application/xml" />'
+                + ''.join(f'<Override PartName="{name}" ContentType="{kind}" />' for name, kind in overrides.items())
+                + '</Types>'
+            ))
+
+    @staticmethod
+    def __renamed_table(table: bytes, number: int, name: Optional[str]) -> bytes:
+        """Private method: a table part with a new id (unique in the workbook) and, if given, a new name"""
+        def rename(tag) -> bytes:
+            tag = re.sub(rb'\bid="[^"]*"', f'id="{number}"'.encode(), tag.group(0), count=1)
+            if name is not None:
+                for attribute in (rb'name', rb'displayName'):
+                    tag = re.sub(rb'\b' + attribute + rb'="[^"]*"', attribute + f'="{name}"'.encode(), tag, count=1)
+            return tag
+        return _TABLE_TAG.sub(rename, table, count=1)
+
+
+def zip_workbooks(reports: List[Tuple[str, IO[bytes]]], blob_name: str) -> Tuple[str, IO[bytes]]:
+    """
+    Zips one workbook per report, for WORKBOOK_PUBLISH = 'zip'
+
+    Parameters:
+        -reports: (List[Tuple[str, IO[bytes]]]) (report name, workbook) of every report (see
+        `WorkbookBuilder.build_part`)
+        -blob_name: (str) Name of the workbook it replaces, e.g. RunParameters.report_blob_name
+
+    Returns:
+        -Tuple[str, IO[bytes]]: The zip's blob name ('<report>.zip') and the zip, rewound, holding '<report name>.xlsx'
+        files (stored as they are: they are zips already). A spill file when the memory budget calls for it
+
+    Considerations:
+        -The report workbooks are closed once zipped
+    """
+    size = sum(file.seek(0, io.SEEK_END) for _, file in reports)
+    spill = governor.plan(f"'{blob_name}' zip", size, SPILL) == SPILL
+    buffer = spill_file('.zip') if spill else io.BytesIO()
+
+    taken = set()
+    with tracer.span('workbook.zip', reports=len(reports), spill=spill), \
+            zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as package:
+        for report_name, file in reports:
+            name, number = sheet_title(report_name), 1
+            while name.lower() in taken:
+                number += 1
+                name = sheet_title(report_name, f" ({number})")
+            taken.add(name.lower())
+
+            file.seek(0)
+            with package.open(f"{name}.xlsx", 'w', force_zip64=True) as writer:
+                shutil.copyfileobj(file, writer, MIB)
+            file.close()
+    buffer.seek(0)
+    return f"{os.path.splitext(blob_name)[0]}.zip", buffer
@@ -0,0 +1,6 @@
+"""
+Synthetic-data benchmarks for the pipeline (not deployed as functions, run locally from the repository root)
+
+    -synthetic.py: generates SP-API order/inventory documents with the real column sets
+    -run.py: times and memory-profiles the compile/assemble stages, saves results as JSON for comparisons
+"""
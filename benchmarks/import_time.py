@@ -0,0 +1,143 @@
+"""
+Measures the cold import time of every function app entry point (each folder with a function.json), in a fresh
+interpreter per run, and which heavy dependencies each one loads
+
+Usage (from the repository root):
+    python -m benchmarks.import_time --repeat 5
+    python -m benchmarks.import_time --functions DurableFunctionsOrchestrator HTTP_trigger --top 10
+    python -m benchmarks.import_time --compare benchmarks/results/imports-old.json benchmarks/results/imports-new.json
+
+--top lists the slowest modules of each entry point (from `python -X importtime`), to find what to make lazy.
+"""
+import argparse
+from datetime import datetime
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Any, Dict, List, Optional
+
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+# what a cold start should only pay for when the function actually needs it
+HEAVY_MODULES = [
+    'pandas', 'numpy', 'openpyxl', 'requests', 'azure.identity', 'azure.keyvault.secrets', 'azure.storage.blob'
+]
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{'seconds': seconds, 'heavy': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def entry_points() -> List[str]:
+    """Every function folder of the app (the ones with a function.json)"""
+    return sorted(
+        name for name in os.listdir(REPO_ROOT)
+        if os.path.isfile(os.path.join(REPO_ROOT, name, 'function.json'))
+    )
+
+
+def measure(module: str, repeat: int) -> Dict[str, Any]:
+    """Imports `module` in `repeat` fresh interpreters, returns the min/median seconds and the heavy modules loaded"""
+    timings, heavy = [], []
+    for _ in range(repeat):
+        probe = subprocess.run(
+            [sys.executable, '-c', _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+            capture_output=True, text=True, cwd=REPO_ROOT
+        )
+        if probe.returncode != 0:
+            raise RuntimeError(f"Importing {module} failed:\n{probe.stderr}")
+        result = json.loads(probe.stdout.strip().splitlines()[-1])
+        timings.append(result['seconds'])
+        heavy = result['heavy']
+
+    return {
+        'function': module,
+        'seconds_min': min(timings),
+        'seconds_median': statistics.median(timings),
+        'heavy_modules': heavy
+    }
+
+
+def slowest_modules(module: str, top: int) -> List[Dict[str, Any]]:
+    """The `top` modules with the highest cumulative import time, from `python -X importtime`"""
+    probe = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f"import {module}"], capture_output=True, text=True, cwd=REPO_ROOT
+    )
+    rows = []
+    for line in probe.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = [part.strip() for part in line.split(':', 1)[1].split('|')]
+        rows.append({'module': name.strip(), 'cumulative_ms': int(cumulative) / 1000})
+    return sorted(rows, key=lambda row: row['cumulative_ms'], reverse=True)[:top]
+
+
+def compare(baseline_path: str, candidate_path: str) -> None:
+    """Prints the median import time of every entry point found in both files, and the ratio"""
+    with open(baseline_path) as f:
+        baseline = {row['function']: row for row in json.load(f)['results']}
+    with open(candidate_path) as f:
+        candidate = json.load(f)['results']
+
+    print(f"{'function':<34} {'baseline':>10} {'candidate':>10} {'ratio':>7}")
+    for row in candidate:
+        old = baseline.get(row['function'])
+        if old is None:
+            continue
+        print(
+            f"{row['function']:<34} {old['seconds_median'] * 1000:>8.0f}ms {row['seconds_median'] * 1000:>8.0f}ms "
+            f"{row['seconds_median'] / old['seconds_median']:>6.2f}x"
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Cold import time of every function app entry point")
+    parser.add_argument('--functions', nargs='+', help="only these entry points (default: all)")
+    parser.add_argument('--repeat', type=int, default=5, help="fresh interpreters per entry point")
+    parser.add_argument('--top', type=int, default=0, help="also list the N slowest modules of each entry point")
+    parser.add_argument('--output', help="results file (default: benchmarks/results/imports-<timestamp>.json)")
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CANDIDATE'), help="compare two results files")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    results = []
+    for function in args.functions or entry_points():
+        row = measure(function, repeat=args.repeat)
+        if args.top:
+            row['slowest_modules'] = slowest_modules(function, top=args.top)
+        results.append(row)
+
+        print(
+            f"{function:<34} {row['seconds_median'] * 1000:>8.0f} ms  heavy: {', '.join(row['heavy_modules']) or '-'}",
+            file=sys.stderr
+        )
+        for slow in row.get('slowest_modules', []):
+            print(f"\t{slow['cumulative_ms']:>8.1f} ms  {slow['module']}", file=sys.stderr)
+
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'parameters': {'repeat': args.repeat},
+        'results': results
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"imports-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved results to {output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
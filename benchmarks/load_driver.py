@@ -0,0 +1,217 @@
+"""
+Drives the real request/poll/download loop (`ReportDownloadOrchestrator.get_report`) for N concurrent accounts
+against the local SP-API emulator, and measures end-to-end latency and retry amplification
+
+Usage (from the repository root):
+    python -m benchmarks.load_driver --accounts 10 --processing-seconds 20 --error-rate 0.05 --fatal-rate 0.02
+    python -m benchmarks.load_driver --accounts 40 --endpoint http://127.0.0.1:8089  # emulator started separately
+
+Retry amplification = API requests actually sent / requests an error-free run needs (1 token call per account,
+and createReport + getReport + getReport + getReportDocument + download per successful report)
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+import requests as req
+
+from benchmarks.spapi_emulator import API_PREFIX, EmulatorConfig, SPAPIEmulator
+
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+CALLS_PER_REPORT = 5
+
+
+def _configure_environment(accounts: List[str], endpoint: str, token_url: str) -> None:
+    """Sets the env-vars `GenerateFBAReport` validates, pointing the SP-API endpoints at the emulator"""
+    os.environ['ACCOUNTS_LIST'] = repr(accounts)
+    for account in accounts:
+        os.environ[f"{account}_VAULT_NAME"] = f"{account.lower()}-emulated-kv"
+    for key_name in ['CLIENT_ID', 'CLIENT_SECRET', 'REFRESH_TOKEN', 'ROTATION_DEADLINE']:
+        os.environ[key_name] = key_name.lower().replace('_', '-')
+    os.environ.setdefault('MARKETPLACE_ID', 'ATVPDKIKX0DER')
+    os.environ['ENDPOINT'] = endpoint
+    os.environ['TOKEN_REQUEST_URL'] = token_url
+
+    # the settings are cached per process, so re-read them in case something loaded them before
+    from Utilities.settings import reload_settings
+    reload_settings()
+
+
+def run_account(account: str) -> Dict[str, Any]:
+    """Runs the same reports as SubOrchestrator_Generator for one account, timing each of them"""
+    # imported late, so the env-vars are in place before anything reads them
+    from Utilities.report_tools import GenerateFBAReport, ReportDownloadOrchestrator
+    from Utilities.run_parameters import RunParameters
+
+    started = time.perf_counter()
+    generator = GenerateFBAReport()
+    generator.account_name = account  # rate-limit buckets are per seller
+    generator.client_id = f"client-{account}"
+    generator.client_secret = f"secret-{account}"
+    generator.refresh_token = f"refresh-{account}"  # the emulator tells sellers apart by refresh token
+    generator.rotation_deadline = '2999-12-31'
+
+    reports = []
+    try:
+        orchestrator = ReportDownloadOrchestrator(account_name=account, report_generator=generator)
+        for report_type, start_date, end_date in RunParameters(accounts=[account]).reports():
+            report_started = time.perf_counter()
+            try:
+                orchestrator.get_report(report_type=report_type, start_date=start_date, end_date=end_date)
+                error = None
+            except Exception as e:
+                error = str(e)
+            reports.append({
+                'report_type': report_type,
+                'seconds': time.perf_counter() - report_started,
+                'error': error
+            })
+        setup_error = None
+    except Exception as e:
+        setup_error = str(e)
+
+    return {
+        'account': account,
+        'seconds': time.perf_counter() - started,
+        'error': setup_error,
+        'reports': reports
+    }
+
+
+def _percentile(values: List[float], share: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(share * (len(values) - 1))))]
+
+
+def run_load(accounts: int, endpoint: str, token_url: str, stats_url: str) -> Dict[str, Any]:
+    """
+    Runs `run_account` for every account at once (one thread each), like the unbounded orchestrator fan-out
+
+    Returns:
+        -Dictionary with latencies, failures, and API request counts/amplification
+    """
+    names = [f"LD{i:02d}" for i in range(accounts)]
+    _configure_environment(names, endpoint=endpoint, token_url=token_url)
+    before = req.get(stats_url, timeout=15).json()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=accounts) as pool:
+        account_results = list(pool.map(run_account, names))
+    wall_seconds = time.perf_counter() - started
+
+    after = req.get(stats_url, timeout=15).json()
+    from Utilities.circuit_breaker import breaker_states
+    circuit_breakers = breaker_states()
+    requests_by_operation = {}
+    for operation, codes in after.items():
+        delta = {code: count - before.get(operation, {}).get(code, 0) for code, count in codes.items()}
+        requests_by_operation[operation] = {code: count for code, count in delta.items() if count}
+    requests_by_operation.pop('stats', None)
+
+    total_requests = sum(sum(codes.values()) for codes in requests_by_operation.values())
+    # failed reports count towards the requests sent, but not towards the ideal (their calls were all overhead)
+    report_count = sum(1 for result in account_results for r in result['reports'] if not r['error'])
+    ideal_requests = accounts + report_count * CALLS_PER_REPORT
+    report_seconds = [r['seconds'] for result in account_results for r in result['reports'] if not r['error']]
+    account_seconds = [result['seconds'] for result in account_results]
+
+    return {
+        'accounts': accounts,
+        'wall_seconds': wall_seconds,
+        'account_seconds': {
+            'median': statistics.median(account_seconds),
+            'p95': _percentile(account_seconds, 0.95),
+            'max': max(account_seconds)
+        },
+        'report_seconds': {
+            'median': statistics.median(report_seconds) if report_seconds else None,
+            'p95': _percentile(report_seconds, 0.95),
+            'max': max(report_seconds) if report_seconds else None
+        },
+        'failed_reports': sum(1 for result in account_results for r in result['reports'] if r['error']),
+        'failed_accounts': sum(1 for result in account_results if result['error']),
+        'requests': requests_by_operation,
+        'throttled_requests': sum(codes.get('429', 0) for codes in requests_by_operation.values()),
+        'server_errors': sum(
+            count for codes in requests_by_operation.values() for code, count in codes.items() if code.startswith('5')
+        ),
+        'total_requests': total_requests,
+        'ideal_requests': ideal_requests,
+        'retry_amplification': total_requests / ideal_requests if ideal_requests else None,
+        'circuit_breakers': circuit_breakers,
+        'account_results': account_results
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Concurrent end-to-end load test against the SP-API emulator")
+    parser.add_argument('--accounts', type=int, default=5)
+    parser.add_argument('--endpoint', help="base URL of an emulator started separately (default: start one here)")
+    parser.add_argument('--processing-seconds', type=float, default=5.0)
+    parser.add_argument('--fatal-rate', type=float, default=0.0)
+    parser.add_argument('--cancelled-rate', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--no-throttle', action='store_true')
+    parser.add_argument('--rate-limit-scale', type=float, default=1.0)
+    parser.add_argument('--skus', type=int, default=2_000)
+    parser.add_argument('--orders', type=int, default=10_000)
+    parser.add_argument('--output', help="results file (default: benchmarks/results/load-<timestamp>.json)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+
+    emulator = None
+    if args.endpoint:
+        base_url = args.endpoint.rstrip('/')
+    else:
+        emulator = SPAPIEmulator(EmulatorConfig(
+            processing_seconds=args.processing_seconds,
+            fatal_rate=args.fatal_rate,
+            cancelled_rate=args.cancelled_rate,
+            error_rate=args.error_rate,
+            throttle=not args.no_throttle,
+            rate_limit_scale=args.rate_limit_scale,
+            sku_count=args.skus,
+            order_count=args.orders
+        )).start()
+        base_url = emulator.base_url
+
+    try:
+        results = run_load(
+            accounts=args.accounts,
+            endpoint=base_url + API_PREFIX,
+            token_url=base_url + '/auth/o2/token',
+            stats_url=base_url + '/_stats'
+        )
+    finally:
+        if emulator is not None:
+            emulator.stop()
+
+    results = {'created': datetime.now().isoformat(timespec='seconds'), 'parameters': vars(args), **results}
+    print(
+        f"{results['accounts']} accounts in {results['wall_seconds']:.1f} s | "
+        f"report p50 {results['report_seconds']['median']} s | "
+        f"{results['failed_reports']} failed reports | {results['throttled_requests']} throttled | "
+        f"amplification {results['retry_amplification']:.2f}x",
+        file=sys.stderr
+    )
+
+    output = args.output or os.path.join(RESULTS_DIR, f"load-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Saved results to {output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
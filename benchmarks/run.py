@@ -0,0 +1,369 @@
+"""
+Times and memory-profiles the compile and assemble stages of the pipeline on synthetic SP-API data
+
+Usage (from the repository root):
+    python -m benchmarks.run --skus 200 20000 200000 --accounts 1 --repeat 3
+    python -m benchmarks.run --skus 20000 --orders 50000 150000 --stages on_hand_report_compiler workbook_write
+    python -m benchmarks.run --compare benchmarks/results/old.json benchmarks/results/new.json
+
+Every run writes a JSON file (default: benchmarks/results/<timestamp>.json) so runs can be compared later.
+"""
+import argparse
+from datetime import datetime
+import gc
+import importlib
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+import pandas as pd
+
+from benchmarks.synthetic import SyntheticSellerData
+from Utilities.payload_codec import CODECS, PayloadCodec
+from Utilities.report_tools import GenerateFBAReport, ReportAssembler
+from Utilities.workbook import WorkbookBuilder
+
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+class Stage:
+    """
+    One benchmarked step of the pipeline
+
+    Parameters:
+        -name: (str) Name of the stage in the results
+        -setup: (Callable) Builds the inputs of `run` (not timed), called before every repetition
+        -run: (Callable) The code being measured, receives whatever `setup` returned
+        -payload_bytes: (Optional[Callable]) Size of what the stage serializes, reported as 'payload_mb'. Default=None
+    """
+    def __init__(
+        self,
+        name: str,
+        setup: Callable[[], Any],
+        run: Callable[[Any], Any],
+        payload_bytes: Optional[Callable[[], int]] = None
+    ):
+        self.name = name
+        self.setup = setup
+        self.run = run
+        self.payload_bytes = payload_bytes
+
+    def measure(self, repeat: int) -> Dict[str, float]:
+        """Times `repeat` runs, then does one extra run under tracemalloc for the peak allocation"""
+        timings = []
+        for _ in range(repeat):
+            args = self.setup()
+            gc.collect()
+            start = time.perf_counter()
+            self.run(args)
+            timings.append(time.perf_counter() - start)
+
+        # separate run, tracemalloc slows the code down too much to time it at the same time
+        args = self.setup()
+        gc.collect()
+        tracemalloc.start()
+        self.run(args)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        measured = {
+            'seconds_min': min(timings),
+            'seconds_median': statistics.median(timings),
+            'peak_mb': peak / 2**20
+        }
+        if self.payload_bytes is not None:
+            measured['payload_mb'] = self.payload_bytes() / 2**20
+        return measured
+
+
+class PipelineFixture:
+    """
+    Synthetic documents for several accounts, plus the intermediate results every stage starts from
+
+    Parameters:
+        -sku_count: (int) SKUs per account
+        -order_count: (int) Order lines per account over the 90D lookback
+        -accounts: (int) Number of accounts (same size, different random data)
+    """
+    def __init__(self, sku_count: int, order_count: int, accounts: int):
+        self.accounts = [f"A{i:02d}" for i in range(accounts)]
+        self.data = {
+            account: SyntheticSellerData(sku_count=sku_count, order_count=order_count, seed=i)
+            for i, account in enumerate(self.accounts)
+        }
+
+        # what the SP-API serves (gzip documents), and what the activities pass along (json)
+        self.order_documents = {
+            account: [data.gzip(data.orders_tsv(window=w)) for w in range(len(data.windows()))]
+            for account, data in self.data.items()
+        }
+        self.inventory_documents = {account: data.gzip(data.inventory_tsv()) for account, data in self.data.items()}
+
+        self.order_dfs = {
+            account: [GenerateFBAReport.parse_report_document(doc, 'GZIP') for doc in docs]
+            for account, docs in self.order_documents.items()
+        }
+        self.inventory_dfs = {
+            account: GenerateFBAReport.parse_report_document(doc, 'GZIP')
+            for account, doc in self.inventory_documents.items()
+        }
+        self.compiler_inputs = {
+            account: {
+                'account_name': account,
+                'orders': [df.to_json(orient='records') for df in self.order_dfs[account]],
+                'inventory': [self.inventory_dfs[account].to_json(orient='records')]
+            }
+            for account in self.accounts
+        }
+
+        compiler = importlib.import_module('Activity_ReportCompiler')
+        self.compiled = [compiler.main(self.compiler_inputs[account]) for account in self.accounts]
+        self.workbook = ReportAssembler().write_on_hand_workbook(self.compiled)
+
+        # every report the activities pass along, as each codec sends it (see Utilities.payload_codec)
+        self.reports = [
+            df for account in self.accounts for df in self.order_dfs[account] + [self.inventory_dfs[account]]
+        ]
+        self.payloads = {name: [PayloadCodec(name).encode(df) for df in self.reports] for name in CODECS}
+
+    def stages(self) -> List[Stage]:
+        compiler = importlib.import_module('Activity_ReportCompiler')
+        no_setup = lambda: None
+
+        def parse(documents):
+            for docs in documents:
+                for doc in docs:
+                    GenerateFBAReport.parse_report_document(doc, 'GZIP')
+
+        def concat_inputs():
+            return [
+                (
+                    account,
+                    pd.concat(self.order_dfs[account], ignore_index=True),
+                    self.inventory_dfs[account].copy()
+                )
+                for account in self.accounts
+            ]
+
+        def copy_workbook():
+            self.workbook.seek(0)
+            return self.workbook
+
+        return [
+            Stage(
+                'download_report_parse_orders',
+                no_setup,
+                lambda _: parse(self.order_documents.values())
+            ),
+            Stage(
+                'download_report_parse_inventory',
+                no_setup,
+                lambda _: parse([[doc] for doc in self.inventory_documents.values()])
+            ),
+            Stage(
+                'get_report_serialize',
+                no_setup,
+                lambda _: [
+                    df.to_json(orient='records')
+                    for account in self.accounts
+                    for df in self.order_dfs[account] + [self.inventory_dfs[account]]
+                ]
+            ),
+            *[
+                Stage(
+                    f"payload_encode_{name}",
+                    no_setup,
+                    lambda _, codec=PayloadCodec(name): [codec.encode(df) for df in self.reports],
+                    lambda name=name: sum(len(payload) for payload in self.payloads[name])
+                )
+                for name in CODECS
+            ],
+            *[
+                Stage(
+                    f"payload_decode_{name}",
+                    no_setup,
+                    lambda _, name=name: [PayloadCodec.decode(payload) for payload in self.payloads[name]],
+                    lambda name=name: sum(len(payload) for payload in self.payloads[name])
+                )
+                for name in CODECS
+            ],
+            Stage(
+                'activity_report_compiler',
+                no_setup,
+                lambda _: [compiler.main(self.compiler_inputs[account]) for account in self.accounts]
+            ),
+            Stage(
+                'on_hand_report_compiler',
+                concat_inputs,
+                lambda inputs: [
+                    ReportAssembler(account_name=account).on_hand_report_compiler(orders=orders, inventory=inventory)
+                    for account, orders, inventory in inputs
+                ]
+            ),
+            Stage(
+                'simple_sales_report',
+                concat_inputs,
+                lambda inputs: [
+                    ReportAssembler(account_name=account).simple_sales_report(orders, inventory)
+                    for account, orders, inventory in inputs
+                ]
+            ),
+            Stage(
+                'workbook_write',
+                no_setup,
+                lambda _: ReportAssembler().write_on_hand_workbook(self.compiled)
+            ),
+            Stage(
+                # COMPILE_MODE='consolidated': replaces activity_report_compiler + workbook_write
+                'consolidated_compile_write',
+                no_setup,
+                lambda _: ReportAssembler().write_on_hand_workbook(
+                    ReportAssembler().consolidated_on_hand_reports(list(self.compiler_inputs.values()))
+                )
+            ),
+            Stage(
+                'on_hand_report_formatter',
+                copy_workbook,
+                lambda workbook: ReportAssembler().format_on_hand_workbook(workbook)
+            ),
+            Stage(
+                # what SubOrchestrator_Assembler runs: replaces workbook_write + on_hand_report_formatter
+                'workbook_build',
+                no_setup,
+                lambda _: WorkbookBuilder().build(ReportAssembler.read_on_hand_results(self.compiled), 'report.xlsx')
+            ),
+        ]
+
+
+def _environment() -> Dict[str, str]:
+    """Versions and commit the results were produced with"""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        commit = 'unknown'
+
+    import numpy
+    import openpyxl
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'pandas': pd.__version__,
+        'numpy': numpy.__version__,
+        'openpyxl': openpyxl.__version__
+    }
+
+
+def run_benchmarks(
+    sku_counts: List[int],
+    order_counts: Optional[List[int]],
+    account_counts: List[int],
+    repeat: int = 3,
+    stages: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    """
+    Runs every selected stage for every combination of sizes
+
+    Parameters:
+        -sku_counts: (List[int]) SKUs per account
+        -order_counts: (Optional[List[int]]) Order lines per account over 90D. Default = 5 per SKU
+        -account_counts: (List[int]) Number of accounts
+        -repeat: (int) Timed repetitions per stage (the minimum and median are kept)
+        -stages: (Optional[List[str]]) Only run these stages. Default = all
+
+    Returns:
+        -Dictionary with the environment, parameters and one result row per (stage, size)
+    """
+    results = []
+    for skus, accounts in itertools.product(sku_counts, account_counts):
+        for orders in (order_counts or [skus * 5]):
+            print(f"Preparing {accounts} account(s) x {skus:,} SKUs x {orders:,} order lines ...", file=sys.stderr)
+            fixture = PipelineFixture(sku_count=skus, order_count=orders, accounts=accounts)
+
+            for stage in fixture.stages():
+                if stages and stage.name not in stages:
+                    continue
+                measured = stage.measure(repeat=repeat)
+                results.append({'stage': stage.name, 'skus': skus, 'orders': orders, 'accounts': accounts, **measured})
+                payload = f"  {measured['payload_mb']:>9.2f} MB payload" if 'payload_mb' in measured else ''
+                print(
+                    f"\t{stage.name:<34} {measured['seconds_median']:>9.3f} s  {measured['peak_mb']:>9.1f} MB peak"
+                    + payload,
+                    file=sys.stderr
+                )
+
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'environment': _environment(),
+        'parameters': {'skus': sku_counts, 'orders': order_counts, 'accounts': account_counts, 'repeat': repeat},
+        'results': results
+    }
+
+
+def compare(baseline_path: str, candidate_path: str) -> None:
+    """Prints the time and memory ratio (candidate / baseline) of every stage/size found in both files"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(candidate_path) as f:
+        candidate = json.load(f)
+
+    key = lambda row: (row['stage'], row['skus'], row['orders'], row['accounts'])
+    baseline_rows = {key(row): row for row in baseline['results']}
+
+    print(f"baseline:  {baseline_path} ({baseline['environment'].get('commit')})")
+    print(f"candidate: {candidate_path} ({candidate['environment'].get('commit')})")
+    print(f"{'stage':<34} {'skus':>8} {'orders':>9} {'accts':>5} {'time':>8} {'memory':>8}")
+    for row in candidate['results']:
+        old = baseline_rows.get(key(row))
+        if old is None:
+            continue
+        time_ratio = row['seconds_median'] / old['seconds_median'] if old['seconds_median'] else float('nan')
+        memory_ratio = row['peak_mb'] / old['peak_mb'] if old['peak_mb'] else float('nan')
+        print(
+            f"{row['stage']:<34} {row['skus']:>8} {row['orders']:>9} {row['accounts']:>5} "
+            f"{time_ratio:>7.2f}x {memory_ratio:>7.2f}x"
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the compile/assemble stages on synthetic SP-API data")
+    parser.add_argument('--skus', type=int, nargs='+', default=[200, 20_000], help="SKUs per account")
+    parser.add_argument('--orders', type=int, nargs='+', help="order lines per account (default: 5 per SKU)")
+    parser.add_argument('--accounts', type=int, nargs='+', default=[1], help="number of accounts")
+    parser.add_argument('--repeat', type=int, default=3, help="timed repetitions per stage")
+    parser.add_argument('--stages', nargs='+', help="only run these stages")
+    parser.add_argument('--output', help="results file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CANDIDATE'), help="compare two results files")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    report = run_benchmarks(
+        sku_counts=args.skus,
+        order_counts=args.orders,
+        account_counts=args.accounts,
+        repeat=args.repeat,
+        stages=args.stages
+    )
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved results to {output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,437 @@
+"""
+Local stand-in for the LWA token endpoint and the SP-API Reports 2021-06-30 API
+
+Usage (from the repository root):
+    python -m benchmarks.spapi_emulator --port 8089 --processing-seconds 20 --fatal-rate 0.05 --error-rate 0.02
+
+Then point the pipeline at it:
+    ENDPOINT=http://127.0.0.1:8089/reports/2021-06-30
+    TOKEN_REQUEST_URL=http://127.0.0.1:8089/auth/o2/token
+
+Routes:
+    POST /auth/o2/token                               LWA access token (refresh_token grant)
+    POST /reports/2021-06-30/reports                  createReport
+    GET  /reports/2021-06-30/reports                  getReports (used by the inventory fallback)
+    GET  /reports/2021-06-30/reports/{reportId}       getReport
+    GET  /reports/2021-06-30/documents/{documentId}   getReportDocument
+    GET  /downloads/{documentId}                      the gzip-compressed document (the pre-signed S3 URL)
+    GET  /_stats                                      request counters of the emulator, as JSON
+"""
+import argparse
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import random
+import re
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from benchmarks.synthetic import SyntheticSellerData
+
+
+API_PREFIX = '/reports/2021-06-30'
+
+# (rate per second, burst) of the real SP-API usage plans, per selling partner and operation
+DEFAULT_RATE_LIMITS = {
+    'createReport': (0.0167, 15),
+    'getReports': (0.0222, 10),
+    'getReport': (2.0, 15),
+    'getReportDocument': (0.0167, 15),
+    'token': (50.0, 100)
+}
+
+
+class EmulatorConfig:
+    """
+    Behaviour of the emulator
+
+    Parameters:
+        -processing_seconds: (float) How long a report stays IN_QUEUE/IN_PROGRESS before it is DONE
+        -processing_jitter: (float) +/- random share of `processing_seconds` per report (default=0.25)
+        -fatal_rate: (float) Share of reports that end as FATAL instead of DONE
+        -cancelled_rate: (float) Share of reports that end as CANCELLED instead of DONE
+        -error_rate: (float) Share of requests answered with a transient 500/503
+        -throttle: (bool) Enforce the per-seller rate limits (429 + x-amzn-RateLimit-Limit header)
+        -rate_limit_scale: (float) Multiplies every rate limit, e.g. 10 for a quick test with the real burst sizes
+        -sku_count: (int) SKUs of every emulated seller
+        -order_count: (int) 90D order lines of every emulated seller
+    """
+    def __init__(
+        self,
+        processing_seconds: float = 5.0,
+        processing_jitter: float = 0.25,
+        fatal_rate: float = 0.0,
+        cancelled_rate: float = 0.0,
+        error_rate: float = 0.0,
+        throttle: bool = True,
+        rate_limit_scale: float = 1.0,
+        sku_count: int = 2_000,
+        order_count: int = 10_000
+    ):
+        self.processing_seconds = processing_seconds
+        self.processing_jitter = processing_jitter
+        self.fatal_rate = fatal_rate
+        self.cancelled_rate = cancelled_rate
+        self.error_rate = error_rate
+        self.throttle = throttle
+        self.rate_limits = {
+            operation: (rate * rate_limit_scale, burst) for operation, (rate, burst) in DEFAULT_RATE_LIMITS.items()
+        }
+        self.sku_count = sku_count
+        self.order_count = order_count
+
+
+class _TokenBucket:
+    """Token bucket of one (seller, operation), refilled continuously at `rate` tokens per second"""
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def take(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class SPAPIEmulator:
+    """
+    State of the emulated SP-API: sellers, reports, documents, rate-limit buckets and request counters
+
+    Parameters:
+        -config: (EmulatorConfig) Delays and failure injection settings
+        -host: (str) Interface to listen on (default='127.0.0.1')
+        -port: (int) Port to listen on. 0 picks a free port (see `base_url` once started)
+
+    Example:
+        >>emulator = SPAPIEmulator(EmulatorConfig(processing_seconds=2)).start()
+        >>os.environ['ENDPOINT'], os.environ['TOKEN_REQUEST_URL'] = emulator.endpoint, emulator.token_url
+        >>...
+        >>emulator.stop()
+
+    Considerations:
+        -The seller is identified by the refresh token, so every account needs its own REFRESH_TOKEN value
+        -Documents are synthetic (benchmarks.synthetic), order documents honour dataStartTime/dataEndTime
+    """
+    def __init__(self, config: Optional[EmulatorConfig] = None, host: str = '127.0.0.1', port: int = 0):
+        self.config = config or EmulatorConfig()
+        self.lock = threading.Lock()
+        self.sellers: Dict[str, SyntheticSellerData] = {}
+        self.tokens: Dict[str, str] = {}
+        self.reports: Dict[str, Dict[str, Any]] = {}
+        self.documents: Dict[str, bytes] = {}
+        self.buckets: Dict[Tuple[str, str], _TokenBucket] = {}
+        self.stats: Dict[str, Dict[str, int]] = {}
+        self.server = ThreadingHTTPServer((host, port), self.__handler_class())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def endpoint(self) -> str:
+        """Value for the ENDPOINT env-var"""
+        return self.base_url + API_PREFIX
+
+    @property
+    def token_url(self) -> str:
+        """Value for the TOKEN_REQUEST_URL env-var"""
+        return self.base_url + '/auth/o2/token'
+
+    def start(self) -> 'SPAPIEmulator':
+        """Serves requests on a background thread"""
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def reset_stats(self) -> None:
+        with self.lock:
+            self.stats = {}
+
+    def snapshot_stats(self) -> Dict[str, Dict[str, int]]:
+        """Request counters per operation and status code (e.g. {'createReport': {'202': 40, '429': 3}})"""
+        with self.lock:
+            return {operation: dict(codes) for operation, codes in self.stats.items()}
+
+    # -- request handling ---------------------------------------------------------------------------------------
+
+    def _count(self, operation: str, status: int) -> None:
+        with self.lock:
+            codes = self.stats.setdefault(operation, {})
+            codes[str(status)] = codes.get(str(status), 0) + 1
+
+    def _throttled(self, seller: str, operation: str) -> bool:
+        if not self.config.throttle:
+            return False
+        with self.lock:
+            key = (seller, operation)
+            if key not in self.buckets:
+                self.buckets[key] = _TokenBucket(*self.config.rate_limits[operation])
+            return not self.buckets[key].take()
+
+    def _seller_data(self, seller: str) -> SyntheticSellerData:
+        with self.lock:
+            if seller not in self.sellers:
+                self.sellers[seller] = SyntheticSellerData(
+                    sku_count=self.config.sku_count,
+                    order_count=self.config.order_count,
+                    seed=len(self.sellers)
+                )
+            return self.sellers[seller]
+
+    def _report_status(self, report: Dict[str, Any]) -> str:
+        """Moves a report along IN_QUEUE -> IN_PROGRESS -> DONE/FATAL/CANCELLED based on its age"""
+        elapsed = time.monotonic() - report['created']
+        if elapsed < report['processing_seconds'] * 0.2:
+            return 'IN_QUEUE'
+        if elapsed < report['processing_seconds']:
+            return 'IN_PROGRESS'
+
+        if report['outcome'] == 'DONE' and report['document_id'] not in self.documents:
+            self._build_document(report)
+        return report['outcome']
+
+    def _build_document(self, report: Dict[str, Any]) -> None:
+        data = self._seller_data(report['seller'])
+        if report['reportType'] == 'GET_FLAT_FILE_ALL_ORDERS_DATA_BY_ORDER_DATE_GENERAL':
+            start = datetime.fromisoformat(report['dataStartTime'])
+            end = datetime.fromisoformat(report['dataEndTime'])
+            document = data.orders_tsv_between(start, end)
+        else:
+            document = data.inventory_tsv()
+
+        compressed = data.gzip(document)
+        with self.lock:
+            self.documents[report['document_id']] = compressed
+
+    def __handler_class(self):
+        emulator = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass  # keep the console quiet, `snapshot_stats` has the numbers
+
+            def _send(self, operation: str, status: int, body: Any = None, headers: Optional[Dict] = None) -> None:
+                if isinstance(body, bytes):
+                    payload, content_type = body, 'application/octet-stream'
+                else:
+                    payload, content_type = json.dumps(body or {}).encode(), 'application/json'
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(payload)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(payload)
+                emulator._count(operation, status)
+
+            def _error(self, operation: str, status: int, code: str, message: str, headers=None) -> None:
+                self._send(operation, status, {'errors': [{'code': code, 'message': message}]}, headers)
+
+            def _read_body(self) -> bytes:
+                length = int(self.headers.get('Content-Length') or 0)
+                return self.rfile.read(length) if length else b''
+
+            def _seller(self) -> Optional[str]:
+                return emulator.tokens.get(self.headers.get('x-amz-access-token', ''))
+
+            def _guard(self, operation: str, seller: Optional[str]) -> bool:
+                """Injected failures shared by every API route, returns False if the request was answered"""
+                if seller is None:
+                    self._error(operation, 403, 'Unauthorized', 'Access to requested resource is denied.')
+                    return False
+                if random.random() < emulator.config.error_rate:
+                    status = random.choice([500, 503])
+                    self._error(operation, status, 'InternalFailure', 'We encountered an internal error.')
+                    return False
+                if emulator._throttled(seller, operation):
+                    rate = emulator.config.rate_limits[operation][0]
+                    self._error(
+                        operation, 429, 'QuotaExceeded', 'You exceeded your quota for the requested resource.',
+                        headers={'x-amzn-RateLimit-Limit': f"{rate:g}"}
+                    )
+                    return False
+                return True
+
+            def do_POST(self):
+                path = urlparse(self.path).path
+                body = self._read_body()
+
+                if path == '/auth/o2/token':
+                    form = {k: v[0] for k, v in parse_qs(body.decode()).items()}
+                    refresh_token = form.get('refresh_token')
+                    if form.get('grant_type') != 'refresh_token' or not refresh_token:
+                        return self._send('token', 400, {'error': 'invalid_request'})
+                    if random.random() < emulator.config.error_rate:
+                        return self._send('token', 500, {'error': 'server_error'})
+                    access_token = f"Atza|{refresh_token}|{random.getrandbits(64):x}"
+                    with emulator.lock:
+                        emulator.tokens[access_token] = refresh_token
+                    return self._send(
+                        'token', 200, {'access_token': access_token, 'token_type': 'bearer', 'expires_in': 3600}
+                    )
+
+                if path == API_PREFIX + '/reports':
+                    seller = self._seller()
+                    if not self._guard('createReport', seller):
+                        return
+                    params = json.loads(body or b'{}')
+                    if not params.get('reportType') or not params.get('marketplaceIds'):
+                        return self._error('createReport', 400, 'InvalidInput', 'reportType/marketplaceIds missing')
+
+                    config = emulator.config
+                    roll = random.random()
+                    if roll < config.fatal_rate:
+                        outcome = 'FATAL'
+                    elif roll < config.fatal_rate + config.cancelled_rate:
+                        outcome = 'CANCELLED'
+                    else:
+                        outcome = 'DONE'
+
+                    with emulator.lock:
+                        report_id = str(50_000_000_000 + len(emulator.reports))
+                        emulator.reports[report_id] = {
+                            'seller': seller,
+                            'reportId': report_id,
+                            'reportType': params['reportType'],
+                            'marketplaceIds': params['marketplaceIds'],
+                            'dataStartTime': params.get('dataStartTime'),
+                            'dataEndTime': params.get('dataEndTime'),
+                            'createdTime': datetime.now(timezone.utc).isoformat(),
+                            'created': time.monotonic(),
+                            'processing_seconds': config.processing_seconds * random.uniform(
+                                1 - config.processing_jitter, 1 + config.processing_jitter
+                            ),
+                            'outcome': outcome,
+                            'document_id': f"amzn1.spdoc.1.4.na.{report_id}"
+                        }
+                    return self._send('createReport', 202, {'reportId': report_id})
+
+                self._error('unknown', 404, 'NotFound', f"No route for POST {path}")
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                path = parsed.path
+
+                if path == '/_stats':
+                    return self._send('stats', 200, emulator.snapshot_stats())
+
+                match = re.fullmatch(r'/downloads/(.+)', path)
+                if match:
+                    document = emulator.documents.get(match.group(1))
+                    if document is None:
+                        return self._error('download', 404, 'NotFound', 'Document not found')
+                    if random.random() < emulator.config.error_rate:
+                        return self._error('download', 503, 'SlowDown', 'Please reduce your request rate.')
+                    return self._send('download', 200, document)
+
+                seller = self._seller()
+
+                if path == API_PREFIX + '/reports':
+                    if not self._guard('getReports', seller):
+                        return
+                    report_types = parse_qs(parsed.query).get('reportTypes', [''])[0]
+                    reports = [
+                        self._report_view(report) for report in list(emulator.reports.values())
+                        if report['seller'] == seller and report['reportType'] in report_types
+                    ]
+                    return self._send('getReports', 200, {'reports': reports})
+
+                match = re.fullmatch(API_PREFIX + r'/reports/(\d+)', path)
+                if match:
+                    if not self._guard('getReport', seller):
+                        return
+                    report = emulator.reports.get(match.group(1))
+                    if report is None or report['seller'] != seller:
+                        return self._error('getReport', 404, 'NotFound', 'Report not found')
+                    return self._send('getReport', 200, self._report_view(report))
+
+                match = re.fullmatch(API_PREFIX + r'/documents/(.+)', path)
+                if match:
+                    if not self._guard('getReportDocument', seller):
+                        return
+                    document_id = match.group(1)
+                    if document_id not in emulator.documents:
+                        return self._error('getReportDocument', 404, 'NotFound', 'Document not found')
+                    return self._send('getReportDocument', 200, {
+                        'reportDocumentId': document_id,
+                        'url': f"{emulator.base_url}/downloads/{document_id}",
+                        'compressionAlgorithm': 'GZIP'
+                    })
+
+                self._error('unknown', 404, 'NotFound', f"No route for GET {path}")
+
+            def _report_view(self, report: Dict[str, Any]) -> Dict[str, Any]:
+                status = emulator._report_status(report)
+                view = {
+                    'reportId': report['reportId'],
+                    'reportType': report['reportType'],
+                    'marketplaceIds': report['marketplaceIds'],
+                    'dataStartTime': report['dataStartTime'],
+                    'dataEndTime': report['dataEndTime'],
+                    'createdTime': report['createdTime'],
+                    'processingStatus': status
+                }
+                if status in ['DONE', 'FATAL', 'CANCELLED']:
+                    finished = datetime.fromisoformat(report['createdTime']) + timedelta(
+                        seconds=report['processing_seconds']
+                    )
+                    view['processingEndTime'] = finished.isoformat()
+                if status == 'DONE':
+                    view['reportDocumentId'] = report['document_id']
+                return view
+
+        return Handler
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Local stand-in for the LWA token endpoint and SP-API Reports API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--processing-seconds', type=float, default=5.0)
+    parser.add_argument('--fatal-rate', type=float, default=0.0)
+    parser.add_argument('--cancelled-rate', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of transient 500/503 responses")
+    parser.add_argument('--no-throttle', action='store_true', help="disable the 429 rate limits")
+    parser.add_argument('--rate-limit-scale', type=float, default=1.0)
+    parser.add_argument('--skus', type=int, default=2_000)
+    parser.add_argument('--orders', type=int, default=10_000)
+    args = parser.parse_args(argv)
+
+    config = EmulatorConfig(
+        processing_seconds=args.processing_seconds,
+        fatal_rate=args.fatal_rate,
+        cancelled_rate=args.cancelled_rate,
+        error_rate=args.error_rate,
+        throttle=not args.no_throttle,
+        rate_limit_scale=args.rate_limit_scale,
+        sku_count=args.skus,
+        order_count=args.orders
+    )
+    emulator = SPAPIEmulator(config, host=args.host, port=args.port)
+    print(f"ENDPOINT={emulator.endpoint}")
+    print(f"TOKEN_REQUEST_URL={emulator.token_url}")
+    try:
+        emulator.server.serve_forever()
+    except KeyboardInterrupt:
+        emulator.stop()
+
+
+if __name__ == '__main__':
+    main()
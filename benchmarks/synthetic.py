@@ -0,0 +1,185 @@
+from datetime import datetime, timedelta, timezone
+import gzip
+import io
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+# column sets of the real SP-API documents, in the order Amazon returns them
+ORDER_COLUMNS = [
+    'amazon-order-id', 'merchant-order-id', 'purchase-date', 'last-updated-date', 'order-status',
+    'fulfillment-channel', 'sales-channel', 'order-channel', 'ship-service-level', 'product-name', 'sku', 'asin',
+    'item-status', 'quantity', 'currency', 'item-price', 'item-tax', 'shipping-price', 'shipping-tax',
+    'gift-wrap-price', 'gift-wrap-tax', 'item-promotion-discount', 'ship-promotion-discount', 'ship-city',
+    'ship-state', 'ship-postal-code', 'ship-country', 'promotion-ids', 'is-business-order', 'purchase-order-number',
+    'price-designation', 'signature-confirmation-recommended'
+]
+
+INVENTORY_COLUMNS = [
+    'sku', 'fnsku', 'asin', 'product-name', 'condition', 'your-price', 'mfn-listing-exists',
+    'mfn-fulfillable-quantity', 'afn-listing-exists', 'afn-warehouse-quantity', 'afn-fulfillable-quantity',
+    'afn-unsellable-quantity', 'afn-reserved-quantity', 'afn-total-quantity', 'per-unit-volume',
+    'afn-inbound-working-quantity', 'afn-inbound-shipped-quantity', 'afn-inbound-receiving-quantity',
+    'afn-researching-quantity', 'afn-reserved-future-supply', 'afn-future-supply-buyable'
+]
+
+_WORDS = [
+    'Organic', 'Premium', 'Stainless', 'Bamboo', 'Wireless', 'Compact', 'Deluxe', 'Travel', 'Kitchen', 'Outdoor',
+    'Cotton', 'Ceramic', 'Portable', 'Magnetic', 'Vintage', 'Ergonomic', 'Insulated', 'Foldable', 'LED', 'Glass'
+]
+_NOUNS = ['Bottle', 'Organizer', 'Lamp', 'Mug', 'Charger', 'Blanket', 'Backpack', 'Tray', 'Stand', 'Pillow']
+_STATES = ['CA', 'NY', 'TX', 'FL', 'WA', 'IL', 'PA', 'OH', 'GA', 'NC']
+
+
+class SyntheticSellerData:
+    """
+    Generates realistic synthetic SP-API documents for one seller account (orders and unsuppressed inventory)
+
+    Parameters:
+        -sku_count: (int) Number of SKUs in the catalog (every SKU appears in the inventory report)
+        -order_count: (int) Number of order lines spread across the date range
+        -days: (int) How many days back the orders go (default=90, the on-hand report lookback)
+        -seed: (int) Random seed, so the same parameters always give the same data
+
+    Example:
+        >>data = SyntheticSellerData(sku_count=20_000, order_count=150_000)
+        >>orders_tsv = data.orders_tsv(window=0)  # the most recent 'Activity_Orders' document
+        >>inventory_gzip = data.gzip(data.inventory_tsv())
+
+    Considerations:
+        -SKU popularity is Zipf-like, so a small share of SKUs gets most orders, as on a real account
+        -Roughly 5% of lines are cancelled (blank item-price), and most SKUs have zero on hand
+    """
+    def __init__(self, sku_count: int, order_count: int, days: int = 90, seed: int = 0):
+        self.sku_count = sku_count
+        self.order_count = order_count
+        self.days = days
+        self.rng = np.random.default_rng(seed)
+        self.today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        self.catalog = self.__build_catalog()
+        self.orders = self.__build_orders()
+
+    def __build_catalog(self) -> pd.DataFrame:
+        """Private method: SKU/ASIN/product name/price per catalog item"""
+        ids = np.arange(self.sku_count)
+        words = self.rng.integers(0, len(_WORDS), size=(self.sku_count, 2))
+        nouns = self.rng.integers(0, len(_NOUNS), size=self.sku_count)
+        names = [
+            f"{_WORDS[a]} {_WORDS[b]} {_NOUNS[n]} - Pack of {i % 4 + 1}"
+            for i, (a, b), n in zip(ids, words, nouns)
+        ]
+        return pd.DataFrame({
+            'sku': [f"SKU-{i:07d}" for i in ids],
+            'fnsku': [f"X00{i:07d}" for i in ids],
+            'asin': [f"B0{i:08d}" for i in ids],
+            'product-name': names,
+            'your-price': np.round(self.rng.uniform(5, 120, self.sku_count), 2)
+        })
+
+    def __build_orders(self) -> pd.DataFrame:
+        """Private method: all order lines of the lookback, newest first"""
+        n = self.order_count
+        popularity = 1 / np.arange(1, self.sku_count + 1) ** 1.1
+        sku_idx = self.rng.choice(self.sku_count, size=n, p=popularity / popularity.sum())
+        seconds_ago = self.rng.integers(0, self.days * 86400, size=n)
+        purchase = pd.to_datetime(self.today) - pd.to_timedelta(np.sort(seconds_ago), unit='s')
+        quantity = self.rng.choice([1, 1, 1, 1, 2, 2, 3], size=n)
+        price = self.catalog['your-price'].to_numpy()[sku_idx] * quantity
+        cancelled = self.rng.random(n) < 0.05
+
+        order_ids = [
+            f"{a:03d}-{b:07d}-{c:07d}"
+            for a, b, c in zip(
+                self.rng.integers(100, 999, n), self.rng.integers(0, 9_999_999, n), self.rng.integers(0, 9_999_999, n)
+            )
+        ]
+        iso_dates = purchase.strftime('%Y-%m-%dT%H:%M:%S+00:00')
+
+        orders = pd.DataFrame({
+            'amazon-order-id': order_ids,
+            'merchant-order-id': '',
+            'purchase-date': iso_dates,
+            'last-updated-date': iso_dates,
+            'order-status': np.where(cancelled, 'Cancelled', 'Shipped'),
+            'fulfillment-channel': 'Amazon',
+            'sales-channel': 'Amazon.com',
+            'order-channel': '',
+            'ship-service-level': 'Expedited',
+            'product-name': self.catalog['product-name'].to_numpy()[sku_idx],
+            'sku': self.catalog['sku'].to_numpy()[sku_idx],
+            'asin': self.catalog['asin'].to_numpy()[sku_idx],
+            'item-status': np.where(cancelled, 'Cancelled', 'Shipped'),
+            'quantity': np.where(cancelled, 0, quantity),
+            'currency': 'USD',
+            'item-price': np.where(cancelled, np.nan, np.round(price, 2)),
+            'item-tax': np.where(cancelled, np.nan, np.round(price * 0.07, 2)),
+            'shipping-price': np.nan,
+            'shipping-tax': np.nan,
+            'gift-wrap-price': np.nan,
+            'gift-wrap-tax': np.nan,
+            'item-promotion-discount': np.nan,
+            'ship-promotion-discount': np.nan,
+            'ship-city': 'SPRINGFIELD',
+            'ship-state': self.rng.choice(_STATES, size=n),
+            'ship-postal-code': [f"{z:05d}" for z in self.rng.integers(1000, 99999, n)],
+            'ship-country': 'US',
+            'promotion-ids': '',
+            'is-business-order': 'false',
+            'purchase-order-number': '',
+            'price-designation': '',
+            'signature-confirmation-recommended': 'false'
+        })
+        orders['purchase-ts'] = purchase
+        return orders
+
+    def windows(self) -> List[Tuple[datetime, datetime]]:
+        """The 30-day (start, end) windows of the order activities, newest first (like `RunParameters.windows`)"""
+        edges = [self.today - timedelta(days=d) for d in range(0, self.days + 1, 30)]
+        return [(edges[i + 1], edges[i]) for i in range(len(edges) - 1)]
+
+    def orders_tsv(self, window: int = 0) -> str:
+        """The orders document for one 30-day window (0 = most recent), as Amazon returns it (tab-separated)"""
+        start, end = self.windows()[window]
+        return self.orders_tsv_between(start, end)
+
+    def orders_tsv_between(self, start: datetime, end: datetime) -> str:
+        """The orders document for any date range within the lookback (tab-separated)"""
+        mask = (self.orders['purchase-ts'] >= start) & (self.orders['purchase-ts'] < end)
+        return self.orders.loc[mask, ORDER_COLUMNS].to_csv(sep='\t', index=False)
+
+    def inventory_tsv(self) -> str:
+        """The GET_FBA_MYI_UNSUPPRESSED_INVENTORY_DATA document, one row per catalog SKU (tab-separated)"""
+        n = self.sku_count
+        fulfillable = np.where(self.rng.random(n) < 0.35, self.rng.integers(1, 500, n), 0)
+        reserved = self.rng.integers(0, 20, n)
+        unsellable = np.where(self.rng.random(n) < 0.05, self.rng.integers(1, 10, n), 0)
+        inbound = np.where(self.rng.random(n) < 0.1, self.rng.integers(1, 200, n), 0)
+
+        inventory = self.catalog.copy()
+        inventory['condition'] = 'New'
+        inventory['mfn-listing-exists'] = 'No'
+        inventory['mfn-fulfillable-quantity'] = ''
+        inventory['afn-listing-exists'] = 'Yes'
+        inventory['afn-warehouse-quantity'] = fulfillable + reserved + unsellable
+        inventory['afn-fulfillable-quantity'] = fulfillable
+        inventory['afn-unsellable-quantity'] = unsellable
+        inventory['afn-reserved-quantity'] = reserved
+        inventory['afn-total-quantity'] = fulfillable + reserved + unsellable + inbound
+        inventory['per-unit-volume'] = np.round(self.rng.uniform(0.01, 2, n), 2)
+        inventory['afn-inbound-working-quantity'] = 0
+        inventory['afn-inbound-shipped-quantity'] = inbound
+        inventory['afn-inbound-receiving-quantity'] = 0
+        inventory['afn-researching-quantity'] = 0
+        inventory['afn-reserved-future-supply'] = 0
+        inventory['afn-future-supply-buyable'] = 0
+        return inventory[INVENTORY_COLUMNS].to_csv(sep='\t', index=False)
+
+    @staticmethod
+    def gzip(document: str) -> bytes:
+        """Compresses a document the way the SP-API serves it ('GZIP' compressionAlgorithm, latin1 text)"""
+        buffer = io.BytesIO()
+        with gzip.GzipFile(fileobj=buffer, mode='wb') as gz:
+            gz.write(document.encode('latin1'))
+        return buffer.getvalue()
@@ -0,0 +1,28 @@
+import pytest
+
+from Utilities.settings import Settings
+
+
+ENVIRON = {
+    'ACCOUNTS_LIST': "['DZ', 'QR']",
+    'DZ_VAULT_NAME': 'dz-keyvault',
+    'QR_VAULT_NAME': 'qr-keyvault',
+    'CLIENT_ID': 'client-identifier',
+    'CLIENT_SECRET': 'client-secret',
+    'REFRESH_TOKEN': 'refresh-token',
+    'ROTATION_DEADLINE': 'rotation-deadline',
+    'MARKETPLACE_ID': 'ATVPDKIKX0DER',
+    'ENDPOINT': 'https://sellingpartnerapi-na.amazon.com/reports/2021-06-30',
+    'TOKEN_REQUEST_URL': 'https://api.amazon.com/auth/o2/token',
+}
+
+
+@pytest.fixture
+def environ() -> dict:
+    """A minimal valid configuration of two accounts, DZ and QR"""
+    return dict(ENVIRON)
+
+
+@pytest.fixture
+def settings(environ) -> Settings:
+    return Settings.from_env(environ)
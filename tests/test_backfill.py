@@ -0,0 +1,56 @@
+import time
+
+import pytest
+
+from Utilities.backfill import BackfillRunner
+from Utilities.report_tools import GenerateFBAReport, ReportDownloadOrchestrator
+
+
+@pytest.fixture
+def calls(monkeypatch, tmp_path):
+    """Counts the Key Vault reads and LWA token requests of the downloads, which succeed without SP-API"""
+    monkeypatch.setenv('LOCAL_STORAGE_DIR', str(tmp_path))
+    monkeypatch.setenv('ON_HAND_BLOB_CONTAINER_NAME', 'onhand')
+    calls = {'keys': 0, 'tokens': 0, 'token_seconds': 3600}
+
+    def get_amz_keys(self, account_name):
+        calls['keys'] += 1
+        self.account_name = account_name
+        self.client_id, self.client_secret, self.refresh_token = 'id', 'secret', 'refresh'
+        self.rotation_deadline = '2999-12-31'
+
+    def request_access_token(self):
+        calls['tokens'] += 1
+        self.access_token = f"token-{calls['tokens']}"
+        self.access_token_expires_at = time.time() + calls['token_seconds']
+        return self.access_token
+
+    monkeypatch.setattr(GenerateFBAReport, 'get_amz_keys', get_amz_keys)
+    monkeypatch.setattr(GenerateFBAReport, 'request_access_token', request_access_token)
+    monkeypatch.setattr(ReportDownloadOrchestrator, 'get_report', lambda self, **kwargs: '[]')
+    return calls
+
+
+def runner(settings, tmp_path) -> BackfillRunner:
+    return BackfillRunner(
+        '2026-10-01', '2026-10-18', lookback_days=30, max_workers=4, progress_path=str(tmp_path / 'progress.json'),
+        settings=settings
+    )
+
+
+def test_downloads_share_each_accounts_keys_and_token(settings, tmp_path, calls):
+    backfill = runner(settings, tmp_path)
+    tasks = backfill.plan()
+
+    assert backfill.download(tasks) == 0
+    assert len(tasks) > 2
+    assert (calls['keys'], calls['tokens']) == (2, 2)  # DZ and QR, one region each
+
+
+def test_tokens_near_expiry_are_requested_again(settings, tmp_path, calls):
+    calls['token_seconds'] = 60  # within the refresh margin as soon as it's issued
+    backfill = runner(settings, tmp_path)
+    tasks = backfill.plan()
+
+    assert backfill.download(tasks) == 0
+    assert (calls['keys'], calls['tokens']) == (2, len(tasks))
@@ -0,0 +1,66 @@
+import pytest
+
+from Utilities.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+from Utilities.retry import FatalError, RetryPolicy
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def breaker(clock: Clock, **kwargs) -> CircuitBreaker:
+    options = dict(failure_rate=0.5, window=4, min_calls=2, open_seconds=60, half_open_probes=1, mode='fail_fast')
+    return CircuitBreaker('test', clock=clock, **{**options, **kwargs})
+
+
+def open_breaker(circuit: CircuitBreaker) -> None:
+    for _ in range(2):
+        circuit.record(False, circuit.acquire())
+    assert circuit.state == OPEN
+
+
+def test_open_circuit_is_retryable_after_open_seconds():
+    clock = Clock()
+    circuit = breaker(clock)
+    open_breaker(circuit)
+
+    policy = RetryPolicy()
+    with pytest.raises(CircuitOpenError) as raised:
+        circuit.acquire(policy)
+    assert not isinstance(raised.value, FatalError)
+    assert raised.value.retry_after == 60
+    assert policy.not_before is not None  # the next backoff waits for the probe
+
+    clock.now = 60
+    assert circuit.acquire(policy) is not None  # a probe
+    assert circuit.state == HALF_OPEN
+
+
+def test_late_closed_call_is_not_counted_as_a_probe():
+    clock = Clock()
+    circuit = breaker(clock)
+    late = circuit.acquire()  # let through while closed
+    open_breaker(circuit)
+
+    clock.now = 60
+    probe = circuit.acquire()
+    circuit.record(True, late)  # returns while half-open: ignored
+    assert circuit.state == HALF_OPEN and circuit.probes_in_flight == 1
+
+    circuit.record(True, probe)
+    assert circuit.state == CLOSED
+
+
+def test_refused_call_spends_no_rate_limit_token():
+    clock = Clock()
+    circuit = breaker(clock)
+    open_breaker(circuit)
+
+    tokens = []
+    with pytest.raises(CircuitOpenError):
+        circuit.call(lambda: None, before=lambda: tokens.append(1))
+    assert tokens == []
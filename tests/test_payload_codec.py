@@ -0,0 +1,57 @@
+import pandas as pd
+import pytest
+
+from Utilities.payload_codec import COMPACT_EXPANSION, COMPACT_PREFIX, PayloadCodec
+
+
+def report() -> pd.DataFrame:
+    return pd.DataFrame({
+        'sku': ['0012', 'A-1', 'B-2'],
+        'on-hand': pd.Series([3, 0, 12], dtype='int64'),
+        'received': [1.5, 0.0, 2.25],
+        'product-name': ['Mug', 'Cup', None]
+    })
+
+
+def test_compact_round_trip_keeps_values_and_dtypes():
+    df = report()
+    payload = PayloadCodec('compact').encode(df)
+
+    assert payload.startswith(COMPACT_PREFIX)
+    pd.testing.assert_frame_equal(PayloadCodec.decode(payload), df)
+
+
+def test_json_round_trip_keeps_values():
+    df = report().drop(columns=['sku'])  # read_json guesses numeric-looking SKUs back as numbers
+    payload = PayloadCodec('json').encode(df)
+
+    assert payload.startswith('[')
+    pd.testing.assert_frame_equal(PayloadCodec.decode(payload), df)
+
+
+@pytest.mark.parametrize('codec', ['json', 'compact'])
+def test_decode_selects_columns_in_order(codec):
+    payload = PayloadCodec(codec).encode(report())
+    df = PayloadCodec.decode(payload, columns=['received', 'missing', 'on-hand'])
+
+    assert list(df.columns) == ['received', 'on-hand']
+
+
+def test_unencodable_frame_falls_back_to_json():
+    df = pd.DataFrame({'sku': ['A-1', 2]})
+    payload = PayloadCodec('compact').encode(df)
+
+    assert not payload.startswith(COMPACT_PREFIX)
+    assert PayloadCodec.decode(payload)['sku'].tolist() == ['A-1', 2]
+
+
+def test_json_bytes_estimates_the_json_size():
+    payload = PayloadCodec('compact').encode(report())
+
+    assert PayloadCodec.json_bytes(payload) == len(payload) * COMPACT_EXPANSION
+    assert PayloadCodec.json_bytes('[]') == 2
+
+
+def test_unknown_codec_is_rejected():
+    with pytest.raises(ValueError):
+        PayloadCodec('msgpack')
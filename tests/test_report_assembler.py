@@ -0,0 +1,32 @@
+from datetime import date
+
+import pandas as pd
+
+from Utilities.report_tools import ReportAssembler
+
+
+def compiler_input(account_name: str) -> dict:
+    orders = pd.DataFrame({'sku': ['A', 'B'], 'product-name': ['pa', 'pb'], 'quantity': [1, 2]})
+    inventory = pd.DataFrame({
+        'sku': ['A', 'B'], 'asin': ['x', 'y'], 'product-name': ['pa', 'pb'], 'afn-fulfillable-quantity': [10, 0]
+    })
+    return {
+        'account_name': account_name,
+        'orders': [orders.to_json(orient='records')],
+        'inventory': [inventory.to_json(orient='records')]
+    }
+
+
+def test_report_names_are_dated_with_the_report_date():
+    assert ReportAssembler('dz', report_date='2026-09-19').set_on_hand_report_name() == 'DZ On Hand 09-19-2026'
+    assert ReportAssembler('dz', report_date=date(2026, 9, 19)).set_on_hand_report_name() == 'DZ On Hand 09-19-2026'
+
+
+def test_consolidated_tabs_are_dated_with_the_report_date():
+    reports = ReportAssembler(report_date='2026-09-19').consolidated_on_hand_reports(
+        [compiler_input('DZ'), compiler_input('QR')]
+    )
+
+    assert [name for name, _ in reports] == [
+        'DZ On Hand 09-19-2026', 'QR On Hand 09-19-2026', 'All Accounts On Hand 09-19-2026'
+    ]
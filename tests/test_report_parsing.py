@@ -0,0 +1,32 @@
+import gzip
+import tempfile
+
+import pytest
+
+from Utilities.report_tools import GenerateFBAReport
+
+
+def document() -> bytes:
+    """An inventory report whose first chunks of 5 rows only have numeric-looking SKUs"""
+    rows = [f"{i:03d}\tB{i:09d}\t{i}" for i in range(7)] + [f"AB-{i}\tB00000000{i}\t{i}" for i in range(3)]
+    return ('sku\tasin\tafn-fulfillable-quantity\n' + '\n'.join(rows) + '\n').encode('latin1')
+
+
+EXPECTED_SKUS = [f"{i:03d}" for i in range(7)] + ['AB-0', 'AB-1', 'AB-2']
+
+
+@pytest.mark.parametrize('compression', ['No compression', 'GZIP'])
+def test_chunked_parse_keeps_skus_as_text(compression):
+    content = document() if compression == 'No compression' else gzip.compress(document())
+    with tempfile.NamedTemporaryFile() as file:
+        file.write(content)
+        df = GenerateFBAReport.parse_report_file(file, compression=compression, chunk_rows=5)
+
+    assert df['sku'].tolist() == EXPECTED_SKUS
+    assert df['afn-fulfillable-quantity'].tolist() == list(range(7)) + [0, 1, 2]
+
+
+def test_in_memory_parse_keeps_skus_as_text():
+    df = GenerateFBAReport.parse_report_document(document()[:document().index(b'AB-0')])
+
+    assert df['sku'].tolist() == EXPECTED_SKUS[:7]
@@ -0,0 +1,30 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from Utilities.retry import RetryBudgetExhausted, RetryPolicy
+
+
+def test_attempt_cap_runs_every_attempt():
+    policy = RetryPolicy()
+    policy.backoff = lambda *args, **kwargs: None
+
+    assert list(policy.attempts(max_attempts=3, what='upload')) == [1, 2, 3]
+
+
+def test_deadline_stop_says_how_many_attempts_ran():
+    policy = RetryPolicy(deadline=datetime.now(timezone.utc) + timedelta(seconds=5))
+    ran = []
+
+    with pytest.raises(RetryBudgetExhausted, match=r"Gave up on upload after 1 of 3 attempts, stopped by the deadline"):
+        for attempt in policy.attempts(max_attempts=3, base_seconds=60, what='upload'):
+            ran.append(attempt)
+
+    assert ran == [1]
+
+
+def test_spent_deadline_runs_no_attempt():
+    policy = RetryPolicy(deadline=datetime.now(timezone.utc) - timedelta(seconds=1))
+
+    with pytest.raises(RetryBudgetExhausted, match=r"after 0 of 3 attempts"):
+        list(policy.attempts(max_attempts=3, what='upload'))
@@ -0,0 +1,18 @@
+from datetime import datetime
+
+from Utilities.run_parameters import RunParameters
+
+
+NOW = datetime(2026, 10, 19, 20)  # 4pm US/Eastern
+
+
+def test_only_todays_default_lookback_is_current(settings):
+    assert RunParameters(report_date='2026-10-19', settings=settings).is_current(NOW)
+    assert RunParameters(report_date='2026-10-19', accounts=['QR'], settings=settings).is_current(NOW)
+    assert not RunParameters(report_date='2026-10-18', settings=settings).is_current(NOW)
+    assert not RunParameters(report_date='2026-10-19', lookback_days=30, settings=settings).is_current(NOW)
+
+
+def test_is_current_uses_the_eastern_date(settings):
+    # 2am UTC on the 20th is still the 19th in US/Eastern
+    assert RunParameters(report_date='2026-10-19', settings=settings).is_current(datetime(2026, 10, 20, 2))
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from Utilities.sales_metrics import MetricsEngine, parse_metric
+
+
+def daily_orders(first: str, last: str, hour: int = 17) -> pd.DataFrame:
+    """One 1-unit order line a day, at `hour` UTC"""
+    days = pd.date_range(first, last, freq='D')
+    return pd.DataFrame({'purchase-date': days.strftime(f'%Y-%m-%dT{hour:02d}:00:00+00:00'), 'quantity': 1})
+
+
+def compute(engine: MetricsEngine, sales: pd.DataFrame, on_hand: float = 0.0) -> dict:
+    return engine.compute(sales, np.zeros(len(sales), dtype='int64'), np.array([0]), np.array([on_hand]))
+
+
+def test_window_as_long_as_the_lookback_counts_every_order():
+    # a 90-day run on 10-19 downloads 07-21 up to 10-19 00:00 US/Eastern
+    orders = daily_orders('2026-07-21', '2026-10-18')
+    engine = MetricsEngine(['units-90d', 'units-7d', 'velocity-7d'], as_of='2026-10-19')
+
+    results = compute(engine, orders)
+    assert results['units-90d'][0] == len(orders) == 90
+    assert results['units-7d'][0] == 7
+    assert results['velocity-7d'][0] == 1.0
+
+
+def test_windows_end_at_midnight_eastern_of_the_report_date():
+    # 10-19 03:30 UTC is still 10-18 in US/Eastern: inside the windows. 10-19 04:30 UTC is the report date: outside
+    orders = pd.DataFrame({
+        'purchase-date': ['2026-10-19T03:30:00+00:00', '2026-10-19T04:30:00+00:00', '2026-10-12T03:30:00+00:00'],
+        'quantity': [1, 10, 100]
+    })
+    results = compute(MetricsEngine(['units-7d', 'units-8d'], as_of='2026-10-19'), orders)
+    assert results['units-7d'][0] == 1
+    assert results['units-8d'][0] == 101
+
+
+def test_daily_aggregates_match_order_lines():
+    orders = daily_orders('2026-09-01', '2026-10-18')
+    daily = pd.DataFrame({'date': pd.date_range('2026-09-01', '2026-10-18').strftime('%Y-%m-%d'), 'units': 1})
+    engine = MetricsEngine(['units-7d', 'units-30d', 'weeks-of-cover-30d', 'sell-through-7d'], as_of='2026-10-19')
+
+    from_orders, from_daily = compute(engine, orders, on_hand=14), compute(engine, daily, on_hand=14)
+    for metric in engine.metrics:
+        np.testing.assert_array_equal(from_orders[metric], from_daily[metric])
+    assert from_orders['units-30d'][0] == 30
+    assert from_orders['weeks-of-cover-30d'][0] == 2.0
+    assert from_orders['sell-through-7d'][0] == 33.3
+
+
+def test_default_report_date_is_the_day_after_the_latest_order():
+    orders = daily_orders('2026-10-01', '2026-10-18')
+    assert compute(MetricsEngine(['units-7d']), orders)['units-7d'][0] == 7
+
+
+def test_unknown_metric():
+    assert parse_metric('weeks-of-cover-30d') == ('weeks-of-cover', 30)
+    with pytest.raises(ValueError):
+        parse_metric('units-0d')
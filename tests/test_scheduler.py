@@ -0,0 +1,59 @@
+import pytest
+
+from Utilities.run_parameters import RunParameters
+from Utilities.scheduler import AccountScheduler
+from Utilities.settings import Settings
+
+
+class Task:
+    def __init__(self, account: str):
+        self.account = account
+        self.result = f"{account} report"
+
+
+class Context:
+    """Completes every task as soon as it's yielded, recording which accounts were started"""
+    def __init__(self):
+        self.started = []
+
+    def task_all(self, tasks):
+        return [task.result for task in tasks]
+
+    def task_any(self, tasks):
+        return tasks[0]
+
+
+def drive(scheduler: AccountScheduler, accounts):
+    context = Context()
+
+    def start_task(account):
+        context.started.append(account)
+        return Task(account)
+
+    generator = scheduler.run(context, accounts, start_task)
+    value = None
+    try:
+        while True:
+            value = generator.send(value)
+    except StopIteration as stop:
+        return context.started, stop.value
+
+
+@pytest.mark.parametrize('max_in_flight', [0, 1])
+def test_repeated_accounts_run_once(max_in_flight):
+    started, results = drive(AccountScheduler(max_in_flight=max_in_flight, priorities={}), ['DZ', 'QR', 'dz'])
+
+    assert started == ['DZ', 'QR']
+    assert results == ['DZ report', 'QR report', 'DZ report']
+
+
+def test_duplicate_accounts_list_is_rejected(environ):
+    with pytest.raises(SyntaxError):
+        Settings.from_env({**environ, 'ACCOUNTS_LIST': "['DZ', 'QR', 'dz']"})
+
+
+def test_requested_accounts_match_case_insensitively(settings):
+    run = RunParameters(accounts=['qr', 'QR', 'dz'], settings=settings)
+
+    assert run.accounts == ['DZ', 'QR']
+    assert run.all_accounts
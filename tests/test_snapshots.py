@@ -0,0 +1,45 @@
+import pandas as pd
+import pytest
+
+from Utilities.snapshots import SnapshotStore
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch) -> SnapshotStore:
+    monkeypatch.setenv('LOCAL_STORAGE_DIR', str(tmp_path))
+    return SnapshotStore(container_name='onhand', max_workers=1)
+
+
+def test_delta_pivots_two_dates_and_counts_missing_skus_as_zero(store):
+    store.save('2026-10-12', 'DZ', pd.DataFrame({'sku': ['A', 'B'], 'on-hand': [10, 4], 'received': [1, 0]}))
+    store.save('2026-10-19', 'DZ', pd.DataFrame({'sku': ['A', 'C'], 'on-hand': [7, 5], 'received': [3, 2]}))
+    store.save('2026-10-19', 'QR', pd.DataFrame({'sku': ['A'], 'on-hand': [100], 'received': [0]}))
+
+    delta = store.delta('2026-10-12', '2026-10-19', accounts=['DZ'])
+
+    assert list(delta.columns) == [
+        'account', 'sku',
+        'on-hand 2026-10-12', 'on-hand 2026-10-19', 'on-hand change',
+        'received 2026-10-12', 'received 2026-10-19', 'received change'
+    ]
+    assert delta.values.tolist() == [
+        ['DZ', 'A', 10, 7, -3, 1, 3, 2],
+        ['DZ', 'B', 4, 0, -4, 0, 0, 0],
+        ['DZ', 'C', 0, 5, 5, 0, 2, 2],
+    ]
+
+
+def test_delta_of_dates_without_snapshots_is_empty(store):
+    delta = store.delta('2026-10-12', '2026-10-19', columns=['on-hand'])
+
+    assert delta.empty
+    assert list(delta.columns)[-3:] == ['on-hand 2026-10-12', 'on-hand 2026-10-19', 'on-hand change']
+
+
+def test_saving_a_date_again_replaces_it(store):
+    store.save('2026-10-19', 'DZ', pd.DataFrame({'sku': ['A'], 'on-hand': [1], 'received': [0]}))
+    store.save('2026-10-19', 'DZ', pd.DataFrame({'sku': ['A'], 'on-hand': [2], 'received': [0]}))
+
+    trend = store.trend('2026-10-19', '2026-10-19')
+
+    assert trend['on-hand'].tolist() == [2]
@@ -0,0 +1,92 @@
+import openpyxl
+import pandas as pd
+import pytest
+
+from Utilities.workbook import INDEX_SHEET, WorkbookBuilder, part_blob_name, sheet_title, table_title
+from Utilities.workbook_merge import WorkbookMerger
+
+
+def report(rows: int, prefix: str) -> pd.DataFrame:
+    return pd.DataFrame({
+        'sku': [f"{prefix}-{i}" for i in range(rows)],
+        'asin': ['B000'] * rows,
+        'on-hand': list(range(rows)),
+        'received': [i / 2 for i in range(rows)]
+    })
+
+
+def contents(workbooks):
+    """{blob name: {sheet: (rows, table names)}} of built workbooks"""
+    result = {}
+    for blob_name, buffer in workbooks:
+        with buffer:
+            wb = openpyxl.load_workbook(buffer)
+            result[blob_name] = {
+                ws.title: ([list(row) for row in ws.values], sorted(ws.tables.keys())) for ws in wb.worksheets
+            }
+    return result
+
+
+def test_layout_continues_sheets_and_splits_workbooks():
+    builder = WorkbookBuilder(max_sheet_rows=3, max_workbook_rows=5)
+    parts = builder.layout([('DZ On Hand 10-19-2026', 7, 4), ('QR On Hand 10-19-2026', 2, 4)])
+
+    assert [(p.report, p.workbook, p.sheet_name, p.start, p.stop) for p in parts] == [
+        (0, 0, 'DZ On Hand 10-19-2026', 0, 3),
+        (0, 1, 'DZ On Hand 10-19-2026 (2)', 3, 6),
+        (0, 1, 'DZ On Hand 10-19-2026 (3)', 6, 7),
+        (1, 2, 'QR On Hand 10-19-2026', 0, 2),  # 4 + 2 rows would overflow the second workbook
+    ]
+    assert [p.table_name for p in parts] == ['DZ', 'DZ_2', 'DZ_3', 'QR']
+
+
+def test_layout_keeps_names_valid_and_unique():
+    parts = WorkbookBuilder().layout([('B1 On Hand', 1, 1), ('b1 on hand', 1, 1), ('Index', 1, 1)])
+
+    assert [p.sheet_name for p in parts] == ['B1 On Hand', 'b1 on hand (2)', 'Index (2)']
+    assert [p.table_name for p in parts] == ['T_B1', 'T_b1_2', 'Index_2']
+    assert len(sheet_title('x' * 40, ' (2)')) == 31
+    assert sheet_title('a/b:c') == 'a-b-c'
+    assert table_title('1st') == 'T_1st'
+    assert part_blob_name('On Hand Reports 10-19-2026.xlsx', 2) == 'On Hand Reports 10-19-2026 - Part 2.xlsx'
+
+
+def test_split_build_indexes_every_workbook():
+    results = [('DZ On Hand 10-19-2026', report(7, 'd')), ('QR On Hand 10-19-2026', report(2, 'q'))]
+    built = contents(WorkbookBuilder(max_sheet_rows=3, max_workbook_rows=5).build(results, 'Reports.xlsx'))
+
+    assert list(built) == ['Reports.xlsx', 'Reports - Part 2.xlsx', 'Reports - Part 3.xlsx']
+    for sheets in built.values():
+        assert list(sheets)[0] == INDEX_SHEET
+
+    # every data row lands exactly once, in order, after its sheet's header
+    skus = [row[0] for sheets in built.values() for title, (rows, _) in sheets.items() if title != INDEX_SHEET
+            for row in rows[1:]]
+    assert skus == [f"d-{i}" for i in range(7)] + ['q-0', 'q-1']
+
+
+@pytest.mark.parametrize('limits', [{}, {'max_sheet_rows': 3, 'max_workbook_rows': 5}])
+def test_merged_parts_match_the_serial_build(limits):
+    builder = WorkbookBuilder(build_mode='parallel', **limits)
+    results = [
+        ('DZ On Hand 10-19-2026', report(7, 'd')),
+        ('QR On Hand 10-19-2026', report(2, 'q')),
+        ('B1 On Hand 10-19-2026', report(0, 'b')),
+        ('B2 On Hand 10-19-2026', pd.DataFrame())  # an empty json payload has no columns either
+    ]
+
+    serial = contents(builder.build(results, 'Reports.xlsx'))
+    parts = [(name, len(df), len(df.columns), builder.build_part(name, df)) for name, df in results]
+    merged = contents(WorkbookMerger(builder).merge(parts, 'Reports.xlsx'))
+
+    assert merged == serial
+
+
+@pytest.mark.parametrize('rows', [2, 0])
+def test_cells_are_formatted_with_the_named_styles(rows):
+    with WorkbookBuilder().build_part('DZ On Hand', report(rows, 'd')) as buffer:
+        ws = openpyxl.load_workbook(buffer)['DZ On Hand']
+
+    header, body = ws['A1'], ws['A2']
+    assert (header.style, header.font.color.rgb, header.alignment.horizontal) == ('On Hand Header', 'FFFFFFFF', 'center')
+    assert (body.style, body.font.name, body.alignment.horizontal) == ('On Hand Body', 'Calibri', 'center')